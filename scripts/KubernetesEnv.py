@@ -1,16 +1,14 @@
-from multiprocessing import Process, Manager
 import random
+import string
 import time
-import signal
+import numpy as np
 from pprint import pprint
 from subprocess import run
 from itertools import count
-# Register a handler for timeouts
-def timeout_handler(signum, frame):
-    raise TimeoutError("[ERROR] timeout limit exceeded.\n")
-    
-# Register signal function handler
-signal.signal(signal.SIGALRM, timeout_handler)
+from latency_stats import compute_latency_stats
+from manifests import render_function
+from setup_deployment import Deployment
+from setup_service import Service
 
 # Stop the Horizontal Pod Autoscaler from scaling.
 def freeze_autoscaler(name, replicas):
@@ -70,13 +68,35 @@ class Benchmark():
         self.rps_range = rps_range
         self.rps = random.randint(self.rps_range[0], self.rps_range[1])
         self.replicas = 1
-    def update_replicas(self):
-        get_replicas_cmd = f"kubectl get deployment/{self.services[0].name} -o jsonpath='{{.spec.replicas}}'"
-        self.replicas = int(run(get_replicas_cmd, shell=True, capture_output=True, universal_newlines=True).stdout)
+    def update_replicas(self, env):
+        self.replicas = env.get_replicas(self.services[0].name)
         return self.replicas
     def set_replicas(self, target_replicas):
         self.replicas = target_replicas
     
+# Build Benchmark objects for the benchmarks of a dqn_main.py config, from the cached manifests.
+# @param api : k8s API of the Deployments, None for SimEnv.
+# @param suffix : appended as '-<suffix>' to the function and benchmark names; 'random' for a new
+#                 random id per benchmark (as dqn_main.py deploys them), None for the names as they are.
+# @param apply_manifests : Services carry their Deployment and Service manifests to create them
+#                          through the client. No HPA: the agent does the scaling.
+def make_benchmarks(benchmarks, api=None, suffix='random', apply_manifests=False):
+    bm_objects = []
+    for benchmark in benchmarks:
+        bm_suffix = ''.join(random.choices(string.ascii_lowercase, k=10)) if suffix == 'random' else suffix
+        deployments, services = [], []
+        for function in benchmark['functions']:
+            dep, svc, _ = render_function(function, function + '-' + bm_suffix if bm_suffix is not None else None)
+            name = dep['metadata']['name']
+            port = svc['spec']['ports'][0]['port']
+            deployments.append(Deployment(dep, api))
+            services.append(Service(name, None, port, manifests=[dep, svc] if apply_manifests else None))
+        entry_point_i = benchmark['functions'].index(benchmark['entry-point'])
+        name = benchmark['name'] + ('-' + bm_suffix if bm_suffix is not None else '')
+        bm_objects.append(Benchmark(name, deployments, services, entry_point_i,
+                                    benchmark['sla'], (benchmark['rps-min'], benchmark['rps-max'])))
+    return bm_objects
+
 class KubernetesEnv():
     """Env class that serves as API between RLEnv and env_shim.
     
@@ -87,10 +107,13 @@ class KubernetesEnv():
     - Methods:
         - `get_env_state` (Int) : sample k8s environment and return the env state as a Dict
             - Returns a Dict
-        - `get_lats` (Benchmark, Int, Dict) : invoke a function and add all the latencies to the latency dictionary.
+        - `compute_state` (Int) : RL state sampled over the past @param t seconds, shared by RLEnv and the autoscaler
+            - Returns [cpu_user, mem_free, net_transmit, net_receive, num_containers, rps]
+        - `get_lats` (Benchmark, InvokerRun, Dict) : wait for an invocation and add all the latencies to the latency dictionary.
             - Returns a List
         - `evaluate_action` (List[Any]) : update each deployment with the corresponding action.
             - Returns nothing
+        - `delete_latency_files` : delete the latency files of the invocations so far.
         - `check_termination` : check if the environment has reached a termination state (e.g. crashing)
             - Returns a boolean
         - check_truncation` : check if the environment has reached a truncation state (e.g. a user-defined timeout limit)
@@ -111,21 +134,27 @@ class KubernetesEnv():
         # Unpack the env state so that it's [(cpu_idle, cpu_user, cpu_system, mem_free, net_transmit, net_receive)]
         unpacked_env_state = unpack_env_state(sampled_env_state)
         return unpacked_env_state
+
+    # State of the first node, the replicas of all benchmarks and the RPS of the first benchmark.
+    def compute_state(self, t):
+        cpu_idle, cpu_user, cpu_system, mem_free, net_transmit, net_receive = self.get_env_state(t)[0]
+        num_containers = sum([benchmark.replicas for benchmark in self.benchmarks])
+        rps = self.benchmarks[0].rps
+        return np.array([cpu_user, mem_free, net_transmit, net_receive, num_containers, rps])
     
-    def get_lats(self, benchmark, t, lats):
-        print(f'Invoking benchmark {benchmark.name}...')
-        (stat_issued, stat_completed), (stat_real_rps, stat_target_rps), stat_lat_filename = \
-                        self.env.invoke_service(benchmark.entry_service, t, benchmark.rps)
+    # Wait for the invocation @param run of a benchmark and add its latencies to the latency dictionary.
+    def get_lats(self, benchmark, run, lats):
+        try:
+            (stat_issued, stat_completed), (stat_real_rps, stat_target_rps), stat_lat_filename = run.result()
+        except Exception as e:
+            print(f'>>> ERROR: invocation of {benchmark.name} failed: {e}')
+            return
         lat_stat = self.env.get_latencies(stat_lat_filename)
-        if lat_stat == []:
+        if len(lat_stat) == 0:
             print(f'>>> ERROR: no latencies for {benchmark.name}')
             return
             
-        lat_stat.sort()
-        lat_50 = lat_stat[(int)(len(lat_stat) * 0.5)]
-        lat_90 = lat_stat[(int)(len(lat_stat) * 0.90)]
-        lat_99 = lat_stat[(int)(len(lat_stat) * 0.99)]
-        lat_999 = lat_stat[(int)(len(lat_stat) * 0.999)]
+        lat_50, lat_90, lat_99, lat_999 = compute_latency_stats(lat_stat).percentiles()
         if self.env.verbose:
             print(f"[INFO] Invocation statistics for benchmark `{benchmark.name}`:\n")
             print(
@@ -142,29 +171,23 @@ class KubernetesEnv():
         curr_replicas = benchmark.replicas
         # Update replica count
         target_replicas = desired
-        # Define scale cmd.
         print(f'Scaling {benchmark.services[0].name} from {curr_replicas} to {target_replicas} replicas...')
-        scale_cmd = f"kubectl scale deployment/{benchmark.services[0].name} --replicas={target_replicas}"
-        # Scale.
-        signal.alarm(timeout)
+        # Scale and wait to scale.
         start = time.time()
-        ret = run(scale_cmd, shell=True, capture_output=True, universal_newlines=True)
-        if ret.returncode != 0:
-            assert False, f"\n[ERROR] Failed to scale {benchmark.services[0].name} to {target_replicas} replicas.`\n[ERROR] Error message: {ret.stderr}"
-        print(f'Waiting to scale deployment `{benchmark.services[0].name}`...')
-        # Wait to scale.
-        try:
-            while not benchmark.deployments[0].is_ready():
-                continue
-            print(f'Deployment `{benchmark.services[0].name}` successfully scaled in {round(time.time() - start, 3)} seconds.\n')
-        except TimeoutError as exc:
-            print('{}: {}'.format(exc.__class__.__name__, exc))
-            assert False
-        # Cancel the timer when the replicas are ready
-        signal.alarm(0)      
+        self.env.scale_deployments(benchmark.deployments[0], target_replicas, timeout=timeout)
+        print(f'Deployment `{benchmark.services[0].name}` successfully scaled in {round(time.time() - start, 3)} seconds.\n')
         
+    # Scale all benchmarks at once (see Env.scale_all), one desired replica count each.
+    def scale_all_with_action(self, desired, timeout=60):
+        for target_replicas, benchmark in zip(desired, self.benchmarks):
+            print(f'Scaling {benchmark.services[0].name} from {benchmark.replicas} to {target_replicas} replicas...')
+        start = time.time()
+        self.env.scale_all([benchmark.deployments[0] for benchmark in self.benchmarks], desired, timeout=timeout)
+        print(f'Deployments {[benchmark.services[0].name for benchmark in self.benchmarks]} successfully scaled in {round(time.time() - start, 3)} seconds.\n')
+
     # Take the action and get the latencies for a given time.
-    def evaluate_action(self, action_set, t, cooldown=15):
+    # invoke_timeout_slack : seconds on top of @param t before an invocation is cancelled
+    def evaluate_action(self, action_set, t, cooldown=15, invoke_timeout_slack=60):
         print(f'ACTION SET: {action_set}')
         updated_counts = [max(self.benchmarks[i].replicas + action_set[i], 1) for i in range(len(action_set))]
         print(f'PROPOSED REPLICAS: {updated_counts}\n')
@@ -172,14 +195,7 @@ class KubernetesEnv():
         for c in count():
             print(f'Scale attempt {c+1}:')
             try:
-                processes = []
-                for benchmark, desired in zip(self.benchmarks, updated_counts):
-                    p = Process(target=self.scale_with_action, args=(desired, benchmark))
-                    processes.append(p)
-                    p.start()
-                # Join processes.
-                for proc in processes:
-                    proc.join()
+                self.scale_all_with_action(updated_counts)
             except Exception as e:
                 print(f'Scale error: {e}')
                 print('Scale failed: retrying...')
@@ -188,7 +204,7 @@ class KubernetesEnv():
                 break
         # Update all benchmark objects.
         for benchmark in self.benchmarks:
-            benchmark.update_replicas()
+            benchmark.update_replicas(self.env)
         print('All deployments successfully scaled.\n')
         # Invoke in parallel
         invoke_failures = 0
@@ -199,35 +215,39 @@ class KubernetesEnv():
                 timeout = cooldown*invoke_failures/3
                 print(f'{invoke_failures} successive invocation errors: cooling down for {timeout} seconds...')
                 time.sleep(timeout)
+            runs = []
             try:
-                with Manager() as manager:
-                    lats = manager.dict()
-                    processes = []
-                    for benchmark in self.benchmarks:
-                        p = Process(target=self.get_lats, args=(benchmark, t, lats))
-                        processes.append(p)
-                        p.start()
-                    # Join processes.
-                    for proc in processes:
-                        proc.join()
-                    lats = dict(lats)
-                    print(lats)
-                    if len(lats.keys()) != len(self.benchmarks):
-                        print('Invocation error: insufficient latencies.')
-                        assert False
-                    print('>>> Invocation success.\n')
-                    # Check if QoS has been met.
-                    self.terminated = qos_is_met(self.benchmarks, lats)
-                    if self.terminated:
-                        print("QoS is met, terminating this episode...\n")
-                    else:
-                        print("QoS not yet met...\n")
-                    return lats
+                # Start all invokers at once, then collect their results.
+                for benchmark in self.benchmarks:
+                    print(f'Invoking benchmark {benchmark.name}...')
+                    runs.append(self.env.start_invocation(benchmark.entry_service, t, benchmark.rps,
+                                                          timeout=t + invoke_timeout_slack))
+                lats = {}
+                for benchmark, run in zip(self.benchmarks, runs):
+                    self.get_lats(benchmark, run, lats)
+                print(lats)
+                if len(lats.keys()) != len(self.benchmarks):
+                    print('Invocation error: insufficient latencies.')
+                    assert False
+                print('>>> Invocation success.\n')
+                # Check if QoS has been met.
+                self.terminated = qos_is_met(self.benchmarks, lats)
+                if self.terminated:
+                    print("QoS is met, terminating this episode...\n")
+                else:
+                    print("QoS not yet met...\n")
+                return lats
             except Exception as e:
+                for run in runs:
+                    run.cancel()
                 invoke_failures += 1
                 print(f'Invocation error: {e}')
                 print('Invocation failed: retrying...')
 
+    # Delete the latency files of the invocations so far.
+    def delete_latency_files(self):
+        self.env.delete_latency_files()
+
     # TODO: update
     def check_termination(self):
         return self.terminated
@@ -2,13 +2,11 @@ import math
 import random
 import matplotlib
 import numpy as np
-import pickle
 import string
-from multiprocessing import Manager, Process
 from KubernetesEnv import KubernetesEnv
-from subprocess import run
 from itertools import count
 from data_processing import make_dir
+from step_log import StepLog
 # Computes instantaneous reward given latencies Dict and SLAs for functions
 # Returns: float representing instant reward
 # latencies : Dict{'fibonacci-ID' : (50th, 90th, 99th, 99.9th), 'hotel-app-geo-ID' : ...}
@@ -30,6 +28,15 @@ def compute_reward(latencies, benchmarks):
     # Reward shaping
     return 1 - avg_lat ** 0.4
 
+# Vectorized compute_reward for K environments.
+# Returns: array of K rewards
+# lat_90 : array (K, B) of 90th percentile latencies of the B benchmarks
+# sla_90 : array (B,) of their 90th percentile SLAs
+def compute_rewards(lat_90, sla_90):
+    ratio = lat_90 / sla_90
+    rewards = 1 - np.mean(ratio, axis=-1) ** 0.4
+    return np.where(np.any(ratio > 1, axis=-1), -1.0, rewards)
+
 class ActionSpace():   
     """Object to represent an RL agent's action space.
     
@@ -64,6 +71,8 @@ class RLEnv():
     - `reset` - re-initializes the environment and returns the initialized (state, info) tuple
     - 'step' - takes an Int representing an action, and takes that action in the environment. Returns typical RL stuff.
     - `compute_state` - computes the state by concatenating RPS values with env_state.
+    - `save_step` - appends the step to the run's log, `rl-data/run-<rand_id>.jsonl`.
+    - `close` - flushes and closes the step log.
     """
     
     def __init__(self, action_space, k8s_env, t):
@@ -71,24 +80,15 @@ class RLEnv():
         self.k8s_env = k8s_env
         self.t = t
         self.rand_id = ''.join(random.choices(string.ascii_lowercase, k=6))
-        self.data = {'episode' : [],
-                     'step' : [],
-                     'cpu_util' : [],
-                     'mem_free' : [],
-                     'net_transmit' : [],
-                     'net_receive': [],
-                     'action' : [],
-                     'reward' : [],
-                     'mean_latency' : []}
-        for benchmark in self.k8s_env.benchmarks:
-            self.data[f'replicas_{benchmark.name}'] = []
+        # Opened on the first save_step.
+        self.step_log = None
     
     # Reset the env state.
     def reset(self):
         self.state = self.compute_state()
         # Scale all functions to 1 and set their replica count to 1.
+        self.k8s_env.scale_all_with_action([1] * len(self.k8s_env.benchmarks))
         for idx, benchmark in enumerate(self.k8s_env.benchmarks):
-            self.k8s_env.scale_with_action(1, benchmark)
             # Update replica count.
             benchmark.replicas = 1
             self.k8s_env.benchmarks[idx] = benchmark
@@ -97,32 +97,31 @@ class RLEnv():
         return self.state
     
     def compute_state(self):
-        cpu_idle, cpu_user, cpu_system, mem_free, net_transmit, net_receive = self.k8s_env.get_env_state(self.t)[0]
-        num_containers = sum([benchmark.replicas for benchmark in self.k8s_env.benchmarks])
-        rps = self.k8s_env.benchmarks[0].rps
-        env_state = np.array([cpu_user, mem_free, net_transmit, net_receive, num_containers, rps])
-        return env_state
+        return self.k8s_env.compute_state(self.t)
     
+    # Append one record to the step log: only this step is written, not the whole run.
     def save_step(self, i_episode, step, action_i, lats):
-        # Update data.
-        self.data['episode'].append(i_episode)
-        self.data['step'].append(step) 
-        self.data['cpu_util'].append(self.state[0])
-        self.data['mem_free'].append(self.state[1])
-        self.data['net_transmit'].append(self.state[2])
-        self.data['net_receive'].append(self.state[3])
-        self.data['action'].append(self.action_space.actions[action_i])
-        self.data['reward'].append(self.reward)
-        self.data['mean_latency'].append(np.mean(list(lats.values())))
+        record = {'episode' : i_episode,
+                  'step' : step,
+                  'cpu_util' : self.state[0],
+                  'mem_free' : self.state[1],
+                  'net_transmit' : self.state[2],
+                  'net_receive' : self.state[3],
+                  'action' : self.action_space.actions[action_i],
+                  'reward' : self.reward,
+                  'mean_latency' : np.mean(list(lats.values()))}
         for benchmark in self.k8s_env.benchmarks:
-            self.data[f'replicas_{benchmark.name}'].append(benchmark.replicas)
-        # Save file.
-        foldername = f'./rl-data/'
-        make_dir(foldername)
-        filename = f'{foldername}/run-{self.rand_id}.pickle'
-        with open(filename, 'wb') as handle:
-            pickle.dump(self.data, handle, protocol=pickle.HIGHEST_PROTOCOL)
-        print(f'Data saved in {filename}.')
+            record[f'replicas_{benchmark.name}'] = benchmark.replicas
+        if self.step_log is None:
+            foldername = f'./rl-data/'
+            make_dir(foldername)
+            self.step_log = StepLog(f'{foldername}/run-{self.rand_id}.jsonl')
+        self.step_log.append(record)
+        print(f'Data saved in {self.step_log.filename}.')
+
+    def close(self):
+        if self.step_log is not None:
+            self.step_log.close()
         
     """Updates the RL environment at every time step.
     
@@ -157,7 +156,7 @@ class RLEnv():
                 print('>>> Success.')
                 break
         # Delete latency files to prevent buildup
-        run('''find . -name 'rps*.csv' -delete''', shell=True)
+        self.k8s_env.delete_latency_files()
         print('Deleted all latency files.')
         
         return (self.state, self.reward, self.terminated, self.truncated, lats)
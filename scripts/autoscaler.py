@@ -0,0 +1,191 @@
+import argparse
+import json
+import signal
+import time
+import numpy as np
+
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count, product
+from KubernetesEnv import KubernetesEnv, make_benchmarks, qos_is_met
+from RLEnv import ActionSpace
+from latency_stats import compute_latency_stats
+from policy_inference import PolicyService
+
+class Autoscaler:
+    """Controller that scales the benchmarks of a cluster with a trained DQN policy.
+
+    Every `period` seconds it samples the node metrics through KubernetesEnv.get_env_state,
+    builds the RLEnv state, picks the greedy action of the policy and hands the scaling
+    to a thread pool, so a slow rollout never delays the next decision. A benchmark whose
+    previous scaling is still in flight keeps its replicas until that one finishes.
+
+    - Attributes:
+        - `k8s_env` (KubernetesEnv) : the cluster (live Env or SimEnv) and its benchmarks.
+        - `policy` (PolicyService) : the policy the decisions are made with.
+        - `action_space` (ActionSpace) : actions the policy was trained with.
+        - `period` (Float) : seconds between two decisions.
+        - `sample_window` (Int) : seconds of metrics per state sample, as RLEnv's `t`.
+        - `max_replicas` (Int) : upper bound on the replicas of a benchmark.
+        - `timings` (Dict[String, List]) : per-decision latencies (seconds) of 'sample', 'inference' and 'decision'.
+    - Methods:
+        - `compute_state` : RL state of the cluster, as RLEnv.compute_state.
+        - `decide` : take one decision, returns the action set.
+        - `run` (Int) : decide on a fixed cadence, forever or for a number of decisions.
+        - `latency_summary` : percentiles of the per-decision latencies.
+    """
+    def __init__(self, k8s_env, policy, action_space, period=30, sample_window=30, scale_timeout=60,
+                 max_replicas=None, on_decision=None):
+        self.k8s_env = k8s_env
+        self.policy = policy
+        self.action_space = action_space
+        self.period = period
+        self.sample_window = sample_window
+        self.scale_timeout = scale_timeout
+        self.max_replicas = max_replicas
+        self.on_decision = on_decision
+        self.executor_ = ThreadPoolExecutor(max_workers=len(k8s_env.benchmarks))
+        self.pending_ = {}
+        self.stop_ = False
+        self.timings = {'sample': [], 'inference': [], 'decision': []}
+
+    def compute_state(self):
+        return self.k8s_env.compute_state(self.sample_window)
+
+    def scale(self, benchmark, target_replicas):
+        try:
+            self.k8s_env.scale_with_action(target_replicas, benchmark, timeout=self.scale_timeout)
+        except Exception as e:
+            print(f'>>> ERROR: scaling {benchmark.name} failed: {e}')
+        benchmark.update_replicas(self.k8s_env.env)
+
+    # Start scaling the benchmarks whose replicas change and that have no scaling in flight.
+    def apply(self, action_set):
+        for benchmark, delta in zip(self.k8s_env.benchmarks, action_set):
+            pending = self.pending_.get(benchmark.name)
+            if pending is not None and not pending.done():
+                continue
+            target = max(benchmark.replicas + delta, 1)
+            if self.max_replicas is not None:
+                target = min(target, self.max_replicas)
+            if target != benchmark.replicas:
+                self.pending_[benchmark.name] = self.executor_.submit(self.scale, benchmark, target)
+
+    def decide(self):
+        start = time.perf_counter()
+        state = self.compute_state()
+        sampled = time.perf_counter()
+        action_i = self.policy.greedy(state).item()
+        inferred = time.perf_counter()
+        action_set = self.action_space.actions[action_i]
+        self.apply(action_set)
+        end = time.perf_counter()
+        self.timings['sample'].append(sampled - start)
+        self.timings['inference'].append(inferred - sampled)
+        self.timings['decision'].append(end - start)
+        if self.on_decision is not None:
+            self.on_decision(state, action_set)
+        return action_set
+
+    def stop(self, *args):
+        self.stop_ = True
+
+    def run(self, num_decisions=None):
+        next_decision = time.perf_counter()
+        for i in count():
+            if self.stop_ or (num_decisions is not None and i >= num_decisions):
+                break
+            action_set = self.decide()
+            print(f'Decision {i + 1}: {action_set}, replicas {[b.replicas for b in self.k8s_env.benchmarks]}, '
+                  f'{round(self.timings["decision"][-1] * 1e3, 3)} ms')
+            # Fixed cadence: sleep until the next slot, skip slots that were missed.
+            next_decision += self.period
+            now = time.perf_counter()
+            if next_decision < now:
+                next_decision = now
+            time.sleep(next_decision - now)
+        self.executor_.shutdown(wait=True)
+
+    # {name: (count, 50th, 90th, 99th, 99.9th)} of the per-decision latencies, in ms.
+    def latency_summary(self):
+        summary = {}
+        for name, values in self.timings.items():
+            if values:
+                stats = compute_latency_stats(np.array(values) * 1e3)
+                summary[name] = (stats.count,) + tuple(round(float(v), 4) for v in stats.percentiles())
+        return summary
+
+# Dry run: simulate the benchmarks' traffic for one period before each decision,
+# so the simulated node metrics follow the load, and report the QoS.
+def simulate_traffic(k8s_env, period):
+    env = k8s_env.env
+    lats = {}
+    for benchmark in k8s_env.benchmarks:
+        _, _, lat_filename = env.invoke_service(benchmark.entry_service, period, benchmark.rps)
+        lats[benchmark.name] = compute_latency_stats(env.get_latencies(lat_filename)).percentiles()
+    return qos_is_met(k8s_env.benchmarks, lats)
+
+def main(args):
+    with open(args.config, 'r') as f:
+        benchmarks = json.load(f)['benchmarks']
+    if args.dry_run:
+        from sim_env import SimEnv
+        env = SimEnv.from_data(args.data, benchmarks=benchmarks) if args.data else SimEnv(benchmarks=benchmarks)
+        bm_objects = make_benchmarks(benchmarks, None, args.suffix)
+        for bm in bm_objects:
+            env.setup_functions(bm.deployments, bm.services)
+    else:
+        from k8s_env_shim import Env
+        env = Env(verbose=args.verbose)
+        if not env.setup_prometheus():
+            print("[ERROR] Prometheus setup failed, please read error message and try again.")
+            return 0
+        bm_objects = make_benchmarks(benchmarks, env.api, args.suffix)
+    for bm in bm_objects:
+        if args.rps is not None:
+            bm.rps = args.rps
+        bm.update_replicas(env)
+    k8s_env = KubernetesEnv(env, bm_objects)
+    action_space = ActionSpace(list(product([-1, 0, 1], repeat=len(benchmarks))))
+    policy = PolicyService.load(args.model, mode=args.mode)
+
+    qos = []
+    on_decision = None
+    if args.dry_run:
+        on_decision = lambda state, action_set: qos.append(simulate_traffic(k8s_env, args.sample_window))
+        simulate_traffic(k8s_env, args.sample_window)
+    autoscaler = Autoscaler(k8s_env, policy, action_space, period=args.period, sample_window=args.sample_window,
+                            scale_timeout=args.scale_timeout, max_replicas=args.max_replicas, on_decision=on_decision)
+    signal.signal(signal.SIGINT, autoscaler.stop)
+    signal.signal(signal.SIGTERM, autoscaler.stop)
+    autoscaler.run(args.decisions)
+
+    print('Per-decision latency (count, 50th, 90th, 99th, 99.9th ms):')
+    for name, summary in autoscaler.latency_summary().items():
+        print(f'    {name}: {summary}')
+    if qos:
+        print(f'QoS met after {sum(qos)} of {len(qos)} decisions.')
+
+#
+# Example cmd:
+#   python3 autoscaler.py --config dqn_configs.json --model saved_models/<run>/policy_net.pth --suffix <id>
+#   python3 autoscaler.py --config dqn_configs.json --model saved_models/<run>/policy_net.pth --dry-run --period 0 --decisions 100
+#
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--config', default='dqn_configs.json', help='Benchmarks config, as for dqn_main.py')
+    parser.add_argument('--model', required=True, help='TorchScript policy saved by dqn_main.py (policy_net.pth)')
+    parser.add_argument('--suffix', default=None, help='Id appended to the deployed function names, e.g. by dqn_main.py')
+    parser.add_argument('--period', type=float, default=30, help='Seconds between two decisions')
+    parser.add_argument('--sample-window', type=int, default=30, help='Seconds of metrics per state, -t of dqn_main.py')
+    parser.add_argument('--scale-timeout', type=int, default=60, help='Seconds to wait for a deployment to scale')
+    parser.add_argument('--max-replicas', type=int, default=None, help='Upper bound on the replicas of a benchmark')
+    parser.add_argument('--rps', type=int, default=None, help='RPS in the state (defaults to a value from the config range)')
+    parser.add_argument('--decisions', type=int, default=None, help='Stop after this many decisions (default: run until killed)')
+    parser.add_argument('--mode', default='script', help='Inference mode: script, compile or eager')
+    parser.add_argument('--dry-run', action='store_true', help='Decide against a simulated cluster instead of the live one')
+    parser.add_argument('--data', nargs='*', help='With --dry-run, data_collection.py datasets to fit the simulation on')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+    if args.mode == 'eager':
+        args.mode = None
+    main(args)
@@ -0,0 +1,136 @@
+import argparse
+import hashlib
+import json
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from dataset_paths import data_id as get_data_id, dataset_parts
+
+# The plotting and data modules take seconds to import, so they are imported where they are
+# used: a rerun that is fully cached only hashes the dataset.
+
+METRICS = ['pearson', 'spearman', 'kendalltau']
+# Columns of the heatmaps: the numeric ones data_processing.main doesn't ignore, plus rps_delta.
+HEATMAP_COLUMNS = ['cpu_util', 'mem_util', 'replicas', 'rps_real', 'rps_target', '50th', '90th', '99th', '99.9th', 'rps_delta']
+
+# Hash of the bytes of a dataset (directory of parts or pickle) and of the analysis @param options.
+def dataset_hash(data_file, options, chunk_bytes=1 << 20):
+    h = hashlib.sha256(json.dumps(options, sort_keys=True).encode())
+    files = dataset_parts(data_file) if os.path.isdir(data_file) else [data_file]
+    for file in files:
+        h.update(os.path.basename(file).encode())
+        with open(file, 'rb') as f:
+            for block in iter(lambda: f.read(chunk_bytes), b''):
+                h.update(block)
+    return h.hexdigest()[:16]
+
+# Cleaned data with every analysed column flattened to floats (see data_processing.flatten_column),
+# plus the benchmark names.
+def load_flat_frame(data_file, columns):
+    from data_processing import Data, compute_rps_deltas, flatten_column
+    from dataset import read_data_frame
+    df = read_data_frame(data_file)
+    df['rps_delta'] = compute_rps_deltas(df['rps_real'], df['rps_target'])
+    df = Data(df, get_data_id(data_file)).df
+    flat_df = df[columns].apply(flatten_column)
+    flat_df.insert(0, 'benchmark', df['benchmark'].astype(str).to_numpy())
+    return flat_df
+
+# Frame of the worker process, set once by init_worker instead of being sent with every task.
+FRAME = None
+
+def init_worker(flat_df):
+    global FRAME
+    import matplotlib
+    matplotlib.use('Agg')
+    FRAME = flat_df
+
+def benchmark_frame(benchmark, columns):
+    return FRAME.loc[FRAME['benchmark'] == benchmark, columns]
+
+# Same figure as data_processing.Data.get_heatmap, also saving the table as CSV.
+def render_heatmap(out_dir, data_id, benchmark, columns, metric, abs):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    from data_processing import correlation_table
+    table_df = correlation_table(benchmark_frame(benchmark, columns), metric=metric, abs=abs)
+    name = f"{data_id}_{benchmark}_{'abs_' if abs else ''}{metric}_correlations"
+    table_df.to_csv(f'{out_dir}/{name}.csv')
+    fig, ax = plt.subplots(figsize=(10, 10))
+    sns.heatmap(table_df, ax=ax, robust=True, annot=True)
+    ax.tick_params(axis='x', labelrotation=30)
+    ax.tick_params(axis='y', labelrotation=0)
+    if abs:
+        ax.set_title(f"Magnitude of {metric.capitalize()} Coefficients for Benchmark '{benchmark}' in Experiment '{data_id}'\n")
+    else:
+        ax.set_title(f"{metric.capitalize()} Coefficients for Benchmark '{benchmark}' in Experiment '{data_id}'\n")
+    fig.savefig(f'{out_dir}/{name}.png')
+    plt.close(fig)
+    return f'{name}.png'
+
+# Same figure as plot_columns.py: scatter of @param y against @param x with a linear fit.
+def render_scatter(out_dir, data_id, benchmark, x, y):
+    import matplotlib.pyplot as plt
+    import numpy as np
+    from data_processing import correlation_table
+    pair = benchmark_frame(benchmark, [x, y]).dropna()
+    xs, ys = pair[x].to_numpy(), pair[y].to_numpy()
+    pearson = correlation_table(pair).loc[x, y] if len(pair) > 1 else np.nan
+    fig, ax = plt.subplots()
+    ax.scatter(xs, ys)
+    ax.set_title(f"{y} vs. {x} for benchmark '{benchmark}' (cleaned)\nr={pearson}")
+    ax.set_xlabel(x)
+    ax.set_ylabel(y)
+    if len(np.unique(xs)) > 1:
+        ax.plot(np.unique(xs), np.poly1d(np.polyfit(xs, ys, 1))(np.unique(xs)), color='r')
+    name = f'{data_id}_{benchmark}_{x}-{y}_plot.png'
+    fig.savefig(f'{out_dir}/{name}')
+    plt.close(fig)
+    return name
+
+def main(args):
+    data_id = get_data_id(args.f)
+    pairs = list(product(args.x, args.y))
+    options = {'metrics': args.m, 'abs': args.a, 'pairs': pairs, 'benchmarks': args.b}
+    out_dir = f'{args.d}/{data_id}-{dataset_hash(args.f, options)}'
+    manifest_file = f'{out_dir}/manifest.json'
+    # Same dataset and options as a finished run: everything is already rendered.
+    if os.path.exists(manifest_file):
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+        if all(os.path.exists(f'{out_dir}/{name}') for name in manifest['outputs']):
+            print(f"[INFO] {len(manifest['outputs'])} cached outputs in {out_dir}.")
+            return
+    os.makedirs(out_dir, exist_ok=True)
+
+    columns = list(dict.fromkeys(HEATMAP_COLUMNS + [c for pair in pairs for c in pair]))
+    flat_df = load_flat_frame(args.f, columns)
+    benchmarks = args.b if args.b else sorted(flat_df['benchmark'].unique())
+    tasks = [(render_heatmap, (out_dir, data_id, b, HEATMAP_COLUMNS, m, a))
+             for b, m, a in product(benchmarks, args.m, [False, True] if args.a else [False])]
+    tasks += [(render_scatter, (out_dir, data_id, b, x, y)) for b, (x, y) in product(benchmarks, pairs)]
+    with ProcessPoolExecutor(max_workers=args.j, initializer=init_worker, initargs=(flat_df,)) as executor:
+        futures = [executor.submit(fn, *task_args) for fn, task_args in tasks]
+        outputs = [future.result() for future in futures]
+    with open(manifest_file, 'w') as f:
+        json.dump({'data_file': args.f, 'options': options, 'outputs': outputs}, f)
+    print(f'[INFO] {len(outputs)} outputs saved in {out_dir}.')
+
+#
+# Example cmd:
+#   python3 batch_analysis.py --f data/data_<id> -a -j 8
+#   python3 batch_analysis.py --f data/data_<id> -b fibonacci-python -x rps_real replicas -y 90th 99th
+#
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--f', required=True, help='Dataset directory (or pickle) from data_collection.py')
+    parser.add_argument('-b', nargs='*', default=None, help='Benchmarks to analyse (default: all)')
+    parser.add_argument('-m', nargs='*', default=METRICS, help='Correlation metrics of the heatmaps')
+    parser.add_argument('-a', action='store_true', help='Also render heatmaps of the magnitudes')
+    parser.add_argument('-x', nargs='*', default=['rps_real', 'replicas', 'cpu_util'], help='x columns of the scatter plots')
+    parser.add_argument('-y', nargs='*', default=['50th', '90th', '99th'], help='y columns of the scatter plots')
+    parser.add_argument('--d', default='./data-analysis', help='Folder of the cached results')
+    parser.add_argument('-j', type=int, default=os.cpu_count(), help='Worker processes')
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,62 @@
+from kubernetes import client
+
+class ClusterSnapshot:
+    """In-memory snapshot of Deployments and HPAs in a namespace.
+
+    `refresh` reads every Deployment and HPA with one list call each; lookups are then
+    answered from memory instead of one `kubectl get ... -o jsonpath` per value.
+
+    - Attributes:
+        - `namespace` (String) : namespace to read.
+        - `deployments` (Dict[String, V1Deployment]) : Deployments by name.
+        - `hpas` (Dict[String, V2HorizontalPodAutoscaler]) : HPAs by name.
+    - Methods:
+        - `refresh` : re-read all Deployments and HPAs.
+        - `get_replicas` (String) : `spec.replicas` of a Deployment.
+        - `get_requests` / `get_limits` (String) : (cpu, memory) of the first container of a Deployment.
+        - `get_resource_metrics` (String) : current average utilizations reported by the Deployment's HPA.
+    """
+    def __init__(self, apps_api=None, autoscaling_api=None, namespace='default'):
+        self.apps_api = apps_api if apps_api is not None else client.AppsV1Api()
+        self.autoscaling_api = autoscaling_api if autoscaling_api is not None else client.AutoscalingV2Api()
+        self.namespace = namespace
+        self.deployments = {}
+        self.hpas = {}
+
+    def refresh(self):
+        deployments = self.apps_api.list_namespaced_deployment(self.namespace)
+        self.deployments = {dep.metadata.name: dep for dep in deployments.items}
+        hpas = self.autoscaling_api.list_namespaced_horizontal_pod_autoscaler(self.namespace)
+        self.hpas = {hpa.metadata.name: hpa for hpa in hpas.items}
+        return self
+
+    def get_replicas(self, name):
+        return self.deployments[name].spec.replicas
+
+    # Get the resources of the first container, as the values are the same for all containers.
+    # Returns: (cpu, memory) as strings, '' if not set.
+    def get_container_resources(self, name, field):
+        resources = self.deployments[name].spec.template.spec.containers[0].resources
+        values = getattr(resources, field) if resources is not None else None
+        if values is None:
+            return '', ''
+        return values.get('cpu', ''), values.get('memory', '')
+
+    def get_requests(self, name):
+        return self.get_container_resources(name, 'requests')
+
+    def get_limits(self, name):
+        return self.get_container_resources(name, 'limits')
+
+    # Get the percent utilizations reported by HPA `<name>-hpa`, in the order of
+    # `status.currentMetrics`. Metrics that are not reported yet are skipped.
+    def get_resource_metrics(self, name):
+        hpa = self.hpas.get(f'{name}-hpa')
+        if hpa is None or hpa.status is None or hpa.status.current_metrics is None:
+            return []
+        metrics = []
+        for metric in hpa.status.current_metrics:
+            if metric.resource is None or metric.resource.current.average_utilization is None:
+                continue
+            metrics.append(metric.resource.current.average_utilization)
+        return metrics
@@ -0,0 +1,375 @@
+import asyncio
+import json
+import math
+import os
+import ssl
+import threading
+import time
+import yaml
+
+from urllib.parse import urlsplit
+from kubernetes.client.rest import ApiException
+from readiness import update_pending
+
+# REST collection of each kind of manifest the benchmarks are made of.
+KIND_PATHS = {
+    'Deployment': '/apis/apps/v1/namespaces/{namespace}/deployments',
+    'Service': '/api/v1/namespaces/{namespace}/services',
+    'HorizontalPodAutoscaler': '/apis/autoscaling/v2/namespaces/{namespace}/horizontalpodautoscalers',
+}
+
+def kind_path(kind, namespace, name=None):
+    if kind not in KIND_PATHS:
+        assert False, f"\n[ERROR] Cannot apply manifests of kind `{kind}`."
+    collection = KIND_PATHS[kind].format(namespace=namespace)
+    return collection if name is None else f'{collection}/{name}'
+
+# Manifests of a Service (see setup_service.Service): its `manifests` dicts, or its YAML file.
+def service_manifests(service):
+    if service.manifests is not None:
+        return service.manifests
+    with open(service.service_file) as f:
+        return [m for m in yaml.safe_load_all(f) if m]
+
+class ApiConnection:
+    """Keep-alive HTTP/1.1 connections to the k8s API server over asyncio streams.
+
+    Same pooling as loadgen.HttpClient: idle connections are reused, a new one is opened
+    when all are busy, up to `max_connections`. Requests and responses are JSON; chunked
+    responses (large lists) are supported. Connections idle for more than `idle_timeout`
+    seconds are closed rather than reused, and a request on a reused connection that the
+    server closed before answering is sent once more on a new connection.
+    Watches (`stream`) get a connection of their own, outside the pool.
+
+    - Attributes:
+        - `host`, `port` (String, Int) : API server address.
+        - `ssl` (SSLContext) : TLS context, None for plain HTTP (e.g. the fake API server).
+        - `headers` (Dict) : sent with every request, e.g. the bearer token.
+        - `max_connections` (Int) : maximum number of open connections.
+        - `idle_timeout` (Float) : seconds an idle connection may be reused.
+        - `num_requests` (Int) : requests sent so far.
+    - Methods:
+        - `request` (String, String, Dict) : send a request, returns (status, JSON body).
+        - `stream` (String) : GET a watch, yields its JSON events.
+        - `close` : close all connections.
+    """
+    def __init__(self, host, port, ssl=None, headers=None, max_connections=8, idle_timeout=5.0):
+        self.host = host
+        self.port = port
+        self.ssl = ssl
+        self.headers = headers if headers is not None else {}
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.num_requests = 0
+        self.idle_ = []
+        self.slots_ = None
+
+    def encode_request(self, method, path, body=None, content_type='application/json', keep_alive=True):
+        payload = json.dumps(body).encode() if body is not None else b''
+        headers = [f'{method} {path} HTTP/1.1', f'Host: {self.host}:{self.port}',
+                   f'Connection: {"keep-alive" if keep_alive else "close"}',
+                   'Accept: application/json', f'Content-Length: {len(payload)}']
+        if body is not None:
+            headers.append(f'Content-Type: {content_type}')
+        headers += [f'{name}: {value}' for name, value in self.headers.items()]
+        return ('\r\n'.join(headers) + '\r\n\r\n').encode() + payload
+
+    # Most recently used idle connection that hasn't timed out, as (reader, writer), None if none.
+    def pop_idle(self):
+        now = time.monotonic()
+        while self.idle_ and now - self.idle_[0][2] > self.idle_timeout:
+            self.idle_.pop(0)[1].close()
+        if not self.idle_:
+            return None
+        reader, writer, _ = self.idle_.pop()
+        return reader, writer
+
+    async def request(self, method, path, body=None, content_type='application/json'):
+        if self.slots_ is None:
+            self.slots_ = asyncio.Semaphore(self.max_connections)
+        request = self.encode_request(method, path, body, content_type)
+        async with self.slots_:
+            while True:
+                connection = self.pop_idle()
+                reused = connection is not None
+                if not reused:
+                    connection = await asyncio.open_connection(self.host, self.port, ssl=self.ssl)
+                reader, writer = connection
+                try:
+                    writer.write(request)
+                    await writer.drain()
+                    status, keep_alive, data = await self.read_response(reader)
+                except (asyncio.IncompleteReadError, ConnectionError) as e:
+                    writer.close()
+                    # The server closed the idle connection before it got the request: nothing
+                    # of a response arrived, so the request is sent again on a new connection.
+                    if reused and not (isinstance(e, asyncio.IncompleteReadError) and e.partial):
+                        continue
+                    raise
+                except BaseException:
+                    writer.close()
+                    raise
+                break
+            if keep_alive:
+                self.idle_.append((reader, writer, time.monotonic()))
+            else:
+                writer.close()
+        self.num_requests += 1
+        return status, json.loads(data) if data else {}
+
+    # GET the watch at @param path on a new connection and yield its events (one JSON object per
+    # line of the chunked body) until the server ends it. Raises ApiException for an error status.
+    async def stream(self, path):
+        reader, writer = await asyncio.open_connection(self.host, self.port, ssl=self.ssl)
+        try:
+            writer.write(self.encode_request('GET', path, keep_alive=False))
+            await writer.drain()
+            head = await reader.readuntil(b'\r\n\r\n')
+            status = (int)(head.split(b' ', 2)[1])
+            if status >= 400 or b'chunked' not in head.lower():
+                raise ApiException(status=status, reason=f'Watch of {path} failed.')
+            self.num_requests += 1
+            rest = b''
+            while True:
+                size = (int)((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+                chunk = (await reader.readexactly(size + 2))[:-2]
+                if size == 0:
+                    return
+                lines = (rest + chunk).split(b'\n')
+                rest = lines.pop()
+                for line in lines:
+                    if line.strip():
+                        yield json.loads(line)
+        finally:
+            writer.close()
+
+    # Read a response with a Content-Length or chunked body.
+    # Returns (status, connection can be reused, body bytes).
+    async def read_response(self, reader):
+        head = await reader.readuntil(b'\r\n\r\n')
+        lines = head.decode('latin-1').split('\r\n')
+        status = (int)(lines[0].split(' ', 2)[1])
+        length = None
+        chunked = False
+        keep_alive = True
+        for line in lines[1:]:
+            name, _, value = line.partition(':')
+            name = name.strip().lower()
+            value = value.strip().lower()
+            if name == 'content-length':
+                length = (int)(value)
+            elif name == 'transfer-encoding' and 'chunked' in value:
+                chunked = True
+            elif name == 'connection' and value == 'close':
+                keep_alive = False
+        if chunked:
+            chunks = []
+            while True:
+                size = (int)((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+                chunks.append(await reader.readexactly(size + 2))
+                if size == 0:
+                    return status, keep_alive, b''.join(chunk[:-2] for chunk in chunks)
+        if length is None:
+            raise ConnectionError("[ERROR] Responses without Content-Length are not supported.")
+        return status, keep_alive, await reader.readexactly(length)
+
+    async def close(self):
+        while self.idle_:
+            _, writer, _ = self.idle_.pop()
+            writer.close()
+
+class ControlPlaneClient:
+    """asyncio client for the control-plane operations of the benchmarks.
+
+    Create, scale, delete, get-cluster-IP and wait-ready of Deployments, Services and HPAs
+    go through one pooled ApiConnection, so the operations of many benchmarks can be in
+    flight at once (`asyncio.gather`) without processes, threads or `kubectl` forks.
+    Readiness is waited for as readiness.ReadinessWaiter does: one list of the namespace,
+    then a watch from its resource version (listing again on 410), with the same
+    predicate. Deletes return once the objects are gone, polled every `poll_interval`.
+
+    The coroutines can be awaited from any event loop; `run` executes one from synchronous
+    code on the client's own loop thread (restarted in forked processes).
+
+    - Attributes:
+        - `connection` (ApiConnection) : pooled connection to the API server.
+        - `namespace` (String) : namespace of the benchmarks.
+        - `poll_interval` (Float) : seconds between two reads of deleted objects.
+    - Methods:
+        - `create` / `delete` (Dict) : create or delete the object of a manifest.
+        - `wait_deleted` (List[Dict], Float) : until the objects of manifests are gone, raises TimeoutError.
+        - `scale` (String, Int) : set the replicas of a Deployment.
+        - `get_replicas` (String) : `spec.replicas` of a Deployment.
+        - `service_ip` (String) : cluster IP of a Service.
+        - `wait_ready` (List[String], Float) : until all Deployments are ready, raises TimeoutError.
+        - `setup_functions` / `delete_functions` : Env.setup_functions / delete_functions of one benchmark.
+        - `scale_deployments` (List[Deployment], List[Int], Float) : scale many Deployments and wait.
+        - `run` (Coroutine) : run a coroutine to completion from synchronous code.
+    """
+    def __init__(self, connection, namespace='default', poll_interval=0.25, verbose=False):
+        self.connection = connection
+        self.namespace = namespace
+        self.poll_interval = poll_interval
+        self.verbose = verbose
+        self.loop_ = None
+        self.pid_ = None
+
+    # Client for the API server of the kube config (as loaded by config.load_kube_config).
+    @classmethod
+    def from_kube_config(cls, max_connections=8, idle_timeout=5.0, **kwargs):
+        from kubernetes import client
+        conf = client.Configuration.get_default_copy()
+        url = urlsplit(conf.host)
+        context = None
+        if url.scheme == 'https':
+            context = ssl.create_default_context(cafile=conf.ssl_ca_cert)
+            if conf.cert_file is not None:
+                context.load_cert_chain(conf.cert_file, conf.key_file)
+            if not conf.verify_ssl:
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+        headers = {}
+        token = conf.get_api_key_with_prefix('authorization')
+        if token is not None:
+            headers['Authorization'] = token
+        port = url.port if url.port is not None else (443 if url.scheme == 'https' else 80)
+        return cls(ApiConnection(url.hostname, port, ssl=context, headers=headers, max_connections=max_connections,
+                                 idle_timeout=idle_timeout), **kwargs)
+
+    # Client for an API server without auth at @param url, e.g. fake_api_server.FakeApiServer.
+    @classmethod
+    def from_url(cls, url, max_connections=8, idle_timeout=5.0, **kwargs):
+        url = urlsplit(url)
+        return cls(ApiConnection(url.hostname, url.port, max_connections=max_connections, idle_timeout=idle_timeout), **kwargs)
+
+    async def call(self, method, path, body=None, content_type='application/json', missing_ok=False):
+        status, data = await self.connection.request(method, path, body, content_type)
+        if status == 404 and missing_ok:
+            return None
+        if status >= 400:
+            raise ApiException(status=status, reason=data.get('message', data.get('reason')))
+        return data
+
+    async def create(self, manifest):
+        namespace = manifest['metadata'].get('namespace', self.namespace)
+        return await self.call('POST', kind_path(manifest['kind'], namespace), manifest)
+
+    async def delete(self, manifest, missing_ok=False):
+        namespace = manifest['metadata'].get('namespace', self.namespace)
+        path = kind_path(manifest['kind'], namespace, manifest['metadata']['name'])
+        return await self.call('DELETE', path, {'propagationPolicy': 'Foreground'}, missing_ok=missing_ok)
+
+    async def scale(self, name, replicas):
+        path = kind_path('Deployment', self.namespace, name) + '/scale'
+        return await self.call('PATCH', path, {'spec': {'replicas': replicas}}, 'application/merge-patch+json')
+
+    async def get_replicas(self, name):
+        return (await self.call('GET', kind_path('Deployment', self.namespace, name)))['spec'].get('replicas')
+
+    async def service_ip(self, name):
+        return (await self.call('GET', kind_path('Service', self.namespace, name)))['spec']['clusterIP']
+
+    # Poll the objects of @param manifests until they are gone (404), as manifests.wait_deleted.
+    async def wait_deleted(self, manifests, timeout):
+        deadline = time.time() + timeout
+        pending = list(manifests)
+        while True:
+            found = await asyncio.gather(*[self.call('GET', kind_path(m['kind'], m['metadata'].get('namespace', self.namespace),
+                                                                  m['metadata']['name']), missing_ok=True)
+                                           for m in pending])
+            pending = [m for m, obj in zip(pending, found) if obj is not None]
+            if not pending:
+                return
+            if time.time() >= deadline:
+                raise TimeoutError(f"[ERROR] {[m['metadata']['name'] for m in pending]} not deleted within {timeout} seconds.")
+            await asyncio.sleep(min(self.poll_interval, max(0, deadline - time.time())))
+
+    # List the Deployments, drop the ready ones from @param pending and return the resource version to watch from.
+    async def list_pending(self, pending):
+        deployments = await self.call('GET', kind_path('Deployment', self.namespace))
+        for dep in deployments['items']:
+            update_pending(pending, dep)
+        return deployments['metadata']['resourceVersion']
+
+    # Same wait as readiness.ReadinessWaiter.wait, over the pooled connection and a watch stream.
+    async def wait_ready(self, names, timeout):
+        deadline = time.time() + timeout
+        pending = set(names)
+        resource_version = await self.list_pending(pending)
+
+        async def follow(path):
+            nonlocal resource_version
+            async for event in self.connection.stream(path):
+                if event['type'] == 'ERROR':
+                    raise ApiException(status=event['object'].get('code'), reason=event['object'].get('message'))
+                resource_version = event['object']['metadata']['resourceVersion']
+                update_pending(pending, event['object'], event['type'])
+                if not pending:
+                    return
+
+        while pending:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise TimeoutError(f"[ERROR] Deployments {sorted(pending)} not ready within {timeout} seconds.")
+            path = (kind_path('Deployment', self.namespace) +
+                    f'?watch=1&resourceVersion={resource_version}&timeoutSeconds={max(1, math.ceil(remaining))}')
+            try:
+                await asyncio.wait_for(follow(path), remaining)
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                # Deadline, or the watch was cut off: watch again from the last event seen.
+                pass
+            except ApiException as e:
+                # Resource version too old, start over from a fresh list.
+                if e.status != 410:
+                    raise
+                resource_version = await self.list_pending(pending)
+
+    # Create the Deployments, wait until they are ready, then create the Services and HPAs.
+    # Returns: 1 on success, 0 on failure, as Env.setup_functions.
+    async def setup_functions(self, deployments, services, timeout=60):
+        try:
+            await asyncio.gather(*[self.create(deployment.dep) for deployment in deployments])
+            await self.wait_ready([deployment.deployment_name for deployment in deployments], timeout)
+            for service in services:
+                for manifest in service_manifests(service):
+                    if manifest['kind'] == 'Deployment':
+                        continue
+                    created = await self.create(manifest)
+                    if manifest['kind'] == 'Service':
+                        # Known for the invocations, see Service.get_service_ip.
+                        service.ip_ = created['spec'].get('clusterIP')
+        except (ApiException, TimeoutError, OSError, asyncio.IncompleteReadError) as e:
+            print(f'\n[ERROR] {e}')
+            return 0
+        if self.verbose:
+            print(f"[UPDATE] Deployments {[d.deployment_name for d in deployments]} set up.")
+        return 1
+
+    # Delete the objects of @param services and return once they are gone, as Service.delete_service.
+    async def delete_functions(self, services, timeout=60):
+        manifests = [manifest for service in services for manifest in service_manifests(service)]
+        await asyncio.gather(*[self.delete(manifest, missing_ok=True) for manifest in manifests])
+        await self.wait_deleted(manifests, timeout)
+        for service in services:
+            service.ip_ = None
+
+    async def scale_deployments(self, deployments, replicas, timeout=30):
+        await asyncio.gather(*[self.scale(d.deployment_name, r) for d, r in zip(deployments, replicas)])
+        await self.wait_ready([d.deployment_name for d in deployments], timeout)
+
+    # Run @param coro on the client's loop thread and return its result.
+    def run(self, coro):
+        if self.pid_ != os.getpid():
+            # A forked process doesn't have the parent's loop thread, nor may it share its connections.
+            self.loop_ = asyncio.new_event_loop()
+            threading.Thread(target=self.loop_.run_forever, daemon=True).start()
+            self.connection.idle_ = []
+            self.connection.slots_ = None
+            self.pid_ = os.getpid()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop_).result()
+
+    def close(self):
+        if self.loop_ is not None and self.pid_ == os.getpid():
+            self.run(self.connection.close())
+            self.loop_.call_soon_threadsafe(self.loop_.stop)
+            self.loop_ = None
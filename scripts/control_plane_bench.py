@@ -0,0 +1,80 @@
+import argparse
+import asyncio
+import json
+import time
+
+from control_plane import ControlPlaneClient
+from fake_api_server import FakeApiServer
+from manifests import render_function
+from setup_deployment import Deployment
+from setup_service import Service
+
+# Deployments and Services of @param n copies of the benchmarks of @param benchmarks, as dqn_main.py makes them.
+def make_benchmarks(benchmarks, n):
+    bm_functions = []
+    for i in range(n):
+        benchmark = benchmarks[i % len(benchmarks)]
+        deployments, services = [], []
+        for function in benchmark['functions']:
+            new_funct = f'{function}-{i:010d}'
+            dep, svc, hpa = render_function(function, new_funct)
+            deployments.append(Deployment(dep, None))
+            services.append(Service(new_funct, None, svc['spec']['ports'][0]['port'], manifests=[dep, svc, hpa]))
+        bm_functions.append((deployments, services))
+    return bm_functions
+
+# Deploy, scale to @param replicas and delete every benchmark, one at a time or all at once.
+# Returns: seconds of each phase.
+def run_phases(client, bm_functions, replicas, concurrent, timeout=60):
+    async def each(coros):
+        if concurrent:
+            return await asyncio.gather(*coros)
+        return [await coro for coro in coros]
+    timings = {}
+    start = time.perf_counter()
+    results = client.run(each([client.setup_functions(deps, svcs, timeout=timeout) for deps, svcs in bm_functions]))
+    assert all(results), "[ERROR] Setup failed."
+    timings['setup'] = time.perf_counter() - start
+    start = time.perf_counter()
+    client.run(each([client.scale_deployments(deps, [replicas] * len(deps), timeout=timeout) for deps, _ in bm_functions]))
+    timings['scale'] = time.perf_counter() - start
+    start = time.perf_counter()
+    client.run(each([client.delete_functions(svcs) for _, svcs in bm_functions]))
+    timings['delete'] = time.perf_counter() - start
+    return timings
+
+def main(args):
+    with open(args.config, 'r') as f:
+        benchmarks = json.load(f)['benchmarks']
+    for concurrent in [False, True]:
+        server = FakeApiServer(latency=args.latency, ready_delay=args.ready_delay, delete_delay=args.delete_delay)
+        url = server.start()
+        client = ControlPlaneClient.from_url(url, max_connections=args.max_connections, poll_interval=args.poll_interval)
+        bm_functions = make_benchmarks(benchmarks, args.n)
+        timings = run_phases(client, bm_functions, args.replicas, concurrent)
+        # Every Service knew its IP, every Deployment was scaled, and everything was gone when the deletes returned.
+        assert all(svc.ip_ is None for _, svcs in bm_functions for svc in svcs)
+        assert not any(server.objects.values()), "[ERROR] Objects left after delete."
+        client.close()
+        server.stop()
+        print(f"{'Concurrent' if concurrent else 'Sequential'}: " +
+              ', '.join(f'{phase} {round(seconds, 3)} s' for phase, seconds in timings.items()) +
+              f', {client.connection.num_requests} requests')
+
+#
+# Example cmd:
+#   python3 control_plane_bench.py --config dqn_configs.json -n 10
+#   python3 control_plane_bench.py --config configs.json -n 50 --latency 0.01 --ready-delay 2 --delete-delay 1
+#
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--config', default='dqn_configs.json', help='Benchmarks config')
+    parser.add_argument('-n', type=int, default=10, help='Number of benchmarks')
+    parser.add_argument('--replicas', type=int, default=3, help='Replicas to scale to')
+    parser.add_argument('--latency', type=float, default=0.005, help='Seconds per request of the fake API server')
+    parser.add_argument('--ready-delay', type=float, default=0.5, help='Seconds until a Deployment of the fake API server is ready')
+    parser.add_argument('--delete-delay', type=float, default=0.2, help='Seconds until a deleted object of the fake API server is gone')
+    parser.add_argument('--poll-interval', type=float, default=0.1, help='Seconds between two reads of deleted objects')
+    parser.add_argument('--max-connections', type=int, default=8, help='Connections of the client pool')
+    args = parser.parse_args()
+    main(args)
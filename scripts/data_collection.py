@@ -19,33 +19,32 @@ from pprint import pprint
 from itertools import chain, combinations
 from setup_service import Service
 from setup_deployment import Deployment
-
-
-# Take Deployment, Service, and HPA dicts and reassign the names.
-def rename_yaml(dep, svc, hpa, new_name):
-    # Update Deployment name.
-    dep['metadata']['name'] = new_name
-    dep['metadata']['labels']['app'] = new_name
-    dep['spec']['selector']['matchLabels']['app'] = new_name
-    dep['spec']['template']['metadata']['labels']['app'] = new_name
-    for i in range(len(dep['spec']['template']['spec']['containers'])):
-        if dep['spec']['template']['spec']['containers'][i]['name'] != 'relay':
-            dep['spec']['template']['spec']['containers'][i]['name'] = new_name
-    # Update chaining.
-    if "-addr" in dep['spec']['template']['spec']['containers'][i]['args']:
-        address = dep['spec']['template']['spec']['containers'][i]['args'][1]
-        ind = address.index('.')
-        address = address[:ind] + new_name[-11:] + address[ind:]
-        dep['spec']['template']['spec']['containers'][i]['args'][1] = address
-    # Update Service name.
-    svc['metadata']['name'] = new_name
-    svc['spec']['selector']['app'] = new_name
-
-    # Update HPA name.
-    hpa['metadata']['name'] = new_name + '-hpa'
-    hpa['spec']['scaleTargetRef']['name'] = new_name
-
-    return dep, svc, hpa
+from cluster_state import ClusterSnapshot
+from latency_stats import compute_latency_stats
+from dataset import DatasetWriter
+from deployment_pool import DeploymentPool, reset_replicas
+from manifests import render_function
+
+
+# Render the manifests of the functions of @param benchmark with a random id to avoid conflicts
+# (see manifests.py), and instantiate their Deployments and Services.
+# @param scales : replicas of each function to freeze its HPA at (as expanded_dc.py sweeps them),
+#                 None to leave the HPAs autoscaling.
+# Returns: (benchmark name with the id, deployments, services, entry_service)
+def make_functions(benchmark, api, scales=None):
+    functions = benchmark['functions']
+    rand_id = ''.join(random.choices(string.ascii_lowercase, k=10))
+    if scales is None:
+        scales = [None] * len(functions)
+    services = []
+    deployments = []
+    for function, scale in zip(functions, scales):
+        new_funct = function + '-' + rand_id
+        new_dep, new_svc, new_hpa = render_function(function, new_funct, scale=scale)
+        services.append(Service(new_funct, None, new_svc['spec']['ports'][0]['port'], manifests=[new_dep, new_svc, new_hpa]))
+        deployments.append(Deployment(new_dep, api))
+    entry_service = services[functions.index(benchmark['entry-point'])]
+    return benchmark['name'] + '-' + rand_id, deployments, services, entry_service
 
 def delete_files_in_directory(directory_path):
    try:
@@ -67,6 +66,9 @@ class DataCollect:
         self.verbose = verbose
         self.success_count = success_count
         self.rand_string = ''.join(random.choices(string.ascii_lowercase, k=10))
+        # Dataset the rows are appended to, and how many rows of `data` it holds.
+        self.writer_ = None
+        self.saved_rows_ = 0
         if args != None:
             # Save experiment configs.
             with open(args.config, 'r') as f:
@@ -95,18 +97,23 @@ class DataCollect:
             workload.append((benchmark, rps, duration))
         return workload
 
-    # Save the current data to a pickle file.
+    # Append the rows collected since the last save to the dataset directory
+    # `./data/data_<id>` (or `folder/file`), see dataset.py.
     def save_data(self, folder=None, file=None):
         make_dir('./data')
         if file == None or folder == None:
-            # Dump data in pickle file.
             folder = './data'
-            data_filename = f'./data/data_{self.rand_string}.pickle'
+            data_filename = f'./data/data_{self.rand_string}'
         else:
             make_dir(folder)
             data_filename = f'{folder}/{file}'
-        with open(data_filename, 'wb') as handle:
-            pickle.dump(list(self.data), handle, protocol=pickle.HIGHEST_PROTOCOL)
+        if self.writer_ is None or self.writer_.folder != data_filename:
+            self.writer_ = DatasetWriter(data_filename)
+            self.saved_rows_ = 0
+        # Only the new rows are copied out of the shared list and written.
+        rows = self.data[self.saved_rows_:]
+        self.writer_.append(rows)
+        self.saved_rows_ += len(rows)
         print(f"[SAVE] Data saved in {data_filename}.")
         with open(f'{folder}/successes_{self.rand_string}.pickle', 'wb') as handle:
             pickle.dump(list(self.success_count), handle, protocol=pickle.HIGHEST_PROTOCOL)
@@ -152,27 +159,28 @@ class DataCollect:
         if ret.returncode != 0:
             assert False, f"\n[ERROR] Failed to run command `{set_scale_cmd}`\n[ERROR] Error message: {ret.stderr}"
 
-    # Get the percent utilizations.
+    # Get the percent utilizations from a ClusterSnapshot.
     # [mem, cpu]
-    def get_resource_metrics(self, name):
-        metrics = []
-        for i in range(2):
-            get_resource_metrics_cmd = f"kubectl get hpa/{name}-hpa -o jsonpath='{{.status.currentMetrics[{i}].resource.current.averageUtilization}}'"
-            try:
-                ret = int(run(get_resource_metrics_cmd, shell=True, capture_output=True, universal_newlines=True).stdout)
-                metrics.append(ret)
-            except Exception as e:
-                print(f"[ERROR] Benchmark: {name}")
-                print(e)
-        return metrics
+    def get_resource_metrics(self, snapshot, name, num_metrics=2):
+        return snapshot.get_resource_metrics(name)[:num_metrics]
 
     # Setup the benchmark, invoke, print stats, and delete service.
     # This function will be multithreaded to run several benchmarks concurrently.
-    def run_service(self, env, benchmark_name, deployments, services, entry_service, rps, duration, max_retries=5, delay_time=2, num_metrics=2, timeout=60):
+    # warm : the benchmark is already deployed (see deployment_pool.py), only reset its replicas
+    # keep_deployed : don't delete the benchmark after a successful sample, so it can be reused
+    def run_service(self, env, benchmark_name, deployments, services, entry_service, rps, duration, max_retries=5, delay_time=2, num_metrics=2, timeout=60,
+                    warm=False, keep_deployed=False):
         # Check if the benchmark already exists. If not, deploy. If so, skip deployment.
         # Check if benchmark setup is successful. If not, attempt to delete existing deployments.
         # TODO: deploy only the services that the benchmark is missing. For example, if streaming and decoder are ready, deploy recog only.
-        if not env.setup_functions(deployments, services, timeout=timeout):
+        if warm:
+            if not reset_replicas(env, deployments, timeout=timeout):
+                env.delete_functions(services)
+                self.current_benchmarks[benchmark_name] = 0
+                print(f"[ERROR] Benchmark `{benchmark_name}` could not be rescaled, deleted it.")
+                self.success_count.append(0)
+                return 0
+        elif not env.setup_functions(deployments, services, timeout=timeout):
             env.delete_functions(services)
             self.current_benchmarks[benchmark_name] = 0
             print(f"[ERROR] Benchmark `{benchmark_name}` setup failed, please read error message and try again.")
@@ -185,6 +193,8 @@ class DataCollect:
         except Exception as e:
             print(f'[ERROR] Error encountered when invoking {benchmark_name}.')
             print(f'[ERROR] Error message: {e}')
+            env.delete_functions(services)
+            self.current_benchmarks[benchmark_name] = 0
             self.success_count.append(0)
             return
         # Get timestamp.
@@ -197,43 +207,42 @@ class DataCollect:
         mem_limits = []
         cpu_utilizations = []
         mem_utilizations = []
+        # Read all Deployments and HPAs in one pass, then look everything up from memory.
+        snapshot = ClusterSnapshot(env.api)
+        metrics_success = False
+        # Try getting metrics multiple times
+        for i in range(max_retries):
+            snapshot.refresh()
+            metrics = {service.name: self.get_resource_metrics(snapshot, service.name, num_metrics) for service in services}
+            if all(len(m) == num_metrics for m in metrics.values()):
+                metrics_success = True
+                print(f"[INFO] Metrics successfully collected for benchmark `{benchmark_name}.`")
+                break
+            print(f"[ERROR] Not enough metrics were returned for benchmark `{benchmark_name}.`")
+            print(f"[INFO] Retrying... ({i+1}/{max_retries})")
+            time.sleep(delay_time)
+        # Check if metrics were acquired.
+        if not metrics_success:
+            print(f"[ERROR] Failed to return metrics for benchmark `{benchmark_name}.`")
+            env.delete_functions(services)
+            self.current_benchmarks[benchmark_name] = 0
+            self.success_count.append(0)
+            return
         for service in services:
             # Get the number of replicas.
-            get_replicas_cmd = f"kubectl get deployment/{service.name} -o jsonpath='{{.spec.replicas}}'"
-            replicas.append(int(run(get_replicas_cmd, shell=True, capture_output=True, universal_newlines=True).stdout))
+            replicas.append(snapshot.get_replicas(service.name))
             # Get the requests and limits.
-            get_cpu_requests_cmd = f"kubectl get deployment/{service.name} -o jsonpath='{{.spec.template.spec.containers[0].resources.requests.cpu}}'"
-            get_mem_requests_cmd = f"kubectl get deployment/{service.name} -o jsonpath='{{.spec.template.spec.containers[0].resources.requests.memory}}'"
-            get_cpu_limits_cmd = f"kubectl get deployment/{service.name} -o jsonpath='{{.spec.template.spec.containers[0].resources.limits.cpu}}'"
-            get_mem_limits_cmd = f"kubectl get deployment/{service.name} -o jsonpath='{{.spec.template.spec.containers[0].resources.limits.memory}}'"
-            cpu_requests.append(run(get_cpu_requests_cmd, shell=True, capture_output=True, universal_newlines=True).stdout)
-            mem_requests.append(run(get_mem_requests_cmd, shell=True, capture_output=True, universal_newlines=True).stdout)
-            cpu_limits.append(run(get_cpu_limits_cmd, shell=True, capture_output=True, universal_newlines=True).stdout)
-            mem_limits.append(run(get_mem_limits_cmd, shell=True, capture_output=True, universal_newlines=True).stdout)         
-            
-            metrics_success = False
-            # Try getting metrics multiple times
-            for i in range(max_retries):
-                metrics = self.get_resource_metrics(service.name)
-                if len(metrics) == num_metrics:
-                    metrics_success = True
-                    print(f"[INFO] Metrics successfully collected for benchmark `{benchmark_name}.`")
-                    break
-                print(f"[ERROR] Not enough metrics were returned for benchmark `{benchmark_name}.`")
-                print(f"[INFO] Retrying... ({i+1}/{max_retries})")
-                time.sleep(delay_time)
-            # Check if metrics were acquired.
-            if not metrics_success:
-                print(f"[ERROR] Failed to return metrics for benchmark `{benchmark_name}.`")
-                env.delete_functions(services)
-                self.current_benchmarks[benchmark_name] = 0
-                self.success_count.append(0)
-                return 
-            mem_utilizations.append(metrics[0])
-            cpu_utilizations.append(metrics[1])
+            cpu_request, mem_request = snapshot.get_requests(service.name)
+            cpu_limit, mem_limit = snapshot.get_limits(service.name)
+            cpu_requests.append(cpu_request)
+            mem_requests.append(mem_request)
+            cpu_limits.append(cpu_limit)
+            mem_limits.append(mem_limit)
+            mem_utilizations.append(metrics[service.name][0])
+            cpu_utilizations.append(metrics[service.name][1])
         # Get latencies.
         lat_stat = env.get_latencies(stat_lat_filename)
-        if lat_stat == []:
+        if len(lat_stat) == 0:
             print(f"[ERROR] No responses were returned for benchmark `{benchmark_name}`, so no latency statistics have been computed.")
             env.delete_functions(services)
             self.current_benchmarks[benchmark_name] = 0
@@ -253,11 +262,7 @@ class DataCollect:
 
 
         # Print statistics.
-        lat_stat.sort()
-        lat_50 = lat_stat[(int)(len(lat_stat) * 0.5)]
-        lat_90 = lat_stat[(int)(len(lat_stat) * 0.90)]
-        lat_99 = lat_stat[(int)(len(lat_stat) * 0.99)]
-        lat_999 = lat_stat[(int)(len(lat_stat) * 0.999)]
+        lat_50, lat_90, lat_99, lat_999 = compute_latency_stats(lat_stat).percentiles()
 
         unpacked_env_state = self.unpack_env_state(env_state)
         num_nodes = len(unpacked_env_state)
@@ -288,7 +293,8 @@ class DataCollect:
 
         # Delete Deployments when finished. 
         self.success_count.append(1)  
-        env.delete_functions(services)
+        if not keep_deployed:
+            env.delete_functions(services)
         self.current_benchmarks[benchmark_name] = 0
         # Update data table.
         with self.lock:
@@ -328,7 +334,7 @@ def main(args):
         verbose = args.v
 
         # Instantiate Env.
-        env = Env(verbose=verbose)
+        env = Env(verbose=verbose, max_invocations=args.max_invocations)
 
         # Instantiate DataCollect.
         dc = DataCollect(data, current_benchmarks, success_count, args, verbose=verbose)
@@ -344,10 +350,20 @@ def main(args):
 
         benchmarks = json_data['benchmarks']
         processes = []
-
+        # Pool of deployed benchmarks reused across samples, and the instance leased by each process.
+        pool = None
+        if args.pool:
+            pool = DeploymentPool(env, lambda benchmark: make_functions(benchmark, env.api), idle_timeout=args.pool_idle_timeout,
+                                  max_instances=args.pool_max_instances, max_replicas=args.pool_max_replicas, verbose=verbose)
+        leases = {}
 
         t_start = time.time()
         while time.time() - t_start < int(args.t):
+            # Return the instances of the finished samples to the pool.
+            if pool is not None:
+                for p in [p for p in leases if not p.is_alive()]:
+                    pool.release(leases.pop(p))
+                pool.evict_idle()
             # Generate a list of random (benchmark, rps, duration) values
             dc.save_data()
             # dc.delete_latency_files()
@@ -357,46 +373,18 @@ def main(args):
                 benchmark_name = benchmark['name']
                 if verbose:
                     print(f"[INFO] Proposed incoming workload: {benchmark_name} at {rps} RPS for {duration} seconds.")
-                functions = benchmark['functions']
-                # Read configs for benchmark
-                entry_point_function = benchmark['entry-point']
-                entry_point_function_index = functions.index(entry_point_function)
-
-                # TODO: separate "official" YAMLS from the copies we make when running.
-                # Instantiate Services and Deployments
-                services = []
-                deployments = []
-                # is_already_deployed = dc.benchmark_already_deployed(benchmark_name)
-                # Assign this benchmark a random id to avoid conflicts
-                # if is_already_deployed:
-                rand_id = ''.join(random.choices(string.ascii_lowercase, k=10))
-                benchmark_name += '-' + rand_id
-                for i in range(len(functions)):
-                    # Read YAML of original function to get dicts.
-                    file_name = f"k8s-yamls/{functions[i]}.yaml"
-                    with open(path.join(path.dirname(__file__), file_name)) as f:
-                        dep, svc, hpa = yaml.load_all(f, Loader=SafeLoader)
-                    # Update function to include new id.
-                    new_funct = functions[i] + '-' + rand_id
-                    # Update the old dict to include new id.
-                    new_dep, new_svc, new_hpa = rename_yaml(dep, svc, hpa, new_funct)
-                    # List of manifests as dicts to be converted into new YAML file.
-                    manifests = [new_dep, new_svc, new_hpa]
-                    # Update file name
-                    make_dir('k8s-yamls/tmp')
-                    file_name = f"k8s-yamls/tmp/{new_funct}.yaml"
-                    # Dump manifests into new YAML file.
-                    with open(file_name, 'x') as f:
-                        yaml.dump_all(manifests, f)
-                    # Instantiate Service objects
-                    port = new_svc['spec']['ports'][0]['port']
-                    service = Service(new_funct, file_name, port)
-                    services.append(service)
-                    # Instantiate Deployment objects
-                    deployment = Deployment(new_dep, env.api)
-                    deployments.append(deployment)
-
-                entry_service = services[entry_point_function_index]
+                warm = False
+                if pool is not None:
+                    instance = pool.lease(benchmark)
+                    if instance is None:
+                        if verbose:
+                            print(f"[INFO] Dropped proposed benchmark `{benchmark_name}` because the deployment pool is full.")
+                        continue
+                    benchmark_name, deployments, services, entry_service = \
+                        instance.name, instance.deployments, instance.services, instance.entry_service
+                    warm = instance.warm
+                else:
+                    benchmark_name, deployments, services, entry_service = make_functions(benchmark, env.api)
                 # Check if the benchmark has already been deployed. If so, make a copy with a new ID.
                 # print("[INFO] Current benchmark statuses:")
                 # Sort current benchmark statuses
@@ -407,12 +395,15 @@ def main(args):
                 #     continue
                 
                 # If benchmark can be deployed, create and start process for multiprocessing.
-                p = Process(target=dc.run_service, args=(env, benchmark_name, deployments, services, entry_service, rps, duration))
+                p = Process(target=dc.run_service, args=(env, benchmark_name, deployments, services, entry_service, rps, duration),
+                            kwargs={'warm' : warm, 'keep_deployed' : pool is not None})
                 dc.current_benchmarks[benchmark_name] = 1
                 if verbose:
-                    print(f"[INFO] Process for benchmark `{benchmark_name}` created.\n")
+                    print(f"[INFO] Process for {'warm' if warm else 'new'} benchmark `{benchmark_name}` created.\n")
                 p.start()
                 processes.append(p)
+                if pool is not None:
+                    leases[p] = instance
             time.sleep(int(args.d))
 
         # Once all processes have finished, they can be joined.
@@ -420,6 +411,12 @@ def main(args):
         for p in processes:
             p.terminate()
             p.join()
+        if pool is not None:
+            print(f"[INFO] Deployment pool: {pool.hits} warm and {pool.misses} new deployments, {pool.evictions} evicted.")
+            # Delete the pooled benchmarks through the API before the blanket cleanup.
+            for p in list(leases):
+                pool.release(leases.pop(p))
+            pool.close()
         
 
     print("[INFO] Done!")
@@ -438,6 +435,13 @@ if __name__ == "__main__":
     parser.add_argument('-d', help='Interval between each workload generation (seconds)')
     # Verbosity: 't' for verbose, 'f' for non-verbose
     parser.add_argument('-v', action='store_true', help= 'Verbosity: -v for verbose, leave empty for non-verbose')
+    # Maximum number of invokers running at the same time
+    parser.add_argument('--max-invocations', type=int, default=None, help='Maximum number of invokers running at the same time')
+    # Reuse deployed benchmarks across samples instead of deploying a new copy for each
+    parser.add_argument('--pool', action='store_true', help='Reuse deployed benchmarks across samples')
+    parser.add_argument('--pool-idle-timeout', type=float, default=300, help='Seconds a pooled benchmark may stay idle before it is deleted')
+    parser.add_argument('--pool-max-instances', type=int, default=None, help='Maximum number of pooled benchmarks deployed at the same time')
+    parser.add_argument('--pool-max-replicas', type=int, default=None, help='Maximum number of replicas of the pooled benchmarks')
     #TODO: add -h argument
     args = parser.parse_args()
     main(args)
\ No newline at end of file
@@ -9,6 +9,37 @@ from scipy import stats
 from pathlib import Path
 from pprint import pprint
 
+# Columns of the rows saved by data_collection.DataCollect.save_data.
+DATA_COLUMNS = ['timestamp',
+                'benchmark',
+                'cpu_util',
+                'mem_util',
+                'replicas',
+                'cpu_requests', 'cpu_limits', 'mem_requests', 'mem_limits',
+                'duration',
+                'issued',
+                'completed',
+                'rps_real',
+                'rps_target',
+                '50th', '90th', '99th', '99.9th',
+                'avg_cpu_idle', 'avg_cpu_user', 'avg_cpu_system',
+                'avg_mem_free',
+                'avg_net_transmit (bps)', 'avg_net_receive (bps)']
+
+# Columns left out of the correlation heatmaps.
+HEATMAP_IGNORED_COLUMNS = ['timestamp', 
+                           'benchmark', 
+                           'cpu_requests', 'cpu_limits', 'mem_requests', 'mem_limits',
+                           'avg_cpu_idle', 
+                           'avg_cpu_user', 
+                           'avg_cpu_system',
+                           'avg_mem_free',
+                           'avg_net_transmit (bps)', 
+                           'avg_net_receive (bps)',
+                           'issued',
+                           'duration',
+                           'completed']
+
 def first_index(arr):
     return arr[0]
 
@@ -23,6 +54,26 @@ def standardize_format(entry):
     except:
         return entry
 
+# Column as floats: single-valued lists are unpacked as by standardize_format, and entries
+# it would skip (lists of a chain of functions) become NaN.
+def flatten_column(column):
+    if column.dtype != object:
+        return column.astype(np.float64)
+    return pd.to_numeric(column.map(standardize_format), errors='coerce')
+
+# Method names of DataFrame.corr for the metrics of Data.get_correlations.
+CORRELATION_METHODS = {'pearson': 'pearson', 'spearman': 'spearman', 'kendalltau': 'kendall'}
+
+# Correlations of every pair of columns of a flattened DataFrame (see flatten_column), rounded as in
+# Data.get_correlations. Rows with NaN are dropped pair by pair.
+def correlation_table(flat_df, metric='pearson', abs=False):
+    table_df = flat_df.corr(method=CORRELATION_METHODS[metric]).round(5)
+    # Constant columns correlate with nothing, not even themselves (DataFrame.corr gives 1 for kendall).
+    table_df = table_df.mask(np.diag(flat_df.nunique().to_numpy() < 2))
+    if abs:
+        table_df = table_df.abs()
+    return table_df
+
 def compute_rps_deltas(reals, targets):
     deltas = []
     for real, target in zip(reals, targets):
@@ -89,19 +140,12 @@ class Data:
         return round(stat.statistic, 5)        
         # print(f'Correlation using metric {metric}: {round(stat.statistic, 5)}')
 
+    # Correlations of every pair of columns, same values as get_correlations on each pair: the
+    # columns are flattened once and DataFrame.corr drops the skipped rows pair by pair.
     def get_correlation_table(self, benchmark, metric='pearson', ignored_columns=[], abs=False):
-        benchmark_index = self.df[self.df['benchmark'] == benchmark].index
-        benchmark_df = pd.DataFrame(self.df, columns=self.df.columns, index=benchmark_index)    
-        correlations_df = benchmark_df.drop(columns=ignored_columns, inplace=False)
-        for col1 in correlations_df.columns:
-            if col1 not in ignored_columns:
-                self.table['column'] = [col2 for col2 in correlations_df.columns]
-            if abs:
-                self.table[col1] = map(np.abs, [self.get_correlations(benchmark, col1, col2, metric=metric) for col2 in correlations_df.columns])
-            else:
-                self.table[col1] = [self.get_correlations(benchmark, col1, col2, metric=metric) for col2 in correlations_df.columns]
-        table_df = pd.DataFrame(data=self.table, columns=correlations_df.columns, index=self.table['column'])
-        return table_df
+        columns = [column for column in self.df.columns if column not in ignored_columns]
+        benchmark_df = self.df.loc[self.df['benchmark'] == benchmark, columns]
+        return correlation_table(benchmark_df.apply(flatten_column), metric=metric, abs=abs)
     
     def get_heatmap(self, benchmark, ignored_columns, metric='pearson', abs=False):
         heatmap_dims = (10, 10)
@@ -124,33 +168,18 @@ class Data:
         print(f"Heatmap for benchmark '{benchmark}' saved.")
 
 def main(args):
+    # Imported here, dataset.py imports DATA_COLUMNS from this module.
+    from dataset import read_data_frame, data_id as get_data_id
     data_file = args.f
     metric = args.m
-    data_id = data_file[-17:-7]
-    with open(data_file, 'rb') as handle:
-        data = pickle.load(handle)
-        df = pd.DataFrame(data)
+    data_id = get_data_id(data_file)
+    df = read_data_frame(data_file)
     # with open(f'./data/successes_{data_id}.pickle', 'rb') as handle:
     #     successes = pickle.load(handle)
     #     print(f'Benchmarks: {len(successes)}')
     #     print(f'Successes: {sum(successes)}')
     pd.set_option('display.max_columns', None)
     # remove RPS column
-    df.columns = ['timestamp',
-                  'benchmark', 
-                  'cpu_util',
-                  'mem_util',
-                  'replicas',
-                  'cpu_requests', 'cpu_limits', 'mem_requests', 'mem_limits',
-                  'duration', 
-                  'issued', 
-                  'completed', 
-                  'rps_real', 
-                  'rps_target', 
-                  '50th', '90th', '99th', '99.9th', 
-                  'avg_cpu_idle', 'avg_cpu_user', 'avg_cpu_system',
-                              'avg_mem_free',
-                              'avg_net_transmit (bps)', 'avg_net_receive (bps)']
     df['rps_delta'] = compute_rps_deltas(df['rps_real'], df['rps_target'])
     folder = args.d
     benchmark = args.b
@@ -160,20 +189,7 @@ def main(args):
     data_object.get_cleaned_data(folder)
     df.to_pickle(f"{folder}/data_{data_id}.pickle")
 
-    ignored_columns = ['timestamp', 
-                       'benchmark', 
-                       'cpu_requests', 'cpu_limits', 'mem_requests', 'mem_limits',
-                       'avg_cpu_idle', 
-                       'avg_cpu_user', 
-                       'avg_cpu_system',
-                        'avg_mem_free',
-                        'avg_net_transmit (bps)', 
-                        'avg_net_receive (bps)',
-                        'issued',
-                        'duration',
-                        'completed']
-
-    data_object.get_heatmap(benchmark, ignored_columns=ignored_columns, metric=metric, abs=args.a)
+    data_object.get_heatmap(benchmark, ignored_columns=HEATMAP_IGNORED_COLUMNS, metric=metric, abs=args.a)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -0,0 +1,80 @@
+import os
+import pickle
+import pandas as pd
+import pyarrow as pa
+
+from data_processing import DATA_COLUMNS
+from dataset_paths import dataset_parts, data_id
+
+# Types of the DATA_COLUMNS. Per-function values (one per function of a chained benchmark)
+# and per-node values (one per worker node) are lists.
+DATA_SCHEMA = pa.schema(list(zip(DATA_COLUMNS, [
+    pa.float64(),                                           # timestamp
+    pa.string(),                                            # benchmark
+    pa.list_(pa.float64()), pa.list_(pa.float64()),         # cpu_util, mem_util (per function)
+    pa.list_(pa.int64()),                                   # replicas (per function)
+    pa.list_(pa.string()), pa.list_(pa.string()),           # cpu_requests, cpu_limits (per function)
+    pa.list_(pa.string()), pa.list_(pa.string()),           # mem_requests, mem_limits (per function)
+    pa.int64(), pa.int64(), pa.int64(),                     # duration, issued, completed
+    pa.float64(), pa.float64(),                             # rps_real, rps_target
+    pa.float64(), pa.float64(), pa.float64(), pa.float64(), # 50th, 90th, 99th, 99.9th
+    pa.list_(pa.float64()), pa.list_(pa.float64()), pa.list_(pa.float64()),  # avg_cpu_* (per node)
+    pa.list_(pa.float64()),                                 # avg_mem_free (per node)
+    pa.list_(pa.float64()), pa.list_(pa.float64()),         # avg_net_* (per node)
+])))
+
+# Convert rows as saved by data_collection.DataCollect into a Table with DATA_SCHEMA.
+def rows_to_table(rows):
+    columns = list(zip(*rows)) if rows else [[] for _ in DATA_COLUMNS]
+    return pa.Table.from_arrays([pa.array(list(column), type=field.type) for column, field in zip(columns, DATA_SCHEMA)],
+                                schema=DATA_SCHEMA)
+
+class DatasetWriter:
+    """Appends rows to a dataset directory of Arrow IPC files, one file per `append`.
+
+    Only the new rows are written on each append, so saving costs the same however big
+    the dataset is. Each part is written to a temporary file and renamed, so a reader
+    (or a crash) never sees a partial part.
+
+    - Attributes:
+        - `folder` (String) : the dataset directory, e.g. `./data/data_<id>`.
+        - `num_parts` (Int) : parts written so far (existing parts are kept).
+    - Methods:
+        - `append` (List[List]) : write rows as a new part, no-op if there are none.
+    """
+    def __init__(self, folder):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+        self.num_parts = len(dataset_parts(folder))
+
+    def append(self, rows):
+        if len(rows) == 0:
+            return
+        table = rows_to_table(rows)
+        filename = os.path.join(self.folder, f'part-{self.num_parts:06d}.arrow')
+        with pa.OSFile(filename + '.tmp', 'wb') as sink:
+            with pa.ipc.new_file(sink, DATA_SCHEMA) as writer:
+                writer.write_table(table)
+        os.replace(filename + '.tmp', filename)
+        self.num_parts += 1
+
+# Memory-map the parts of a dataset directory into one Table, reading only @param columns
+# (all if None). The buffers stay on disk until they are used.
+def load_dataset(folder, columns=None):
+    tables = []
+    for part in dataset_parts(folder):
+        table = pa.ipc.open_file(pa.memory_map(part, 'r')).read_all()
+        tables.append(table.select(columns) if columns is not None else table)
+    if not tables:
+        schema = pa.schema([DATA_SCHEMA.field(c) for c in columns]) if columns is not None else DATA_SCHEMA
+        return schema.empty_table()
+    return pa.concat_tables(tables)
+
+# Load data collected by data_collection.py as a DataFrame with the DATA_COLUMNS (or @param columns):
+# a dataset directory, or a pickle of rows from older runs.
+def read_data_frame(data_file, columns=None):
+    if os.path.isdir(data_file):
+        return load_dataset(data_file, columns).to_pandas()
+    with open(data_file, 'rb') as handle:
+        df = pd.DataFrame(pickle.load(handle), columns=DATA_COLUMNS)
+    return df[columns] if columns is not None else df
@@ -0,0 +1,62 @@
+import argparse
+import os
+import pickle
+import random
+import shutil
+import time
+
+from dataset import DatasetWriter, read_data_frame
+
+# A row as data_collection.DataCollect.run_service appends it, for a chain of @param num_functions.
+def make_row(num_functions=1, num_nodes=3):
+    per_function = lambda: [random.random() * 100 for _ in range(num_functions)]
+    per_node = lambda: [random.random() for _ in range(num_nodes)]
+    lats = sorted(random.random() * 1e5 for _ in range(4))
+    return [time.time(), random.choice(['fibonacci-python', 'hotel-app-geo', 'video-analytics']),
+            per_function(), per_function(), [random.randint(1, 10) for _ in range(num_functions)],
+            ['100m'] * num_functions, ['1'] * num_functions, ['128Mi'] * num_functions, ['256Mi'] * num_functions,
+            random.randint(10, 60), 6000, 5990, 99.8, 100.0] + lats + [per_node() for _ in range(6)]
+
+def main(args):
+    pickle_file = os.path.join(args.dir, 'data_bench.pickle')
+    dataset_dir = os.path.join(args.dir, 'data_bench')
+    shutil.rmtree(dataset_dir, ignore_errors=True)
+    os.makedirs(args.dir, exist_ok=True)
+    rows = []
+    writer = DatasetWriter(dataset_dir)
+    print(f'{"rows":>8} {"pickle save (ms)":>17} {"append (ms)":>12} {"pickle load (ms)":>17} {"dataset load (ms)":>18} {"projected (ms)":>15}')
+    for save in range(1, args.saves + 1):
+        new_rows = [make_row(random.choice([1, 1, 3])) for _ in range(args.rows_per_save)]
+        rows.extend(new_rows)
+        # As DataCollect.save_data did: dump every row so far.
+        start = time.perf_counter()
+        with open(pickle_file, 'wb') as handle:
+            pickle.dump(list(rows), handle, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle_ms = (time.perf_counter() - start) * 1e3
+        start = time.perf_counter()
+        writer.append(new_rows)
+        append_ms = (time.perf_counter() - start) * 1e3
+        if save % args.report_every == 0:
+            start = time.perf_counter()
+            read_data_frame(pickle_file)
+            pickle_load_ms = (time.perf_counter() - start) * 1e3
+            start = time.perf_counter()
+            read_data_frame(dataset_dir)
+            dataset_load_ms = (time.perf_counter() - start) * 1e3
+            start = time.perf_counter()
+            read_data_frame(dataset_dir, ['benchmark', 'rps_real', '90th'])
+            projected_ms = (time.perf_counter() - start) * 1e3
+            print(f'{len(rows):>8} {pickle_ms:>17.2f} {append_ms:>12.2f} {pickle_load_ms:>17.1f} {dataset_load_ms:>18.1f} {projected_ms:>15.1f}')
+
+#
+# Example cmd:
+#   python3 dataset_bench.py --saves 200 --rows-per-save 50
+#
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dir', default='/tmp/dataset_bench', help='Where to write the pickle and the dataset')
+    parser.add_argument('--saves', type=int, default=200, help='Number of saves, as iterations of data_collection.main')
+    parser.add_argument('--rows-per-save', type=int, default=50, help='Rows collected between two saves')
+    parser.add_argument('--report-every', type=int, default=40, help='Saves between two reports')
+    args = parser.parse_args()
+    main(args)
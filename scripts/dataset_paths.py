@@ -0,0 +1,14 @@
+import glob
+import os
+
+# Paths of the datasets of data_collection.py, without the pyarrow and pandas imports of dataset.py,
+# so entry points that only look at the files (e.g. the cache of batch_analysis.py) start fast.
+
+# Part files of a dataset directory, in write order.
+def dataset_parts(folder):
+    return sorted(glob.glob(os.path.join(folder, 'part-*.arrow')))
+
+# Id of a data file, `<id>` in `data_<id>` or `data_<id>.pickle`.
+def data_id(data_file):
+    name = os.path.splitext(os.path.basename(os.path.normpath(data_file)))[0]
+    return name[len('data_'):] if name.startswith('data_') else name
@@ -0,0 +1,154 @@
+import time
+
+# Replicas a Deployment starts with when it is created, from its manifest.
+def initial_replicas(deployment):
+    return deployment.dep['spec'].get('replicas', 1)
+
+# Scale the Deployments of a warm benchmark back to their initial replicas through the API, so
+# a sample starts from the same state as on a fresh deployment. Their HPAs take over from there.
+# Returns: 1 on success, 0 if a Deployment could not be scaled.
+def reset_replicas(env, deployments, timeout=60):
+    try:
+        for deployment in deployments:
+            env.scale_deployments(deployment, initial_replicas(deployment), timeout=timeout)
+    except Exception as e:
+        print(f'[ERROR] {e}')
+        return 0
+    return 1
+
+class PooledBenchmark:
+    """A deployed copy of a benchmark owned by a DeploymentPool.
+
+    - Attributes:
+        - `name` (String) : benchmark name with its random id, as given to DataCollect.run_service.
+        - `benchmark` (String) : name of the benchmark in the config.
+        - `deployments`, `services` (List) : its functions.
+        - `entry_service` (Service) : the function that is invoked.
+        - `warm` (Bool) : it has been deployed by a previous sample.
+        - `leased` (Bool) : a sample is using it.
+        - `replicas` (Int) : its replicas the last time it was returned, for the budget.
+        - `last_used` (Float) : when it was last returned (time.monotonic).
+    """
+    def __init__(self, name, benchmark, deployments, services, entry_service):
+        self.name = name
+        self.benchmark = benchmark
+        self.deployments = deployments
+        self.services = services
+        self.entry_service = entry_service
+        self.warm = False
+        self.leased = False
+        self.replicas = sum(initial_replicas(d) for d in deployments)
+        self.last_used = time.monotonic()
+
+class DeploymentPool:
+    """Pool of deployed benchmark instances, keyed by benchmark name, reused across samples.
+
+    `lease` hands out an idle instance of the benchmark (warm) or makes a new one (cold,
+    deployed by the sample itself); the sample resets a warm instance's replicas with
+    `reset_replicas` instead of deploying it. `release` returns it to the pool once the
+    sample is done, unless its Deployments are gone (a failed sample deletes them).
+    Idle instances are evicted after `idle_timeout` seconds, and the least recently used
+    ones when a new instance would exceed `max_instances` or `max_replicas`. Not thread
+    safe: lease and release from the process that owns the pool.
+
+    - Attributes:
+        - `env` (Env) : the cluster (live Env or SimEnv).
+        - `make_functions` (Callable) : benchmark config -> (name, deployments, services, entry_service),
+          e.g. data_collection.make_functions.
+        - `idle_timeout` (Float) : seconds an instance may stay idle.
+        - `max_instances`, `max_replicas` (Int) : budget of the deployed instances, None for no limit.
+        - `hits`, `misses`, `evictions` (Int) : warm leases, cold leases and evicted instances.
+    - Methods:
+        - `lease` (Dict) : an instance of a benchmark config, None if the budget is full.
+        - `release` (PooledBenchmark) : return a leased instance.
+        - `evict_idle` : delete the instances idle for more than `idle_timeout`.
+        - `close` : delete all idle instances.
+    """
+    def __init__(self, env, make_functions, idle_timeout=300, max_instances=None, max_replicas=None, verbose=False):
+        self.env = env
+        self.make_functions = make_functions
+        self.idle_timeout = idle_timeout
+        self.max_instances = max_instances
+        self.max_replicas = max_replicas
+        self.verbose = verbose
+        self.instances_ = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def all_instances(self):
+        return [instance for instances in self.instances_.values() for instance in instances]
+
+    def idle_instances(self):
+        return [instance for instance in self.all_instances() if not instance.leased]
+
+    def num_replicas(self):
+        return sum(instance.replicas for instance in self.all_instances())
+
+    def fits(self, replicas):
+        if self.max_instances is not None and len(self.all_instances()) + 1 > self.max_instances:
+            return False
+        if self.max_replicas is not None and self.num_replicas() + replicas > self.max_replicas:
+            return False
+        return True
+
+    def lease(self, benchmark):
+        idle = [instance for instance in self.instances_.get(benchmark['name'], []) if not instance.leased]
+        if idle:
+            # Most recently used first, so the others age out.
+            instance = max(idle, key=lambda instance: instance.last_used)
+            instance.leased = True
+            self.hits += 1
+            return instance
+        name, deployments, services, entry_service = self.make_functions(benchmark)
+        instance = PooledBenchmark(name, benchmark['name'], deployments, services, entry_service)
+        # Make room by evicting the least recently used idle instances.
+        while not self.fits(instance.replicas):
+            idle = self.idle_instances()
+            if not idle:
+                return None
+            self.evict(min(idle, key=lambda instance: instance.last_used))
+        instance.leased = True
+        self.instances_.setdefault(benchmark['name'], []).append(instance)
+        self.misses += 1
+        return instance
+
+    # Still deployed: every Deployment of the instance exists and is not being deleted.
+    def is_deployed(self, instance):
+        try:
+            return all(self.env.is_deployed(d.deployment_name) for d in instance.deployments)
+        except Exception:
+            return False
+
+    def release(self, instance):
+        instance.leased = False
+        instance.last_used = time.monotonic()
+        if not self.is_deployed(instance):
+            # Deleted by a failed sample.
+            self.remove(instance)
+            return
+        instance.warm = True
+        instance.replicas = sum(self.env.get_replicas(d.deployment_name) for d in instance.deployments)
+
+    def remove(self, instance):
+        self.instances_[instance.benchmark].remove(instance)
+
+    def evict(self, instance):
+        if self.verbose:
+            print(f'[INFO] Evicting `{instance.name}` from the deployment pool.')
+        self.remove(instance)
+        self.evictions += 1
+        try:
+            self.env.delete_functions(instance.services)
+        except Exception as e:
+            print(f'[ERROR] Failed to delete `{instance.name}`: {e}')
+
+    def evict_idle(self):
+        now = time.monotonic()
+        for instance in self.idle_instances():
+            if now - instance.last_used > self.idle_timeout:
+                self.evict(instance)
+
+    def close(self):
+        for instance in self.idle_instances():
+            self.evict(instance)
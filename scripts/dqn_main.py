@@ -6,12 +6,15 @@ import random
 import matplotlib
 import matplotlib.pyplot as plt
 import wandb
-from collections import namedtuple, deque
 from itertools import count, product
-from multiprocessing import Process, Manager
 from RLEnv import RLEnv, ActionSpace
-from KubernetesEnv import KubernetesEnv, Benchmark
-from data_collection import make_dir, rename_yaml, delete_files_in_directory
+from KubernetesEnv import KubernetesEnv, make_benchmarks
+from vector_env import SimVectorEnv
+from replay_buffer import ReplayBuffer, PrioritizedReplayBuffer
+from learner import AsyncLearner
+from target_update import TargetUpdater
+from policy_inference import PolicyService
+from data_collection import make_dir, delete_files_in_directory
 
 import json
 import yaml
@@ -19,13 +22,12 @@ import string
 import argparse
 import time
 import pickle
+import numpy as np
 from subprocess import run
 from yaml.loader import SafeLoader
 from os import path
 from k8s_env_shim import Env
 from pprint import pprint
-from setup_service import Service
-from setup_deployment import Deployment
 
 import torch
 import torch.nn as nn
@@ -37,24 +39,6 @@ plt.ion()
 # if GPU available, use GPU
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
-### Experience Replay
-Transition = namedtuple('Transition', ('state', 'action', 'next_state', 'reward'))
-
-class ReplayMemory(object):
-    
-    def __init__(self, capacity):
-        self.memory = deque([], maxlen=capacity)
-    
-    def push(self, *args):
-        """Save a transition"""
-        self.memory.append(Transition(*args))
-        
-    def sample(self, batch_size):
-        return random.sample(self.memory, batch_size)
-    
-    def __len__(self):
-        return len(self.memory)
-
 ### Q-network
 class DQN(nn.Module):
     
@@ -75,40 +59,30 @@ class DQN(nn.Module):
 
 # BATCH_SIZE is the number of transitions sampled from the replay buffer
 # GAMMA is the discount factor as mentioned in the previous section
-# EPS_START is the starting value of epsilon
-# EPS_END is the final value of epsilon
-# EPS_DECAY controls the rate of exponential decay of epsilon, higher means a slower decay
+# The epsilon-greedy schedule (EPS_START, EPS_END, EPS_DECAY) is in policy_inference.py
 # TAU is the update rate of the target network
 # LR is the learning rate of the ``AdamW`` optimizer
 BATCH_SIZE = 8
 GAMMA = 0.99
-EPS_START = 0.9
-EPS_END = 0.05
-EPS_DECAY = 150
 TAU = 0.005
 LR = 1e-4
 
-steps_done = 0
-
-def select_action(state, policy_net, rl_env):
-    global steps_done
-    sample = random.random()
-    # Desmos format: 0.05+(0.9-0.05)*e^{(-1*x/1000)}
-    eps_threshold = EPS_END + (EPS_START - EPS_END) * \
-        math.exp(-1. * steps_done / EPS_DECAY)
-    steps_done += 1
-    if sample > eps_threshold:
-        with torch.no_grad():
-            # t.max(1) will return the largest column value of each row.
-            # second column on max result is index of where max element was
-            # found, so we pick action with the larger expected reward.
-            # Get the action that returns the highest Q value.
-            print(f'Taking BEST action (epsilon={round(eps_threshold, 3)})...')
-            return policy_net(state).max(1)[1].view(1, 1)
-    else:
-        print(f'Taking RANDOM action (epsilon={round(eps_threshold, 3)})...')
-        return torch.tensor([[rl_env.action_space.sample()]], device=device, dtype=torch.long)
-    
+# Epsilon-greedy action of one state with @param policy (PolicyService), as a tensor[[action_i]].
+def select_action(state, policy):
+    eps_threshold = policy.epsilon()
+    action, explored = policy.select_explored(state)
+    print(f'Taking {"RANDOM" if explored.item() else "BEST"} action (epsilon={round(eps_threshold, 3)})...')
+    return action.view(1, 1)
+
+# Pick one action per row of @param states (K, n_observations) with a single forward pass,
+# each row exploring with the current epsilon. Epsilon decays per transition.
+def select_actions(states, policy):
+    return policy.select(states).view(-1, 1)
+
+# Action selection with the live @param net: every optimizer step is seen, no frozen copy.
+def make_policy(net, n_actions):
+    return PolicyService(net, n_actions, mode=None, device=device)
+
 episode_durations = []
 
 def plot_durations(id, show_result=False):
@@ -133,23 +107,20 @@ def plot_durations(id, show_result=False):
 
 ### Training loop
 
+# Updates of the target network's weights, in place: soft θ′ ← τ θ + (1 −τ )θ′ every step,
+# and/or a hard copy every @param args.hard_update_every steps.
+def make_target_updater(args, target_net, policy_net):
+    tau = None if args.hard_only else TAU
+    return TargetUpdater(target_net, policy_net, tau=tau, hard_every=args.hard_update_every)
+
 def optimize_model(memory, policy_net, target_net, optimizer):
     if len(memory) < BATCH_SIZE:
         return
-    transitions = memory.sample(BATCH_SIZE)
-    # Transpose the batch (see https://stackoverflow.com/a/19343/3343043 for
-    # detailed explanation). This converts batch-array of Transitions 
-    # to Transition of batch-arrays.
-    batch = Transition(*zip(*transitions))
-    
-    # Compute a mask of non-final states and concatenate the batch elements
-    # (a final state would've been the one after which simulation ended)
-    non_final_mask = torch.tensor(tuple(map(lambda s: s is not None,
-                                            batch.next_state)), device=device, dtype=torch.bool)
-    non_final_next_states = torch.cat([s for s in batch.next_state if s is not None])
-    state_batch = torch.cat(batch.state)
-    action_batch = torch.cat(batch.action)
-    reward_batch = torch.cat(batch.reward)
+    # Contiguous batch tensors, dones marks the transitions whose next state is final
+    # (a final state would've been the one after which simulation ended).
+    # weights are the importance-sampling weights (all ones without prioritized replay).
+    state_batch, action_batch, reward_batch, next_state_batch, done_batch, weights, indices = \
+        memory.sample_weighted(BATCH_SIZE)
     
     # Compute Q(s_t, a) - the model computes Q(s_t), then we select the 
     # columns of actions taken. These are the actions which would've been taken
@@ -157,19 +128,21 @@ def optimize_model(memory, policy_net, target_net, optimizer):
     state_action_values = policy_net(state_batch).gather(1, action_batch)
     
     # Compute V(s_{t+1}) for all next states.
-    # Expected values of actions for non_final_next_states are computed based
+    # Expected values of actions for next states are computed based
     # on the "older" target_net; selecting their best reward with max(1)[0].
-    # This is merged based on the mask, such that we'll have either the expected 
+    # This is masked with dones, such that we'll have either the expected 
     # state value or 0 in case the state was final.
-    next_state_values = torch.zeros(BATCH_SIZE, device=device)
     with torch.no_grad():
-        next_state_values[non_final_mask] = target_net(non_final_next_states).max(1)[0]
+        next_state_values = target_net(next_state_batch).max(1)[0].masked_fill(done_batch, 0)
     # Compute the expected Q values
     expected_state_action_values = (next_state_values * GAMMA) + reward_batch
     
-    # Compute Huber loss
-    criterion = nn.SmoothL1Loss()
-    loss = criterion(state_action_values, expected_state_action_values.unsqueeze(1))
+    # Compute Huber loss, weighted per transition
+    criterion = nn.SmoothL1Loss(reduction='none')
+    elementwise_loss = criterion(state_action_values, expected_state_action_values.unsqueeze(1)).squeeze(1)
+    loss = (weights * elementwise_loss).mean()
+    # Update the priorities of the whole batch from its TD errors
+    memory.update_priorities(indices, state_action_values.detach().squeeze(1) - expected_state_action_values)
     
     # Optimize the model
     optimizer.zero_grad()
@@ -178,14 +151,16 @@ def optimize_model(memory, policy_net, target_net, optimizer):
     torch.nn.utils.clip_grad_value_(policy_net.parameters(), 100)
     optimizer.step()
     
-# Deploy a benchmark and return its Deployment and Service objects.
-def deploy_benchmark(benchmark, env):
-    if not env.setup_functions(benchmark.deployments, benchmark.services):
-        env.delete_functions(benchmark.services)
+# Deploy all benchmarks at once through the control-plane client (see Env.setup_benchmarks).
+def deploy_benchmarks(benchmarks, env):
+    results = env.setup_benchmarks([(benchmark.deployments, benchmark.services) for benchmark in benchmarks])
+    failed = [benchmark for benchmark, success in zip(benchmarks, results) if not success]
+    for benchmark in failed:
         print(f"[ERROR] Benchmark `{benchmark.name}` setup failed, please read error message and try again.")
-        return 0    
-
-    print(f'Successfully created objects for benchmark {benchmark.name}.')
+    env.delete_benchmarks([benchmark.services for benchmark in failed])
+    for benchmark, success in zip(benchmarks, results):
+        if success:
+            print(f'Successfully created objects for benchmark {benchmark.name}.')
 
 # Cleanup functions when done.
 def cleanup(aggressive=False, delete_manifests=True):
@@ -235,12 +210,111 @@ def wandb_log(log_data):
             "fn3": log_data['num_containers'][2]
         },
         "RPS": log_data['rps'],
-        "Episode": log_data['episode']
+        "Episode": log_data['episode'],
+        **({"Learner": log_data['learner']} if 'learner' in log_data else {})
     })
 
+# Train on a vectorized env (SyncVectorEnv or SimVectorEnv) for @param num_steps lock-steps:
+# every policy forward pass picks actions for all K envs and stores K transitions.
+# Returns the mean reward of each lock-step.
+def train_vectorized(vec_env, num_steps, memory, policy_net, target_net, optimizer, target_updater):
+    rewards_log = []
+    policy = make_policy(policy_net, vec_env.action_space.n)
+    states = vec_env.reset().to(device)
+    for step in range(num_steps):
+        actions = select_actions(states, policy)
+        observations, rewards, terminated, truncated, infos = vec_env.step(actions)
+        observations, rewards = observations.to(device), rewards.to(device)
+        # Done envs were reset, their transition ends in the final observation.
+        done = (terminated | truncated).to(device)
+        next_states = torch.where(done.unsqueeze(1), infos['final_observation'].to(device), observations)
+        memory.push_batch(states, actions, next_states, rewards, terminated)
+        states = observations
+        optimize_model(memory, policy_net, target_net, optimizer)
+        target_updater.step()
+        rewards_log.append(rewards.mean().item())
+    return rewards_log
+
+# Same as train_vectorized, but the optimization runs in @param learner's thread: the actor
+# picks actions with @param actor_net, refreshed from the published weights every step.
+def train_vectorized_async(vec_env, num_steps, learner, actor_net):
+    rewards_log = []
+    version = 0
+    policy = make_policy(actor_net, vec_env.action_space.n)
+    states = vec_env.reset().to(device)
+    for step in range(num_steps):
+        version = learner.weights.refresh(actor_net, version)
+        actions = select_actions(states, policy)
+        observations, rewards, terminated, truncated, infos = vec_env.step(actions)
+        observations, rewards = observations.to(device), rewards.to(device)
+        done = (terminated | truncated).to(device)
+        next_states = torch.where(done.unsqueeze(1), infos['final_observation'].to(device), observations)
+        learner.push_batch(states, actions, next_states, rewards, terminated)
+        states = observations
+        rewards_log.append(rewards.mean().item())
+    return rewards_log
+
+# Learner thread optimizing @param policy_net (and updating @param target_net) over @param memory.
+def make_learner(args, memory, policy_net, target_net, optimizer, target_updater):
+    def optimize(locked_memory):
+        optimize_model(locked_memory, policy_net, target_net, optimizer)
+        target_updater.step()
+    return AsyncLearner(memory, policy_net, optimize, batch_size=BATCH_SIZE, publish_every=args.publish_every,
+                        max_updates_per_step=args.max_updates_per_step or None)
+
+# Network the actor selects actions with, a copy of @param policy_net.
+def make_actor_net(policy_net, n_observations, n_actions):
+    actor_net = DQN(n_observations, n_actions).to(device)
+    actor_net.load_state_dict(policy_net.state_dict())
+    return actor_net
+
+# Uniform or prioritized replay buffer, as selected on the command line.
+def make_replay_buffer(args, n_observations, capacity=10000):
+    if args.prioritized:
+        return PrioritizedReplayBuffer(capacity, n_observations, device, alpha=args.alpha, beta=args.beta)
+    return ReplayBuffer(capacity, n_observations, device)
+
 def save_replay_buffer(replay_buffer, filename):
-    with open(filename, 'wb') as f:
-        pickle.dump(replay_buffer, f)
+    replay_buffer.save(filename)
+
+# Train against K simulated clusters instead of the live one.
+def main_sim(args):
+    with open(args.config, 'r') as f:
+        benchmarks = json.load(f)['benchmarks']
+    if args.data:
+        vec_env = SimVectorEnv.from_data(args.num_envs, benchmarks, args.data, t=int(args.t),
+                                         max_episode_steps=args.max_episode_steps, device=device)
+    else:
+        vec_env = SimVectorEnv(args.num_envs, benchmarks, t=int(args.t),
+                               max_episode_steps=args.max_episode_steps, device=device)
+    n_observations = vec_env.reset().shape[1]
+    n_actions = vec_env.action_space.n
+    policy_net = DQN(n_observations, n_actions).to(device)
+    target_net = DQN(n_observations, n_actions).to(device)
+    target_net.load_state_dict(policy_net.state_dict())
+    optimizer = optim.AdamW(policy_net.parameters(), lr=LR, amsgrad=True)
+    memory = make_replay_buffer(args, n_observations)
+    target_updater = make_target_updater(args, target_net, policy_net)
+
+    start = time.time()
+    if args.async_learner:
+        learner = make_learner(args, memory, policy_net, target_net, optimizer, target_updater)
+        learner.start()
+        actor_net = make_actor_net(policy_net, n_observations, n_actions)
+        rewards_log = train_vectorized_async(vec_env, int(args.e), learner, actor_net)
+        learner.stop()
+        print(f'{learner.updates} learner updates, {round(learner.updates_per_step(), 3)} per env step.')
+    else:
+        rewards_log = train_vectorized(vec_env, int(args.e), memory, policy_net, target_net, optimizer,
+                                       target_updater)
+    elapsed = time.time() - start
+    print(f'{int(args.e) * args.num_envs} transitions in {round(elapsed, 3)} seconds, '
+          f'mean reward of the last 100 steps: {np.mean(rewards_log[-100:])}')
+    run_id = 'sim-' + ''.join(random.choices(string.ascii_lowercase, k=6))
+    print(f'Saving models to saved_models/{run_id}...')
+    make_dir(f'saved_models/{run_id}')
+    torch.jit.script(target_net).save(f'saved_models/{run_id}/target_net.pth')
+    torch.jit.script(policy_net).save(f'saved_models/{run_id}/policy_net.pth')
 
 def main(args):
     # Manually configure RPS values for now.
@@ -254,46 +328,8 @@ def main(args):
     if not env_shim.setup_prometheus():
         print("[ERROR] Prometheus setup failed, please read error message and try again.")
         return 0
-    # List of all Benchmark objects
-    bm_objects = []
-    # Create manifests and objects.
-    for benchmark in benchmarks:
-        deployments, services = [], []
-        benchmark_name = benchmark['name']
-        rand_id = ''.join(random.choices(string.ascii_lowercase, k=10))
-        benchmark_name += '-' + rand_id
-        functions = benchmark['functions']
-        entry_point_function = benchmark['entry-point']
-        entry_point_function_index = functions.index(entry_point_function)            
-        sla = benchmark['sla']
-        rps_range = (benchmark['rps-min'], benchmark['rps-max'])
-        for i in range(len(functions)):
-            # Read YAML of original function to get dicts.
-            file_name = f"k8s-yamls/{functions[i]}.yaml"
-            with open(path.join(path.dirname(__file__), file_name)) as f:
-                dep, svc, hpa = yaml.load_all(f, Loader=SafeLoader)
-            # Update function to include new id.
-            new_funct = functions[i] + '-' + rand_id
-            # Update the old dict to include new id.
-            new_dep, new_svc, new_hpa = rename_yaml(dep, svc, hpa, new_funct)
-            # List of manifests as dicts to be converted into new YAML file.
-            manifests = [new_dep, new_svc]
-            # Update file name
-            make_dir('k8s-yamls/tmp')
-            file_name = f"k8s-yamls/tmp/{new_funct}.yaml"
-            # Dump manifests into new YAML file.
-            with open(file_name, 'x') as f:
-                yaml.dump_all(manifests, f)
-            # Instantiate Service objects
-            port = new_svc['spec']['ports'][0]['port']
-            service = Service(new_funct, file_name, port)
-            # Instantiate Deployment objects
-            deployment = Deployment(new_dep, env_shim.api)
-            # Update deployments and services
-            deployments.append(deployment)
-            services.append(service)
-        bm_object = Benchmark(benchmark_name, deployments, services, entry_point_function_index, sla, rps_range)
-        bm_objects.append(bm_object)
+    # Benchmark objects with a new random id each, from the cached manifests.
+    bm_objects = make_benchmarks(benchmarks, env_shim.api, apply_manifests=True)
     # Initialize KubernetesEnv
     k8s_env = KubernetesEnv(env_shim, bm_objects)
     timestep = int(args.t)
@@ -314,7 +350,15 @@ def main(args):
     target_net.load_state_dict(policy_net.state_dict())
 
     optimizer = optim.AdamW(policy_net.parameters(), lr=LR, amsgrad=True)
-    memory = ReplayMemory(10000)
+    memory = make_replay_buffer(args, n_observations)
+    target_updater = make_target_updater(args, target_net, policy_net)
+    # With the async learner, actions come from actor_net and policy_net belongs to the learner thread.
+    learner, actor_net, weights_version = None, policy_net, 0
+    if args.async_learner:
+        learner = make_learner(args, memory, policy_net, target_net, optimizer, target_updater)
+        actor_net = make_actor_net(policy_net, n_observations, n_actions)
+        learner.start()
+    policy = make_policy(actor_net, n_actions)
         
     if torch.cuda.is_available():
         num_episodes = len(RPS_VALS)
@@ -328,13 +372,7 @@ def main(args):
         rps = RPS_VALS[i_episode]
         print(f'\n>>> Running episode {i_episode + 1} with {rps} RPS.\n')
         # Simultaneously deploy all benchmarks.
-        processes = []
-        for bm in bm_objects:
-            p = Process(target=deploy_benchmark, args=(bm, env_shim))
-            processes.append(p)
-            p.start()
-        for proc in processes:
-            proc.join()
+        deploy_benchmarks(bm_objects, env_shim)
         # Update RPS for all benchmarks.
         for idx, bm in enumerate(bm_objects):
             bm.rps = rps
@@ -359,8 +397,10 @@ def main(args):
         state = torch.tensor(state, dtype=torch.float32, device=device).unsqueeze(0)
         for t in count():
             print(f'>>> Timestep: {t}')
+            if learner is not None:
+                weights_version = learner.weights.refresh(actor_net, weights_version)
             # action is of the form tensor[[action_i]]
-            action = select_action(state, policy_net, rl_env)
+            action = select_action(state, policy)
             observation, reward, terminated, truncated, lats = rl_env.step(action.item())
             reward = torch.tensor([reward], device=device)
             done = terminated or truncated
@@ -378,6 +418,9 @@ def main(args):
             log_data['observation:net_receive'] = net_receive
             log_data['num_containers'] = [benchmark.replicas for benchmark in k8s_env.benchmarks]
             log_data['rps'] = rps_
+            if learner is not None:
+                log_data['learner'] = {'updates': learner.updates, 'updates_per_step': learner.updates_per_step(),
+                                       'weights_version': weights_version}
             wandb_log(log_data)
 
             if terminated:
@@ -385,22 +428,19 @@ def main(args):
             else:
                 next_state = torch.tensor(observation, dtype=torch.float32, device=device).unsqueeze(0)
                 
-            # Store the transition in memory
-            memory.push(state, action, next_state, reward)
-            
             # Move to the next state
-            state = next_state
-            
-            # Perform one step of the optimization (on the policy network)
-            optimize_model(memory, policy_net, target_net, optimizer)
-            
-            # Soft update of the target network's weights
-            # θ′ ← τ θ + (1 −τ )θ′
-            target_net_state_dict = target_net.state_dict()
-            policy_net_state_dict = policy_net.state_dict()
-            for key in policy_net_state_dict:
-                target_net_state_dict[key] = policy_net_state_dict[key] * TAU + target_net_state_dict[key] * (1-TAU)
-            target_net.load_state_dict(target_net_state_dict)
+            state_, state = state, next_state
+
+            if learner is not None:
+                # The learner thread optimizes on its own.
+                learner.push(state_, action, next_state, reward)
+            else:
+                # Store the transition in memory
+                memory.push(state_, action, next_state, reward)
+                # Perform one step of the optimization (on the policy network)
+                optimize_model(memory, policy_net, target_net, optimizer)
+                # Update of the target network's weights
+                target_updater.step()
             
             if done:
                 episode_durations.append(t + 1)
@@ -413,17 +453,21 @@ def main(args):
         cleanup(delete_manifests=False)
 
     print('Done.')
+    if learner is not None:
+        learner.stop()
+        print(f'{learner.updates} learner updates, {round(learner.updates_per_step(), 3)} per env step.')
     print(f'Saving models to saved_models/{run_id}...')
     # Save Replay Buffer, policy net, and target net.
     make_dir(f'saved_models/{run_id}')
     target = f'saved_models/{rl_env.rand_id}/target_net.pth'
     policy = f'saved_models/{rl_env.rand_id}/policy_net.pth'
-    buffer = f'saved_models/{rl_env.rand_id}/replay_buffer.pickle'
+    buffer = f'saved_models/{rl_env.rand_id}/replay_buffer.npz'
     target_scripted = torch.jit.script(target_net)
     target_scripted.save(target)
     policy_scripted = torch.jit.script(policy_net)
     policy_scripted.save(policy)
     save_replay_buffer(memory, buffer)
+    rl_env.close()
     cleanup()
     plot_durations(run_id, show_result=True)
     plt.ioff()
@@ -433,5 +477,26 @@ if __name__ == "__main__":
     parser.add_argument('--config')
     parser.add_argument('-t')
     parser.add_argument('-e')
+    # Train against simulated clusters: -e is then the number of lock-steps of all envs.
+    parser.add_argument('--sim', action='store_true', help='Train against simulated clusters instead of the live one')
+    parser.add_argument('--num-envs', type=int, default=1, help='Number of simulated clusters stepped together')
+    parser.add_argument('--data', nargs='*', help='data_collection.py datasets to fit the simulated clusters on')
+    # Prioritized experience replay.
+    parser.add_argument('--prioritized', action='store_true', help='Sample transitions by TD error (prioritized replay)')
+    parser.add_argument('--alpha', type=float, default=0.6, help='Prioritization exponent of prioritized replay')
+    parser.add_argument('--beta', type=float, default=0.4, help='Initial importance-sampling exponent, annealed to 1')
+    # Asynchronous learner thread.
+    parser.add_argument('--async-learner', action='store_true', help='Optimize in a learner thread while the actor steps the env')
+    parser.add_argument('--publish-every', type=int, default=10, help='Learner updates between two weight publishes')
+    parser.add_argument('--max-updates-per-step', type=float, default=1.0, help='Cap on learner updates per env step (0 for no cap)')
+    # Target network updates.
+    parser.add_argument('--hard-update-every', type=int, default=None, help='Copy the policy net into the target net every N updates')
+    parser.add_argument('--hard-only', action='store_true', help='With --hard-update-every, skip the soft updates in between')
+    parser.add_argument('--max-episode-steps', type=int, default=200, help='Truncate simulated episodes after this many steps')
     args = parser.parse_args()
-    main(args)
+    if args.hard_only and args.hard_update_every is None:
+        parser.error('--hard-only requires --hard-update-every')
+    if args.sim:
+        main_sim(args)
+    else:
+        main(args)
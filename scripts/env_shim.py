@@ -6,10 +6,12 @@ import time
 import re
 import yaml
 from enum import Enum
-import csv
 import json
 import argparse
 from prometheus_api_client import PrometheusConnect
+from prometheus_sampler import PrometheusSampler
+from latency_stats import load_latencies
+from latency_histogram import LatencyHistogram
 import numpy as np
 
 
@@ -86,9 +88,6 @@ class Env:
                                  pkey=k)
         self.scp = SCPClient(self.ssh_client_.get_transport())
 
-        # Some extra vars for later use
-        self.total_mem_ = None
-
     #
     def enable_env(self):
         # Enable knative to allow manual function placement.
@@ -125,6 +124,9 @@ class Env:
             self.k_worker_metrics_[v_id] = PrometheusConnect(
                 url=f'http://{v_hostname}:9090/', disable_ssl=True)
 
+        # Sample all workers concurrently.
+        self.sampler_ = PrometheusSampler({k: v.url for k, v in self.k_worker_metrics_.items()})
+
         # Print some env stats.
         print(" > Env is initialized, some stats: ")
         print("   knative worker node names: ", self.k_worker_hostnames_)
@@ -299,8 +301,9 @@ class Env:
         # Print some stat.
         return (stat_issued, stat_completed), (stat_real_rps, stat_target_rps), stat_lat_filename
 
-    # Fetch latency statistics.
-    def get_latencies(self, latency_stat_filename):
+    # Fetch latency statistics, as a float64 array.
+    # as_histogram : return a LatencyHistogram filled from the file instead
+    def get_latencies(self, latency_stat_filename, as_histogram=False):
         # Get latency file from the server.
         try:
             self.scp.get(remote_path=latency_stat_filename,
@@ -308,62 +311,13 @@ class Env:
                         recursive=False)
         except:
             print(" > ERROR: failed to fetch latency statistics file from master.")
-            return []
+            return LatencyHistogram() if as_histogram else np.array([])
 
-        # 
-        lat = []
-        with open(f'/tmp/{latency_stat_filename}') as f:
-            csv_reader = csv.reader(f, delimiter=' ', quotechar='|')
-            for row in csv_reader:
-                lat.append((float)(', '.join(row)))
-        return lat
+        if as_histogram:
+            return LatencyHistogram().record_file(f'/tmp/{latency_stat_filename}')
+        return load_latencies(f'/tmp/{latency_stat_filename}')
 
     # Get cluster runtime stats, such as CPU/mem/network utilization over the past @param interval_sec
     # Returns: {worker_id: {'cpu': [idel, user, system], 'net': [tx, rx], 'mem': free}}
     def sample_env(self, interval_sec):
-        ret = {}
-        for p_id, p_metric in self.k_worker_metrics_.items():
-            tpl = {}
-
-            # CPU-related metrics
-            # Average CPU idle cycles for all CPUs, [0-1]
-            cpu_idle = (float)(p_metric.custom_query(
-                query=f'avg(rate(node_cpu_seconds_total{{mode="idle"}}[{interval_sec}s]))')[0]['value'][1])
-            # Average CPU user cycles for all CPUs, [0-1]
-            cpu_user = (float)(p_metric.custom_query(
-                query=f'avg(rate(node_cpu_seconds_total{{mode="user"}}[{interval_sec}s]))')[0]['value'][1])
-            # Average CPU system cycles for all CPUs, [0-1]
-            cpu_system = (float)(p_metric.custom_query(
-                query=f'avg(rate(node_cpu_seconds_total{{mode="system"}}[{interval_sec}s]))')[0]['value'][1])
-            #
-            tpl['cpu'] = [cpu_idle, cpu_user, cpu_system]
-
-            # Network-related metrics
-            # Sum of the total network throughput for all devices, bps
-            network_rx_bps = (float)(p_metric.custom_query(
-                query=f'sum(rate(node_network_receive_bytes_total[{interval_sec}s]))')[0]['value'][1]) * 8
-            network_tx_bps = (float)(p_metric.custom_query(
-                query=f'sum(rate(node_network_transmit_bytes_total[{interval_sec}s]))')[0]['value'][1]) * 8
-            #
-            tpl['net'] = [network_tx_bps, network_rx_bps]
-
-            # Memory-related metrics
-            # Free memory, Bytes
-            mem_free = p_metric.custom_query(
-                query=f'node_memory_MemAvailable_bytes[{interval_sec}s]')[0]['values']
-            mem_free = np.array([(int)(val) for (_, val) in mem_free])
-            mem_free_avg = np.average(mem_free)
-
-            # Total memory, look-up 1 time and cache
-            if self.total_mem_ == None:
-                self.total_mem_ = (int)(p_metric.custom_query(
-                    query=f'node_memory_MemTotal_bytes')[0]['value'][1])
-
-            #
-            mem_free_frac = mem_free_avg / (float)(self.total_mem_)
-            tpl['mem'] = mem_free_frac
-
-            # Append all metrics for this worker
-            ret[p_id] = tpl
-
-        return ret
+        return self.sampler_.sample_env(interval_sec)
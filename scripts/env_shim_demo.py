@@ -1,5 +1,6 @@
 # This is just an example for using env_shim.
 from env_shim import *
+from latency_stats import compute_latency_stats
 
 # Demo parameters.
 kDemoDeploymentActions = {
@@ -191,18 +192,18 @@ def main(args):
     # Sample env.
     env_state = env.sample_env(args.duration)
     lat_stat = env.get_latencies(stat_lat_filename)
-    if lat_stat == []:
+    if len(lat_stat) == 0:
         print("No responses were returned, no latency statistics is computed.")
         return
 
     # Print statistics.
-    lat_stat.sort()
+    lat_50, lat_90, lat_99, lat_999 = compute_latency_stats(lat_stat).percentiles()
     print(
         f'    stat: {stat_issued}, {stat_completed}, {stat_real_rps}, {stat_target_rps}, latency file: {stat_lat_filename}')
-    print('    50th: ', lat_stat[(int)(len(lat_stat) * 0.5)])
-    print('    90th: ', lat_stat[(int)(len(lat_stat) * 0.90)])
-    print('    99th: ', lat_stat[(int)(len(lat_stat) * 0.99)])
-    print('    99.9th: ', lat_stat[(int)(len(lat_stat) * 0.999)])
+    print('    50th: ', lat_50)
+    print('    90th: ', lat_90)
+    print('    99th: ', lat_99)
+    print('    99.9th: ', lat_999)
     print('    env_state:', env_state)
 
 
@@ -1,89 +1,27 @@
 import argparse
-import yaml
 import json
 import time
 import random
 import pandas as pd
-import pickle
 import numpy as np
 import string
-import os
 
 from data_processing import standardize_format, make_dir
-from data_collection import DataCollect
+from dataset import read_data_frame, data_id as get_data_id
+from data_collection import DataCollect, make_functions
 from k8s_env_shim import Env
 from multiprocessing import Process, Manager
+from threading import Lock
 from subprocess import run
-from yaml.loader import SafeLoader
-from os import path
 from k8s_env_shim import Env
 from pprint import pprint
 from itertools import chain, combinations
-from setup_service import Service
-from setup_deployment import Deployment
+from sweep_scheduler import ClusterBudget, SweepScheduler, make_sweep_tasks
 
-def rename_yaml(dep, svc, hpa, new_name):
-    # Update Deployment name.
-    dep['metadata']['name'] = new_name
-    dep['metadata']['labels']['app'] = new_name
-    dep['spec']['selector']['matchLabels']['app'] = new_name
-    dep['spec']['template']['metadata']['labels']['app'] = new_name
-    for i in range(len(dep['spec']['template']['spec']['containers'])):
-        if dep['spec']['template']['spec']['containers'][i]['name'] != 'relay':
-            dep['spec']['template']['spec']['containers'][i]['name'] = new_name
-    # Update chaining.
-    if "-addr" in dep['spec']['template']['spec']['containers'][i]['args']:
-        address = dep['spec']['template']['spec']['containers'][i]['args'][1]
-        ind = address.index('.')
-        address = address[:ind] + new_name[-11:] + address[ind:]
-        dep['spec']['template']['spec']['containers'][i]['args'][1] = address
-    # Update Service name.
-    svc['metadata']['name'] = new_name
-    svc['spec']['selector']['app'] = new_name
-
-    # Update HPA name.
-    hpa['metadata']['name'] = new_name + '-hpa'
-    hpa['spec']['scaleTargetRef']['name'] = new_name
-
-    return dep, svc, hpa
-
-def delete_files_in_directory(directory_path):
-   try:
-     files = os.listdir(directory_path)
-     for file in files:
-       file_path = os.path.join(directory_path, file)
-       if os.path.isfile(file_path):
-         os.remove(file_path)
-     print("All files deleted successfully.")
-   except OSError:
-     print("Error occurred while deleting files.")
-     
+# Load the data of a data_collection.py run (dataset directory or older pickle).
 def create_df(data_file):
-    with open(data_file, 'rb') as handle:
-        data = pickle.load(handle)
-        df = pd.DataFrame(data)
-    # with open(f'./data/successes_{data_id}.pickle', 'rb') as handle:
-    #     successes = pickle.load(handle)
-    #     print(f'Benchmarks: {len(successes)}')
-    #     print(f'Successes: {sum(successes)}')
     pd.set_option('display.max_columns', None)
-    # remove RPS column
-    df.columns = ['timestamp',
-                  'benchmark', 
-                  'cpu_util',
-                  'mem_util',
-                  'replicas',
-                  'cpu_requests', 'cpu_limits', 'mem_requests', 'mem_limits',
-                  'duration', 
-                  'issued', 
-                  'completed', 
-                  'rps_real', 
-                  'rps_target', 
-                  '50th', '90th', '99th', '99.9th', 
-                  'avg_cpu_idle', 'avg_cpu_user', 'avg_cpu_system',
-                              'avg_mem_free',
-                              'avg_net_transmit (bps)', 'avg_net_receive (bps)']
-    return df
+    return read_data_frame(data_file)
 
 def main(args):
     with Manager() as manager:
@@ -95,12 +33,12 @@ def main(args):
         # Verbosity
         verbose = args.v
         hpa_data_file = args.f
-        data_id = hpa_data_file[-17:-7]
+        data_id = get_data_id(hpa_data_file)
         exp_id = ''.join(random.choices(string.ascii_lowercase, k=10))
         data_folder = './expanded_data'
-        data_filename = f'expanded_data_{data_id}_{exp_id}.pickle'
+        data_filename = f'expanded_data_{data_id}_{exp_id}'
         # Instantiate Env.
-        env = Env(verbose=verbose)
+        env = Env(verbose=verbose, max_invocations=args.max_invocations)
 
         # Instantiate DataCollect.
         # This will be used to collect data.
@@ -135,117 +73,39 @@ def main(args):
         For each row in the DataFrame:
 	    1. Read the replica recommendation and evaluate the scale range. Here, we can set the exact number of values in the range to test. 
 	    2. Read the invocation specs: duration, RPS.
-	    3. Read the benchmark name, create the duplicate yaml without HPA, and deploy
-	    4. Once deployed, for every value N in scale range:
-            1. Create a new process
-            2. Scale the deployment to N
-            3. Invoke the benchmark with its assigned duration and RPS.
-            4. Collect data
-	    5. Join the processes created in the loop so that we wait until it finishes executing.
-        ''' 
+	    3. For every value N in scale range, make a task. For each task, once the budget allows it:
+            1. Create the duplicate yaml with the HPA frozen at N, and deploy
+            2. Invoke the benchmark with its assigned duration and RPS.
+            3. Collect data and delete the deployment.
+        '''
         
-        # For each row:
-        print(hpa_df.index)
-        for ind in hpa_df.index:
-            print(f'[INFO] Expanding data for row {ind}')
-            benchmark_name = hpa_df['benchmark'][ind]
-            # Skip chained functions for now.
-            if benchmark_name == 'video-analytics':
-                continue
-            # Read invocation specs: duration, RPS
-            target_rps = hpa_df['rps_target'][ind]
-            duration = hpa_df['duration'][ind]
-            
-            # Read recommendation value.
-            recommendations = hpa_df['replicas'][ind]
-            # Get upper and lower bounds for scaling recs
-            min_recommendations = [np.ceil(rec * (1 - percent_range)) for rec in recommendations]
-            max_recommendations = [np.ceil(rec * (1 + percent_range)) for rec in recommendations]
-            interval_sizes = [np.ceil((max_recommendations[i] - min_recommendations[i])/n_values) for i in range(len(recommendations))]
-            # print(min_recommendations, max_recommendations, interval_sizes)
-            
-            # Get scaling ranges for each function.
-            #TODO: set the range such that K values are explored.
-            scale_ranges = [list(np.arange(min_recommendations[j], max_recommendations[j], interval_sizes[j])) for j in range(len(recommendations))]
-            # print(scale_ranges)
-            # Deploy the benchmark now and start the processes.
-            # TODO: separate "official" YAMLS from the copies we make when running.
-            # Instantiate Services and Deployments
+        # All rows x scale values, run by the scheduler within the cluster budget. There is no
+        # barrier between rows: the teardown of a task (at the end of run_service) overlaps with
+        # the deployment of the next one.
+        tasks = make_sweep_tasks(hpa_df, benchmarks, percent_range, n_values)
+        print(f'[INFO] {len(tasks)} tasks from {len(hpa_df.index)} rows.')
 
-            # Get the benchmark dictionary as parameterized in the configs JSON.
-            for bm in benchmarks:
-                if bm['name'] == benchmark_name:
-                    benchmark = bm
-                    break
-                
-            # Get the benchmark's necessary functions
-            functions = benchmark['functions']
-            # Get the benchmark's entry point function
-            entry_point_function = benchmark['entry-point']
-            entry_point_function_index = functions.index(entry_point_function)
-            
-            # Deploy all functions.
-            # For each scale value.
-            # The scale ranges need to be the same size for all functions.
-            # [[1, 2, 3], [4, 5, 6], [1, 2, 3]]
-            # [[20.0, 19.0, 18.0, 17.0, 16.0, 15.0]]
-            processes = []
-            for scale_val_ind in range(len(scale_ranges[0])):
-                    
-                services = []
-                deployments = []
+        def run_task(task):
+            temp_name, deployments, services, entry_service = make_functions(task.benchmark, env.api, task.scales)
+            if verbose:
+                print(f'[INFO] Collecting data for row {task.row}: `{temp_name}` with {task.scales} replicas.')
+            # One process per task, as before, so a stuck invocation doesn't take the scheduler with it.
+            p = Process(target=dc.run_service, args=(env, temp_name, deployments, services, entry_service, task.rps, task.duration), kwargs={'timeout' : 120})
+            dc.current_benchmarks[temp_name] = 1
+            p.start()
+            p.join()
 
-                # Assign the benchmark a random id.
-                temp_name = benchmark_name
-                rand_id = ''.join(random.choices(string.ascii_lowercase, k=10))
-                temp_name += '-' + rand_id
-                
-                # For each function.
-                for i in range(len(scale_ranges)):
-                    scale = scale_ranges[i][scale_val_ind]
-                    if verbose:
-                        print(f'[INFO] Collecting data for function {functions[i]} across range {scale_ranges[i]}')
-                        print(f'[INFO] Currently collecting data for {scale} replicas.')
-                    # Read YAML of original function to get dicts.
-                    file_name = f"k8s-yamls/{functions[i]}.yaml"
-                    with open(path.join(path.dirname(__file__), file_name)) as f:
-                        dep, svc, hpa = yaml.load_all(f, Loader=SafeLoader)
-                    # Update function to include new id.
-                    new_funct = functions[i] + '-' + rand_id
-                    # Update the old dict to include new id.
-                    new_dep, new_svc, new_hpa = rename_yaml(dep, svc, hpa, new_funct)
-                    # Freeze the autoscaler.
-                    new_hpa['spec']['minReplicas'] = int(scale)
-                    new_hpa['spec']['maxReplicas'] = int(scale)
-                    # List of manifests as dicts to be converted into new YAML file.
-                    # Ignore HPA because we are scaling manually.
-                    manifests = [new_dep, new_svc, new_hpa]
-                    # Update file name
-                    file_name = f"k8s-yamls/tmp/{new_funct}.yaml"
-                    # Dump manifests into new YAML file.
-                    with open(file_name, 'x') as f:
-                        yaml.dump_all(manifests, f)
-                    # Instantiate Service objects
-                    port = new_svc['spec']['ports'][0]['port']
-                    service = Service(new_funct, file_name, port)
-                    services.append(service)
-                    # Instantiate Deployment objects
-                    deployment = Deployment(new_dep, env.api)
-                    deployments.append(deployment)
-                entry_service = services[entry_point_function_index]
-                # Create process.
-                p = Process(target=dc.run_service, args=(env, temp_name, deployments, services, entry_service, target_rps, duration), kwargs={'timeout' : 120})
-                dc.current_benchmarks[temp_name] = 1
-                if verbose: 
-                    print(f"[INFO] Process for benchmark `{temp_name}` created.\n")
-                p.start()
-                processes.append(p)
+        # Save the new rows after every task, so a crash loses at most the tasks in flight.
+        save_lock = Lock()
+        def on_done(task, result):
+            with save_lock:
+                dc.save_data(data_folder, data_filename)
 
-            # Wait until the processes for the current benchmark finish
-            for p in processes:
-                p.join()
-            dc.save_data(data_folder, data_filename)    
-            dc.cleanup()    
+        budget = ClusterBudget(args.max_deployments, args.max_replicas)
+        scheduler = SweepScheduler(budget, max_workers=args.max_tasks, on_done=on_done, verbose=verbose)
+        scheduler.run(tasks, run_task)
+        dc.save_data(data_folder, data_filename)
+        dc.cleanup()
 
 
 if __name__ == "__main__":
@@ -258,6 +118,12 @@ if __name__ == "__main__":
     parser.add_argument('--dcconfig')
     # Verbosity: 't' for verbose, 'f' for non-verbose
     parser.add_argument('-v', action='store_true', help= 'Verbosity: -v for verbose, leave empty for non-verbose')
+    # Maximum number of invokers running at the same time
+    parser.add_argument('--max-invocations', type=int, default=None, help='Maximum number of invokers running at the same time')
+    # Budget of the sweep: maximum deployments, replicas and tasks in flight
+    parser.add_argument('--max-deployments', type=int, default=None, help='Maximum number of deployments in flight')
+    parser.add_argument('--max-replicas', type=int, default=None, help='Maximum number of replicas in flight')
+    parser.add_argument('--max-tasks', type=int, default=32, help='Maximum number of sweep tasks running at the same time')
     #TODO: add -h argument
     args = parser.parse_args()
     main(args)
\ No newline at end of file
@@ -0,0 +1,244 @@
+import asyncio
+import json
+import re
+import threading
+import time
+
+from urllib.parse import parse_qs
+
+# /apis/apps/v1/namespaces/<ns>/deployments[/<name>[/scale]], and the same for services and HPAs.
+PATH_RE = re.compile(r'^/apis?/(?:[^/]+/)?v[0-9]+/namespaces/([^/]+)/([a-z]+)(?:/([^/]+))?(?:/(scale))?$')
+
+class FakeApiServer:
+    """Local HTTP stub of the k8s API server, for control_plane.ControlPlaneClient.
+
+    Keeps Deployments, Services and HPAs in memory and serves create (POST), get and list
+    (GET), scale (PATCH of `/scale`), delete (DELETE) and watch of Deployments (GET with
+    `watch=1`) over HTTP/1.1 with keep-alive. Each request takes `latency` seconds, and a
+    Deployment reports its replicas ready `ready_delay` seconds after it was created or
+    scaled. A deleted object stays, with a deletion timestamp, for `delete_delay` seconds
+    (a foreground delete waiting for its pods). Lists and watches are sent chunked, as the
+    API server does. Runs on its own loop thread.
+
+    - Attributes:
+        - `latency` (Float) : seconds per request.
+        - `ready_delay` (Float) : seconds until a Deployment is ready.
+        - `delete_delay` (Float) : seconds until a deleted object is gone.
+        - `port` (Int) : port it listens on (127.0.0.1), set by `start`.
+        - `objects` (Dict[String, Dict[String, Dict]]) : objects by resource and name.
+        - `num_requests`, `num_connections`, `num_lists`, `num_watches` (Int) : counters.
+        - `expired_watches` (Int) : the next watches that fail with 410 (resource version too old).
+    - Methods:
+        - `start` : listen on a free port, returns the URL.
+        - `stop` : stop listening.
+        - `close_connections` : close the open connections, as an idle timeout of the server would.
+    """
+    def __init__(self, latency=0.0, ready_delay=0.0, delete_delay=0.0):
+        self.latency = latency
+        self.ready_delay = ready_delay
+        self.delete_delay = delete_delay
+        self.port = None
+        self.objects = {'deployments': {}, 'services': {}, 'horizontalpodautoscalers': {}}
+        self.num_requests = 0
+        self.num_connections = 0
+        self.num_lists = 0
+        self.num_watches = 0
+        self.expired_watches = 0
+        self.resource_version_ = 0
+        self.events_ = []
+        self.watchers_ = set()
+        self.writers_ = set()
+        self.tasks_ = set()
+        self.next_ip_ = 1
+        self.loop_ = None
+        self.server_ = None
+
+    def start(self):
+        self.loop_ = asyncio.new_event_loop()
+        threading.Thread(target=self.loop_.run_forever, daemon=True).start()
+        self.server_ = asyncio.run_coroutine_threadsafe(
+            asyncio.start_server(self.serve, '127.0.0.1', 0), self.loop_).result()
+        self.port = self.server_.sockets[0].getsockname()[1]
+        return f'http://127.0.0.1:{self.port}'
+
+    # Stop listening and end the open connections (watches included). Does nothing if stopped.
+    def stop(self):
+        if self.loop_ is None:
+            return
+        async def close():
+            self.server_.close()
+            self.close_writers()
+            for task in self.tasks_:
+                task.cancel()
+            await asyncio.gather(*self.tasks_, return_exceptions=True)
+            await self.server_.wait_closed()
+        asyncio.run_coroutine_threadsafe(close(), self.loop_).result()
+        self.loop_.call_soon_threadsafe(self.loop_.stop)
+        self.loop_ = None
+
+    def close_writers(self):
+        for writer in list(self.writers_):
+            writer.close()
+
+    def close_connections(self):
+        self.loop_.call_soon_threadsafe(self.close_writers)
+
+    # Bump the resource version of a Deployment and send the event to the watches.
+    def emit(self, event_type, dep):
+        self.resource_version_ += 1
+        dep['metadata']['resourceVersion'] = str(self.resource_version_)
+        event = (self.resource_version_, {'type': event_type, 'object': json.loads(json.dumps(dep))})
+        self.events_.append(event)
+        for queue in self.watchers_:
+            queue.put_nowait(event)
+
+    # The Deployment is rolled out with its latest spec: set its status, now or after ready_delay.
+    def roll_out(self, name, dep):
+        generation = dep['metadata']['generation']
+        def ready():
+            if self.objects['deployments'].get(name) is dep and dep['metadata']['generation'] == generation:
+                replicas = dep['spec'].get('replicas', 1)
+                dep['status'] = {'observedGeneration': generation, 'replicas': replicas, 'readyReplicas': replicas}
+                self.emit('MODIFIED', dep)
+        dep['status'] = {'observedGeneration': generation, 'replicas': dep['spec'].get('replicas', 1), 'readyReplicas': 0}
+        if self.ready_delay > 0:
+            self.loop_.call_later(self.ready_delay, ready)
+            return
+        replicas = dep['spec'].get('replicas', 1)
+        dep['status']['readyReplicas'] = replicas
+
+    def remove(self, resource, name, obj):
+        if self.objects[resource].get(name) is obj:
+            del self.objects[resource][name]
+            if resource == 'deployments':
+                self.emit('DELETED', obj)
+
+    def handle(self, method, path, body):
+        match = PATH_RE.match(path.split('?')[0])
+        if match is None or match.group(2) not in self.objects:
+            return 404, {'reason': 'NotFound', 'message': f'{path} not found'}
+        namespace, resource, name, subresource = match.groups()
+        objects = self.objects[resource]
+        if method == 'POST':
+            name = body['metadata']['name']
+            if name in objects:
+                return 409, {'reason': 'AlreadyExists', 'message': f'{resource} "{name}" already exists'}
+            body['metadata'].update(namespace=namespace, generation=1)
+            if resource == 'services':
+                body['spec']['clusterIP'] = f'10.96.{self.next_ip_ // 256}.{self.next_ip_ % 256}'
+                self.next_ip_ += 1
+            objects[name] = body
+            if resource == 'deployments':
+                self.roll_out(name, body)
+                self.emit('ADDED', body)
+            return 201, body
+        if name is None:
+            self.num_lists += 1
+            return 200, {'kind': 'List', 'metadata': {'resourceVersion': str(self.resource_version_)},
+                         'items': list(objects.values())}
+        if name not in objects:
+            return 404, {'reason': 'NotFound', 'message': f'{resource} "{name}" not found'}
+        if method == 'GET':
+            return 200, objects[name]
+        if method == 'PATCH' and subresource == 'scale':
+            dep = objects[name]
+            dep['spec']['replicas'] = body['spec']['replicas']
+            dep['metadata']['generation'] += 1
+            self.roll_out(name, dep)
+            self.emit('MODIFIED', dep)
+            return 200, {'kind': 'Scale', 'spec': {'replicas': dep['spec']['replicas']}}
+        if method == 'DELETE':
+            obj = objects[name]
+            if self.delete_delay > 0:
+                if 'deletionTimestamp' not in obj['metadata']:
+                    obj['metadata']['deletionTimestamp'] = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+                    if resource == 'deployments':
+                        self.emit('MODIFIED', obj)
+                    self.loop_.call_later(self.delete_delay, self.remove, resource, name, obj)
+                return 200, obj
+            self.remove(resource, name, obj)
+            return 200, obj
+        return 405, {'reason': 'MethodNotAllowed', 'message': f'{method} {path}'}
+
+    # Stream the Deployment events after the resource version of the request, one JSON line per
+    # event, until its timeoutSeconds. Then the connection is closed.
+    async def watch(self, writer, path):
+        self.num_watches += 1
+        query = parse_qs(path.partition('?')[2])
+        resource_version = (int)(query.get('resourceVersion', ['0'])[0] or 0)
+        timeout = (float)(query.get('timeoutSeconds', ['60'])[0])
+        writer.write(b'HTTP/1.1 200 X\r\nContent-Type: application/json\r\nTransfer-Encoding: chunked\r\nConnection: close\r\n\r\n')
+        def send(event):
+            line = json.dumps(event).encode() + b'\n'
+            writer.write(f'{len(line):x}\r\n'.encode() + line + b'\r\n')
+        if self.expired_watches > 0:
+            self.expired_watches -= 1
+            send({'type': 'ERROR', 'object': {'kind': 'Status', 'code': 410, 'reason': 'Expired',
+                                              'message': f'too old resource version: {resource_version}'}})
+        else:
+            queue = asyncio.Queue()
+            for event in self.events_:
+                if event[0] > resource_version:
+                    queue.put_nowait(event)
+            self.watchers_.add(queue)
+            deadline = self.loop_.time() + timeout
+            try:
+                while True:
+                    remaining = deadline - self.loop_.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        version, event = await asyncio.wait_for(queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                    if version > resource_version:
+                        send(event)
+                        await writer.drain()
+            finally:
+                self.watchers_.discard(queue)
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+
+    async def serve(self, reader, writer):
+        self.num_connections += 1
+        self.writers_.add(writer)
+        self.tasks_.add(asyncio.current_task())
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                lines = head.decode('latin-1').split('\r\n')
+                method, path, _ = lines[0].split(' ', 2)
+                length = 0
+                for line in lines[1:]:
+                    name, _, value = line.partition(':')
+                    if name.strip().lower() == 'content-length':
+                        length = (int)(value)
+                data = await reader.readexactly(length) if length else b''
+                await asyncio.sleep(self.latency)
+                self.num_requests += 1
+                if method == 'GET' and 'watch=1' in path.partition('?')[2].split('&'):
+                    await self.watch(writer, path)
+                    break
+                status, response = self.handle(method, path, json.loads(data) if data else None)
+                payload = json.dumps(response).encode()
+                if response.get('kind') == 'List':
+                    # Two chunks and the terminator.
+                    half = len(payload) // 2
+                    body = b''.join(f'{len(chunk):x}\r\n'.encode() + chunk + b'\r\n'
+                                    for chunk in (payload[:half], payload[half:]) if chunk) + b'0\r\n\r\n'
+                    headers = 'Transfer-Encoding: chunked'
+                else:
+                    body = payload
+                    headers = f'Content-Length: {len(payload)}'
+                writer.write(f'HTTP/1.1 {status} X\r\nContent-Type: application/json\r\n{headers}\r\n\r\n'.encode() + body)
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            # Client gone, or cancelled by `stop`.
+            pass
+        finally:
+            self.writers_.discard(writer)
+            self.tasks_.discard(asyncio.current_task())
+            writer.close()
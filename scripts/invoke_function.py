@@ -7,6 +7,8 @@ from subprocess import run
 from os import path
 from yaml import SafeLoader
 import random
+from kubernetes import client, config
+from readiness import ReadinessWaiter
 
 INVOKER_FILE = '~/vSwarm/tools/invoker/'
 
@@ -78,14 +80,7 @@ def invoke_service(service_name, duration, rps, port):
         assert False, "[ERROR] stat_lat_filename was not found."
     else:
         return (stat_issued, stat_completed), (stat_real_rps, stat_target_rps), stat_lat_filename
-    
-def is_ready(deployment_name):
-    # Command to check rollout status
-    status_cmd = f"kubectl rollout status deployment/{deployment_name}"
-    # Run the command.
-    ret = run(status_cmd, capture_output=True, shell=True, universal_newlines=True).stdout
-    # Check if the output message shows successful rollout
-    return ret == '''deployment "''' + deployment_name + '''" successfully rolled out\n'''
+
 def main(args):
     manifest = args.file
     duration = args.d
@@ -99,6 +94,9 @@ def main(args):
     service_name = svc['metadata']['name']
     port = svc['spec']['ports'][0]['port']
 
+    config.load_kube_config()
+    waiter = ReadinessWaiter(client.AppsV1Api())
+
     for i in range(50):
         print(f'Iteration {i+1}')
         n = random.randint(1, 15)
@@ -106,8 +104,7 @@ def main(args):
         scale_cmd = f'kubectl scale deployment/{service_name} --replicas={n}'
         run(scale_cmd, shell=True)
         start = time.time()
-        while not is_ready(service_name):
-            continue
+        waiter.wait([service_name], timeout=120)
         print(f'Finished scaling in {time.time() - start} seconds.')
         ret = invoke_service(service_name, duration, rps, port)
         print(ret)
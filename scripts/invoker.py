@@ -0,0 +1,234 @@
+import os
+import re
+import json
+import uuid
+import signal
+import tempfile
+import subprocess
+import threading
+import multiprocessing
+import time
+import numpy as np
+
+from collections import deque
+
+INVOKER_FILE = '~/vSwarm/tools/invoker/'
+
+# Parse the invoker stdout.
+LAT_FILE_RE = re.compile('The measured latencies are saved in (.*csv)')
+COMPLETED_RE = re.compile('completed requests: ([0-9]*), ([0-9]*)')
+RPS_RE = re.compile('target RPS: ([0-9]*\\.?[0-9]*) \\/ ([0-9]*\\.?[0-9]*)')
+
+class InvokerRun:
+    """Handle of one invoker process running in the background.
+
+    The process output is read by a background thread, so any number of runs can be
+    in flight from a single process; the stats are parsed as the lines come in.
+
+    - Attributes:
+        - `name` (String) : name of the invoked service, for messages.
+        - `cmd` (List[String]) : invoker command line.
+        - `timeout` (Float) : cancel the run after this many seconds, None for no limit.
+        - `on_exit` (Callable) : called once the invoker has exited, e.g. to clean up its files.
+    - Methods:
+        - `progress` : yield stdout lines of the invoker as they are printed.
+        - `latency_rows` : yield new latency rows (as float64 arrays) as they land in the latency file.
+        - `done` : check if the invoker has exited.
+        - `cancel` : stop the invoker.
+        - `result` : wait for the invoker and return `(issued, completed), (real_rps, target_rps), lat_filename`.
+    """
+    # Lines kept for `progress` if nobody consumes them.
+    kMaxBufferedLines_ = 10000
+
+    def __init__(self, name, cmd, timeout=None, cwd=None, on_exit=None):
+        self.name = name
+        self.cmd = cmd
+        self.timeout = timeout
+        self.on_exit = on_exit
+        self.stat_issued = None
+        self.stat_completed = None
+        self.stat_real_rps = None
+        self.stat_target_rps = None
+        self.stat_lat_filename = None
+        self.cancelled = False
+        self.timed_out = False
+        self.lines_ = deque(maxlen=self.kMaxBufferedLines_)
+        self.cond_ = threading.Condition()
+        self.finished_ = False
+
+        self.start_time = time.time()
+        self.proc = subprocess.Popen(cmd, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                     universal_newlines=True, bufsize=1, start_new_session=True)
+        self.reader_ = threading.Thread(target=self.read_output, daemon=True)
+        self.reader_.start()
+        self.timer_ = None
+        if timeout is not None:
+            self.timer_ = threading.Timer(timeout, self.expire)
+            self.timer_.daemon = True
+            self.timer_.start()
+
+    def read_output(self):
+        for line in self.proc.stdout:
+            self.parse_line(line)
+            with self.cond_:
+                self.lines_.append(line)
+                self.cond_.notify_all()
+        self.proc.wait()
+        if self.timer_ is not None:
+            self.timer_.cancel()
+        if self.on_exit is not None:
+            self.on_exit()
+        with self.cond_:
+            self.finished_ = True
+            self.cond_.notify_all()
+
+    def parse_line(self, line):
+        m = LAT_FILE_RE.search(line)
+        if m:
+            self.stat_lat_filename = m.group(1)
+        m = COMPLETED_RE.search(line)
+        if m:
+            self.stat_issued = (int)(m.group(1))
+            self.stat_completed = (int)(m.group(2))
+        m = RPS_RE.search(line)
+        if m:
+            self.stat_real_rps = (float)(m.group(1))
+            self.stat_target_rps = (float)(m.group(2))
+
+    def progress(self):
+        while True:
+            with self.cond_:
+                while not self.lines_ and not self.finished_:
+                    self.cond_.wait()
+                if not self.lines_:
+                    return
+                line = self.lines_.popleft()
+            yield line
+
+    # Tail the latency file, polling every @param poll_interval seconds, until the invoker
+    # has exited and the whole file has been read.
+    def latency_rows(self, poll_interval=0.5):
+        offset = 0
+        rest = b''
+        while True:
+            finished = self.done()
+            filename = self.stat_lat_filename
+            if filename is not None and os.path.exists(filename):
+                with open(filename, 'rb') as f:
+                    f.seek(offset)
+                    block = rest + f.read()
+                offset += len(block) - len(rest)
+                end = block.rfind(b'\n') + 1
+                rest = block[end:]
+                if end > 0:
+                    yield np.fromstring(block[:end].decode(), dtype=np.float64, sep=' ')
+            if finished:
+                if rest.strip():
+                    yield np.fromstring(rest.decode(), dtype=np.float64, sep=' ')
+                return
+            time.sleep(poll_interval)
+
+    def done(self):
+        with self.cond_:
+            return self.finished_
+
+    def cancel(self, grace_period=5):
+        if self.done():
+            return
+        self.cancelled = True
+        # The invoker runs in its own session, stop the whole process group.
+        try:
+            os.killpg(self.proc.pid, signal.SIGTERM)
+            self.proc.wait(timeout=grace_period)
+        except subprocess.TimeoutExpired:
+            os.killpg(self.proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    def expire(self):
+        self.timed_out = True
+        self.cancel()
+
+    def result(self, timeout=None):
+        self.reader_.join(timeout)
+        if self.reader_.is_alive():
+            raise TimeoutError(f"[ERROR] Invoker for `{self.name}` still running after {timeout} seconds.")
+        if self.timed_out:
+            raise TimeoutError(f"[ERROR] Invoker for `{self.name}` exceeded its timeout of {self.timeout} seconds.")
+        if self.cancelled:
+            assert False, f"[ERROR] Invoker for `{self.name}` was cancelled."
+        # Check if latency file exists and return stats.
+        if self.stat_lat_filename == None:
+            assert False, "[ERROR] stat_lat_filename was not found."
+        return (self.stat_issued, self.stat_completed), (self.stat_real_rps, self.stat_target_rps), self.stat_lat_filename
+
+class InvocationManager:
+    """Starts invoker runs that can safely be in flight at the same time.
+
+    Every run gets its own temporary endpoints file and its own latency file name, so
+    parallel runs no longer race on a shared `endpoints.json`. At most `max_parallel`
+    runs are in flight; the limit is a multiprocessing semaphore, so it also holds for
+    processes forked after the manager is created (as in data_collection.py).
+
+    - Attributes:
+        - `max_parallel` (Int) : maximum number of runs in flight, None for no limit.
+        - `invoker_dir` (String) : directory of the invoker binary.
+        - `tmp_dir` (String) : directory for the endpoints files, system default if None.
+    - Methods:
+        - `start` : acquire a slot, write the endpoints file and start an InvokerRun.
+    """
+    def __init__(self, max_parallel=None, invoker_dir=INVOKER_FILE, tmp_dir=None):
+        self.max_parallel = max_parallel
+        self.invoker_dir = invoker_dir
+        self.tmp_dir = tmp_dir
+        self.slots_ = multiprocessing.BoundedSemaphore(max_parallel) if max_parallel else None
+
+    # Start the invoker against @param hostname. Blocks while `max_parallel` runs are in flight.
+    # Returns an InvokerRun whose endpoints file is removed and slot released once it exits.
+    def start(self, name, hostname, port, duration, rps, timeout=None, verbose=False):
+        if self.slots_ is not None:
+            self.slots_.acquire()
+        endpoints_file = None
+        try:
+            fd, endpoints_file = tempfile.mkstemp(prefix=f'endpoints-{name}-', suffix='.json', dir=self.tmp_dir)
+            with os.fdopen(fd, 'w') as f:
+                json.dump([{"hostname": hostname}], f)
+            lat_filename = f'{name}-{uuid.uuid4().hex[:8]}.csv'
+            cmd = invoker_command(port, duration, rps, lat_filename, endpoints_file, self.invoker_dir)
+            if verbose:
+                print("[RUNNING] Invoking with command at second {}".format(time.time()), f'`{" ".join(cmd)}`\n')
+            return InvokerRun(name, cmd, timeout=timeout, on_exit=lambda: self.release(endpoints_file))
+        except Exception:
+            self.release(endpoints_file)
+            raise
+
+    def release(self, endpoints_file):
+        if endpoints_file is not None and os.path.exists(endpoints_file):
+            os.remove(endpoints_file)
+        if self.slots_ is not None:
+            self.slots_.release()
+
+# Build the invoker command line.
+def invoker_command(port, duration, rps, lat_filename, endpoints_file, invoker_dir=INVOKER_FILE):
+    invoker_dir = os.path.expanduser(invoker_dir)
+    return [os.path.join(invoker_dir, 'invoker'),
+            '-dbg',
+            '-port', str(port),
+            '-time', str(duration),
+            '-rps', str(rps),
+            '-latf', lat_filename,
+            '-endpointsFile', endpoints_file]
+
+# Wait for all @param runs. Returns the result of each run, or the exception raised by its
+# `result`, in the order of @param runs (several runs may invoke the same service).
+def wait_all(runs, timeout=None):
+    deadline = None if timeout is None else time.time() + timeout
+    results = []
+    for run in runs:
+        remaining = None if deadline is None else max(0, deadline - time.time())
+        try:
+            results.append(run.result(remaining))
+        except Exception as e:
+            run.cancel()
+            results.append(e)
+    return results
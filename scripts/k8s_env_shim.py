@@ -1,44 +1,45 @@
+import asyncio
 import os
 import json
 import re
-import csv
 import numpy as np
 import time
-import signal
 
 from os import path
 from subprocess import run
 from pprint import pprint
 from kubernetes import client, config
+from kubernetes.client.rest import ApiException
 from prometheus_api_client import PrometheusConnect
-
-INVOKER_FILE = '~/vSwarm/tools/invoker/'
-
-# Register a handler for timeouts
-def timeout_handler(signum, frame):
-    raise Exception("[ERROR] timeout limit exceeded.\n")
+from prometheus_sampler import PrometheusSampler, node_addresses
+from readiness import ReadinessWaiter
+from latency_stats import load_latencies
+from latency_histogram import LatencyHistogram
+from invoker import InvocationManager
+from control_plane import ControlPlaneClient
+from loadgen import GrpcClient, HttpClient, generate_load
 
 class Env:
-    def __init__(self, verbose=False):
+    # max_invocations : maximum number of invokers running at the same time, None for no limit
+    def __init__(self, verbose=False, max_invocations=None):
         # Configs can be set in Configuration class directly or using helper
         # utility. If no argument provided, the config will be loaded from
         # default location.
         config.load_kube_config()
 
-        # Register signal function handler
-        signal.signal(signal.SIGALRM, timeout_handler)
-
         # Initialize vars
         self.api = client.AppsV1Api()
+        self.waiter_ = ReadinessWaiter(self.api)
+        self.invocations_ = InvocationManager(max_parallel=max_invocations)
+        self.control_plane_ = None
 
         # Verbosity
         self.verbose = verbose
 
-        # Some extra vars for later use
-        self.total_mem_ = None
-
     # Setup Prometheus
-    def setup_prometheus(self):
+    # prometheus_url : optional Prometheus that scrapes all nodes; if set, metrics for all
+    #                  workers are sampled with a single query instead of one per worker.
+    def setup_prometheus(self, prometheus_url=None):
         # Setup Prometheus on all nodes
         # Get node hostnames as appears in knative.
         node_cmd = '''kubectl get nodes | awk '{print $1}' '''
@@ -57,6 +58,14 @@ class Env:
             self.k_worker_metrics_[v_id] = PrometheusConnect(
                 url=f'http://{v_hostname}:9090/', disable_ssl=True)
 
+        # Sample all workers concurrently.
+        if prometheus_url is not None:
+            # The shared Prometheus may scrape the nodes by IP rather than by hostname.
+            addresses = node_addresses(client.CoreV1Api().list_node())
+            self.sampler_ = PrometheusSampler({1: prometheus_url}, hostnames=self.k_worker_hostnames_, addresses=addresses)
+        else:
+            self.sampler_ = PrometheusSampler({k: v.url for k, v in self.k_worker_metrics_.items()})
+
         # Print some env stats.
         print("[UPDATE] Env is initialized, some stats: ")
         print("[INFO] Worker node names: ")
@@ -67,57 +76,101 @@ class Env:
         return 1
 
     # Create Deployments and Service.
-    # timeout : timeout limit for each deployment
+    # timeout : timeout limit shared by all deployments
     def setup_functions(self, deployments, services, wait_to_scale=True, timeout=60):
 
-        # Create Deployments    
-        for deployment, service in zip(deployments, services):
-            # Start the timer
-            signal.alarm(timeout)
+        # Create Deployments
+        for deployment in deployments:
             try:
                 deployment.create_deployment()
             except Exception as e:
                 # print('\n[ERROR] Previous Deployments may still be deleting...')
                 print(f'\n[ERROR] {e}')
                 return 0
+        # Wait for all Deployments at once
+        if wait_to_scale:
+            if self.verbose:
+                print(f"[RUNNING] Waiting for all pods in Deployments to be ready")
+            t_start = time.time()
             try:
-                if wait_to_scale:
-                    if self.verbose:
-                        print(f"[RUNNING] Waiting for all pods in Deployment to be ready")
-                    t_start = time.time()
-                    while not deployment.is_ready():
-                        continue
-                    # Cancel the timer when the Deployment is ready
-                    signal.alarm(0)   
-                    if self.verbose:             
-                        print(f"[UPDATE] Deployment {deployment.deployment_name} successfully rolled out in {round(time.time() - t_start, 3)} seconds.\n")
-            except:
-                assert False, f"\n[ERROR] Deployment {deployment.deployment_name} deployment time exceeded timeout limit."
-            # Create Service
+                self.waiter_.wait([deployment.deployment_name for deployment in deployments], timeout)
+            except TimeoutError as e:
+                print(f'\n{e}')
+                return 0
+            if self.verbose:
+                print(f"[UPDATE] Deployments {[d.deployment_name for d in deployments]} successfully rolled out in {round(time.time() - t_start, 3)} seconds.\n")
+        # Create Services
+        for service in services:
             service.create_service()
             if not self.verbose:
                 print(f"[INFO] Service can be invoked at IP: {service.get_service_ip()} at port {service.port}\n")
         return 1
     
-    # Scale number of replicas
-    def scale_deployments(self, deployment, replicas, wait_to_scale=True, timeout=30):
-
-        # Start the timer
-        signal.alarm(timeout)
-        deployment.scale_deployment(replicas)
+    # Scale number of replicas of one Deployment or a list of Deployments
+    def scale_deployments(self, deployments, replicas, wait_to_scale=True, timeout=30):
+        if not isinstance(deployments, list):
+            deployments = [deployments]
+        for deployment in deployments:
+            deployment.scale_deployment(replicas)
+        if wait_to_scale:
+            if self.verbose:
+                print(f"[RUNNING] Waiting for all replicas to scale")
+            t_start = time.time()
+            try:
+                self.waiter_.wait([deployment.deployment_name for deployment in deployments], timeout)
+            except TimeoutError as e:
+                assert False, f"\n{e}"
+            if self.verbose:
+                print(f"[UPDATE] Deployments {[d.deployment_name for d in deployments]} successfully scaled in {round(time.time() - t_start, 3)} seconds.\n")
+
+    # asyncio client for the control plane (see control_plane.py), with one connection pool
+    # shared by all the operations of this Env.
+    def control_plane(self):
+        if self.control_plane_ is None:
+            self.control_plane_ = ControlPlaneClient.from_kube_config(verbose=self.verbose)
+        return self.control_plane_
+
+    # Create the Deployments and Services of many benchmarks at once, [(deployments, services)].
+    # Returns: [1 on success, 0 on failure] per benchmark, as setup_functions
+    def setup_benchmarks(self, benchmarks, timeout=60):
+        client = self.control_plane()
+        async def setup_all():
+            return await asyncio.gather(*[client.setup_functions(deployments, services, timeout=timeout)
+                                          for deployments, services in benchmarks])
+        return client.run(setup_all())
+
+    # Scale many Deployments at once, to one replica count each, and wait for all of them.
+    def scale_all(self, deployments, replicas, timeout=30):
+        client = self.control_plane()
+        t_start = time.time()
+        try:
+            client.run(client.scale_deployments(deployments, replicas, timeout=timeout))
+        except TimeoutError as e:
+            assert False, f"\n{e}"
+        if self.verbose:
+            print(f"[UPDATE] Deployments {[d.deployment_name for d in deployments]} successfully scaled in {round(time.time() - t_start, 3)} seconds.\n")
+
+    # Delete the functions of many benchmarks at once, [services].
+    def delete_benchmarks(self, benchmarks):
+        client = self.control_plane()
+        async def delete_all():
+            await asyncio.gather(*[client.delete_functions(services) for services in benchmarks])
+        client.run(delete_all())
+
+    # Get the desired number of replicas of a Deployment
+    def get_replicas(self, name):
+        return self.api.read_namespaced_deployment_scale(name, 'default').spec.replicas
+
+    # Whether a Deployment exists and is not being deleted (a foreground delete keeps it,
+    # with a deletion timestamp, until its pods are gone).
+    def is_deployed(self, name):
         try:
-            if wait_to_scale:
-                if self.verbose:
-                    print(f"[RUNNING] Waiting for all replicas to scale")
-                t_start = time.time()
-                while not deployment.is_ready():
-                    continue
-                # Cancel the timer when the replicas are ready
-                signal.alarm(0)      
-                if self.verbose:          
-                    print(f"[UPDATE] Deployment {deployment.deployment_name} successfully scaled in {round(time.time() - t_start, 3)} seconds.\n")
-        except:
-            assert False, f"\n[ERROR] Deployment {deployment.deployment_name} deployment time exceeded timeout limit."
+            dep = self.api.read_namespaced_deployment(name, 'default')
+        except ApiException as e:
+            if e.status == 404:
+                return False
+            raise
+        return dep.metadata.deletion_timestamp is None
 
     # Delete functions when finished
     def delete_functions(self, services, deployments_only=False, deployments=None, wait_time=2):
@@ -133,129 +186,48 @@ class Env:
     def get_worker_num(self):
         return len(self.k_worker_hostnames_)
 
-    # Invoke Service using invoker and return stats
-    def invoke_service(self, service, duration, rps):
+    # Start the invoker against a Service without waiting for it.
+    # Returns an InvokerRun handle; many of them can be in flight at once, each with its own
+    # endpoints and latency files.
+    # timeout : cancel the invocation after this many seconds, None for no limit
+    def start_invocation(self, service, duration, rps, timeout=None):
         ip = service.get_service_ip()
-
-        # Setup hostname file
-        os.system('''echo '[ { "hostname": "''' + ip + '''" } ]' > ''' + INVOKER_FILE + '''endpoints.json''')
-        if not self.verbose:
-            print(f"[INFO] Hostname file has been set up at {INVOKER_FILE}/endpoints.json")
-
-        # Format the invoker command nicely
-        invoker_cmd_join_list = [f'{INVOKER_FILE}/invoker',
-                                '-dbg',
-                                f'-port {service.port}',
-                                f'-time {duration}',
-                                f'-rps {rps}',
-                                f'-latf {service.name}.csv',
-                                f'-endpointsFile {INVOKER_FILE}/endpoints.json']
-        invoker_cmd = ' '.join(invoker_cmd_join_list)
-
-        # Run invoker while redirecting output to separate file
-        if not self.verbose:
-            print("[RUNNING] Invoking with command at second {}".format(time.time()), f'`{invoker_cmd}`\n')
-        
         self.invoker_start_time = time.time()
-        stdout = os.popen(invoker_cmd)
+        return self.invocations_.start(service.name, ip, service.port, duration, rps,
+                                       timeout=timeout, verbose=not self.verbose)
 
-        # Find latency file and parse stats
-        stat_issued = None
-        stat_completed = None
-        stat_real_rps = None
-        stat_target_rps = None
-        stat_lat_filename = None
-        for line in stdout:
-            m = re.search('The measured latencies are saved in (.*csv)', line)
-            if m:
-                stat_lat_filename = m.group(1)
-            m = re.search('completed requests: ([0-9]*), ([0-9]*)', line)
-            if m:
-                stat_issued = (int)(m.group(1))
-                stat_completed = (int)(m.group(2))
-            m = re.search(
-                'target RPS: ([0-9]*\.?[0-9]*) \/ ([0-9]*\.?[0-9]*)', line)
-            if m:
-                stat_real_rps = (float)(m.group(1))
-                stat_target_rps = (float)(m.group(2))
-
-        # Check if latency file exists and return stats.
-        if stat_lat_filename == None:
-            assert False, "[ERROR] stat_lat_filename was not found."
+    # Invoke Service using invoker and return stats
+    def invoke_service(self, service, duration, rps, timeout=None):
+        return self.start_invocation(service, duration, rps, timeout=timeout).result()
+
+    # Invoke Service with the built-in load generator instead of the invoker binary.
+    # Returns (issued, completed), (real_rps, target_rps), latencies (float64 array in µs).
+    # protocol : 'grpc' for the vSwarm functions, 'http' for plain HTTP services
+    # distribution : 'poisson' or 'constant' arrivals
+    def generate_load(self, service, duration, rps, protocol='grpc', distribution='poisson'):
+        ip = service.get_service_ip()
+        if protocol == 'grpc':
+            load_client = GrpcClient(ip, service.port)
+        elif protocol == 'http':
+            load_client = HttpClient(ip, service.port)
         else:
-            timestamp = time.time()
-            return (stat_issued, stat_completed), (stat_real_rps, stat_target_rps), stat_lat_filename
+            assert False, f"[ERROR] Unknown protocol `{protocol}`."
+        if not self.verbose:
+            print(f"[RUNNING] Generating {rps} RPS of {protocol} load on `{service.name}` for {duration} seconds.")
+        return generate_load(load_client, rps, duration, distribution)
 
-    # Get latencies given the stat file
-    def get_latencies(self, latency_stat_filename):
-        lat = []
-        with open(latency_stat_filename) as f:
-            csv_reader = csv.reader(f, delimiter=' ', quotechar='|')
-            for row in csv_reader:
-                lat.append((float)(', '.join(row)))
-        return lat
+    # Get latencies given the stat file, as a float64 array.
+    # as_histogram : return a LatencyHistogram filled from the file instead
+    def get_latencies(self, latency_stat_filename, as_histogram=False):
+        if as_histogram:
+            return LatencyHistogram().record_file(latency_stat_filename)
+        return load_latencies(latency_stat_filename)
+
+    # Delete the latency files written by the invoker
+    def delete_latency_files(self):
+        run('''find . -name 'rps*.csv' -delete''', shell=True)
 
     # Get cluster runtime stats, such as CPU/mem/network utilization over the past @param interval_sec
     # Returns: {worker_id: {'cpu': [idel, user, system], 'net': [tx, rx], 'mem': free}}
     def sample_env(self, interval_sec):
-        ret = {}
-        for p_id, p_metric in self.k_worker_metrics_.items():
-            tpl = {}
-
-            # CPU-related metrics
-            # Average CPU idle cycles for all CPUs, [0-1]
-            cpu_idle = (float)(p_metric.custom_query(
-                query=f'avg(rate(node_cpu_seconds_total{{mode="idle"}}[{interval_sec}s]))')[0]['value'][1])
-            # Average CPU user cycles for all CPUs, [0-1]
-            cpu_user = (float)(p_metric.custom_query(
-                query=f'avg(rate(node_cpu_seconds_total{{mode="user"}}[{interval_sec}s]))')[0]['value'][1])
-            # Average CPU system cycles for all CPUs, [0-1]
-            cpu_system = (float)(p_metric.custom_query(
-                query=f'avg(rate(node_cpu_seconds_total{{mode="system"}}[{interval_sec}s]))')[0]['value'][1])
-            #
-            tpl['cpu'] = [cpu_idle, cpu_user, cpu_system]
-
-            # Network-related metrics
-            # Sum of the total network throughput for all devices, bps
-
-            try:
-                network_rx_bps = (float)(p_metric.custom_query(
-                    query=f'sum(rate(node_network_receive_bytes_total[{interval_sec}s]))')[0]['value'][1]) * 8
-            except:
-                assert False
-            try:
-                network_tx_bps = (float)(p_metric.custom_query(
-                    query=f'sum(rate(node_network_transmit_bytes_total[{interval_sec}s]))')[0]['value'][1]) * 8
-            except:
-                assert False
-            #
-            tpl['net'] = [network_tx_bps, network_rx_bps]
-            
-            # Memory-related metrics
-            # Free memory, Bytes
-            # import pdb; pdb.set_trace()
-            mem_query = p_metric.custom_query(
-            query=f'node_memory_MemAvailable_bytes[{interval_sec}s]')
-            if 'value' in mem_query[0]:
-                assert False
-            try:
-                mem_free = mem_query[0]['values']
-            except:
-                assert False
-
-            mem_free = np.array([(int)(val) for (_, val) in mem_free])
-            mem_free_avg = np.average(mem_free)
-
-            # Total memory, look-up 1 time and cache
-            if self.total_mem_ == None:
-                self.total_mem_ = (int)(p_metric.custom_query(
-                    query=f'node_memory_MemTotal_bytes')[0]['value'][1])
-
-            #
-            mem_free_frac = mem_free_avg / (float)(self.total_mem_)
-            tpl['mem'] = mem_free_frac
-
-            # Append all metrics for this worker
-            ret[p_id] = tpl
-
-        return ret
\ No newline at end of file
+        return self.sampler_.sample_env(interval_sec)
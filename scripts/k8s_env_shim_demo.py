@@ -8,6 +8,7 @@ from k8s_env_shim import Env
 from pprint import pprint
 from setup_service import Service
 from setup_deployment import Deployment
+from latency_stats import compute_latency_stats
 
 # Run the benchmark and print stats
 def run_service(env, service, invoker_configs):
@@ -18,7 +19,7 @@ def run_service(env, service, invoker_configs):
     (stat_issued, stat_completed), (stat_real_rps, stat_target_rps), stat_lat_filename = \
         env.invoke_service(service, duration, rps)
     lat_stat = env.get_latencies(stat_lat_filename)
-    if lat_stat == []:
+    if len(lat_stat) == 0:
         print("[ERROR] No responses were returned, no latency statistics is computed.")
         return
     
@@ -27,13 +28,13 @@ def run_service(env, service, invoker_configs):
 
     # Print statistics.
     print("[INFO] Invocation statistics:\n")
-    lat_stat.sort()
+    lat_50, lat_90, lat_99, lat_999 = compute_latency_stats(lat_stat).percentiles()
     print(
         f'    stat: {stat_issued}, {stat_completed}, {stat_real_rps}, {stat_target_rps}, latency file: {stat_lat_filename}')
-    print('    50th: ', lat_stat[(int)(len(lat_stat) * 0.5)])
-    print('    90th: ', lat_stat[(int)(len(lat_stat) * 0.90)])
-    print('    99th: ', lat_stat[(int)(len(lat_stat) * 0.99)])
-    print('    99.9th: ', lat_stat[(int)(len(lat_stat) * 0.999)])
+    print('    50th: ', lat_50)
+    print('    90th: ', lat_90)
+    print('    99th: ', lat_99)
+    print('    99.9th: ', lat_999)
     print('    env_state:')
     pprint(env_state)
 
@@ -0,0 +1,121 @@
+import numpy as np
+
+from latency_stats import PERCENTILES, LatencyStats, iter_latency_chunks
+
+class LatencyHistogram:
+    """Fixed-memory, mergeable log-bucketed latency histogram (HDR-style).
+
+    Values are bucketed by power of two, and every power of two is split into
+    `2**sub_bucket_bits` linear sub-buckets, so any percentile is answered within a
+    relative error of `2**-sub_bucket_bits` over the whole range. Values below 1 go to
+    the first bucket and values above `2**max_exponent` to the last one.
+
+    - Attributes:
+        - `sub_bucket_bits` (Int) : log2 of the number of sub-buckets per power of two.
+        - `max_exponent` (Int) : log2 of the largest value tracked precisely.
+        - `counts` (np.ndarray) : sample count per bucket.
+        - `count` (Int) : total number of samples.
+    - Methods:
+        - `record` (np.ndarray) : add samples.
+        - `record_file` (String) : add every sample of an invoker latency file, chunk by chunk.
+        - `merge` (LatencyHistogram) : add the samples of another histogram, in-place.
+        - `percentile` (Float) : value at percentile q in [0, 1].
+        - `stats` : LatencyStats with the usual PERCENTILES.
+        - `to_dict` / `from_dict` : compact representation with only the non-empty buckets.
+    """
+    def __init__(self, sub_bucket_bits=7, max_exponent=40):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.max_exponent = max_exponent
+        self.counts = np.zeros((max_exponent + 1) << sub_bucket_bits, dtype=np.int64)
+        self.count = 0
+        self.min = np.inf
+        self.max = -np.inf
+
+    # Bucket index of each value in @param values.
+    def bucket_index(self, values):
+        values = np.clip(values, 1, np.ldexp(1.0, self.max_exponent + 1) - 1)
+        # values = mantissa * 2**exponent, mantissa in [0.5, 1)
+        mantissa, exponent = np.frexp(values)
+        sub_bucket = ((mantissa * 2 - 1) * (1 << self.sub_bucket_bits)).astype(np.int64)
+        return ((exponent.astype(np.int64) - 1) << self.sub_bucket_bits) + sub_bucket
+
+    # Middle of the value range covered by each bucket in @param index.
+    def bucket_value(self, index):
+        exponent = index >> self.sub_bucket_bits
+        sub_bucket = index & ((1 << self.sub_bucket_bits) - 1)
+        return np.ldexp(1 + (sub_bucket + 0.5) / (1 << self.sub_bucket_bits), exponent)
+
+    def record(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if len(values) == 0:
+            return self
+        self.counts += np.bincount(self.bucket_index(values), minlength=len(self.counts))
+        self.count += len(values)
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        return self
+
+    def record_file(self, filename, chunk_bytes=1 << 23):
+        for chunk in iter_latency_chunks(filename, chunk_bytes):
+            self.record(chunk)
+        return self
+
+    def merge(self, other):
+        if (other.sub_bucket_bits, other.max_exponent) != (self.sub_bucket_bits, self.max_exponent):
+            assert False, "[ERROR] Cannot merge latency histograms with different bucket layouts."
+        self.counts += other.counts
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def __iadd__(self, other):
+        return self.merge(other)
+
+    def __len__(self):
+        return self.count
+
+    # Value at percentile @param q, using the same rank convention as `lat[(int)(len(lat) * q)]`.
+    # Returns None if the histogram is empty.
+    def percentile(self, q):
+        return self.percentiles([q])[0]
+
+    def percentiles(self, qs):
+        if self.count == 0:
+            return [None for _ in qs]
+        ranks = np.array([(int)(self.count * q) for q in qs])
+        index = np.searchsorted(np.cumsum(self.counts), ranks, side='right')
+        # The exact extremes are known, keep the estimate within them.
+        return [float(v) for v in np.clip(self.bucket_value(index), self.min, self.max)]
+
+    def stats(self):
+        if self.count == 0:
+            return None
+        return LatencyStats(self.count, *self.percentiles(PERCENTILES))
+
+    def to_dict(self):
+        nonzero = np.flatnonzero(self.counts)
+        return {'sub_bucket_bits': self.sub_bucket_bits,
+                'max_exponent': self.max_exponent,
+                'min': float(self.min),
+                'max': float(self.max),
+                'buckets': nonzero.tolist(),
+                'counts': self.counts[nonzero].tolist()}
+
+    @classmethod
+    def from_dict(cls, data):
+        hist = cls(data['sub_bucket_bits'], data['max_exponent'])
+        hist.counts[np.array(data['buckets'], dtype=np.int64)] = data['counts']
+        hist.count = int(hist.counts.sum())
+        hist.min = data['min']
+        hist.max = data['max']
+        return hist
+
+# Merge a list of histograms, e.g. from several benchmarks or parallel invocations.
+def merge_histograms(histograms):
+    merged = None
+    for hist in histograms:
+        if merged is None:
+            merged = LatencyHistogram(hist.sub_bucket_bits, hist.max_exponent)
+        merged.merge(hist)
+    return merged
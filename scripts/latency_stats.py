@@ -0,0 +1,125 @@
+import numpy as np
+
+from collections import namedtuple
+
+# Percentiles reported for every invocation: 50th, 90th, 99th, 99.9th.
+PERCENTILES = (0.5, 0.9, 0.99, 0.999)
+
+class LatencyStats(namedtuple('LatencyStats', ['count', 'lat_50', 'lat_90', 'lat_99', 'lat_999'])):
+    """Summary of one latency file: number of samples and the PERCENTILES (same unit as the file)."""
+    __slots__ = ()
+
+    # (50th, 90th, 99th, 99.9th), as stored per benchmark by KubernetesEnv.get_lats.
+    def percentiles(self):
+        return (self.lat_50, self.lat_90, self.lat_99, self.lat_999)
+
+# Sorted-order index of each percentile, same convention as `lat[(int)(len(lat) * q)]`.
+def percentile_indices(count):
+    return [(int)(count * q) for q in PERCENTILES]
+
+# Load an invoker latency file (one value per line) into a float64 array.
+def load_latencies(filename):
+    return np.fromfile(filename, dtype=np.float64, sep=' ')
+
+# Read an invoker latency file in chunks of about @param chunk_bytes, as float64 arrays.
+def iter_latency_chunks(filename, chunk_bytes=1 << 23):
+    with open(filename, 'rb') as f:
+        rest = b''
+        while True:
+            block = f.read(chunk_bytes)
+            if not block:
+                break
+            block = rest + block
+            end = block.rfind(b'\n') + 1
+            rest = block[end:]
+            if end > 0:
+                yield np.fromstring(block[:end].decode(), dtype=np.float64, sep=' ')
+        if rest.strip():
+            yield np.fromstring(rest.decode(), dtype=np.float64, sep=' ')
+
+# Compute LatencyStats of an in-memory array with one np.partition pass, None if empty.
+def compute_latency_stats(latencies):
+    latencies = np.asarray(latencies, dtype=np.float64)
+    if len(latencies) == 0:
+        return None
+    indices = percentile_indices(len(latencies))
+    selected = np.partition(latencies, sorted(set(indices)))
+    return LatencyStats(len(latencies), *[selected[i] for i in indices])
+
+# Compute exact LatencyStats of a latency file without loading it in memory, None if empty.
+# Every pass over the file narrows each percentile down to a value range; once a range holds
+# at most @param max_values samples, they are collected and the percentile is selected exactly.
+# A range too narrow to split into @param num_bins bins (or holding one repeated value) is
+# resolved from the counts of its distinct values instead.
+def compute_latency_stats_streaming(filename, chunk_bytes=1 << 23, max_values=1 << 22, num_bins=4096):
+    count, lo, hi = 0, np.inf, -np.inf
+    for chunk in iter_latency_chunks(filename, chunk_bytes):
+        if len(chunk) > 0:
+            count += len(chunk)
+            lo = min(lo, chunk.min())
+            hi = max(hi, chunk.max())
+    if count == 0:
+        return None
+
+    # Pending windows: index -> [lo, hi, closed, population, rank within window]
+    indices = percentile_indices(count)
+    windows = {i: [lo, hi, True, count, i] for i in set(indices)}
+    results = {}
+    while windows:
+        for i, (w_lo, w_hi, _, _, rank) in list(windows.items()):
+            if w_lo == w_hi:
+                results[i] = w_lo
+                del windows[i]
+        if not windows:
+            break
+        edges, distinct, values = {}, {}, {}
+        for i, w in windows.items():
+            if w[3] <= max_values:
+                values[i] = []
+                continue
+            w_edges = np.linspace(w[0], w[1], num_bins + 1)
+            if np.all(np.diff(w_edges) > 0):
+                edges[i] = w_edges
+            else:
+                distinct[i] = []
+        counts = {i: np.zeros(num_bins, dtype=np.int64) for i in edges}
+        extremes = {i: [np.inf, -np.inf] for i in edges}
+        for chunk in iter_latency_chunks(filename, chunk_bytes):
+            for i, (w_lo, w_hi, closed, _, _) in windows.items():
+                in_window = chunk[(chunk >= w_lo) & ((chunk <= w_hi) if closed else (chunk < w_hi))]
+                if i in edges:
+                    counts[i] += np.histogram(in_window, bins=edges[i])[0]
+                    if len(in_window) > 0:
+                        extremes[i] = [min(extremes[i][0], in_window.min()), max(extremes[i][1], in_window.max())]
+                elif i in distinct:
+                    distinct[i].append(np.unique(in_window, return_counts=True))
+                else:
+                    values[i].append(in_window)
+        for i in list(windows):
+            rank = windows[i][4]
+            if i in values:
+                selected = np.concatenate(values[i])
+                results[i] = np.partition(selected, rank)[rank]
+                del windows[i]
+            elif i in distinct:
+                unique, inverse = np.unique(np.concatenate([u for u, _ in distinct[i]]), return_inverse=True)
+                cumulative = np.cumsum(np.bincount(inverse, weights=np.concatenate([c for _, c in distinct[i]])))
+                results[i] = unique[(int)(np.searchsorted(cumulative, rank, side='right'))]
+                del windows[i]
+            elif extremes[i][0] == extremes[i][1]:
+                # Every sample of the window has the same value.
+                results[i] = extremes[i][0]
+                del windows[i]
+            else:
+                cumulative = np.cumsum(counts[i])
+                b = (int)(np.searchsorted(cumulative, rank, side='right'))
+                before = cumulative[b - 1] if b > 0 else 0
+                closed = windows[i][2] and b == num_bins - 1
+                windows[i] = [edges[i][b], edges[i][b + 1], closed, counts[i][b], rank - before]
+    return LatencyStats(count, *[results[i] for i in indices])
+
+# Load and summarize an invoker latency file, None if it is empty.
+def get_latency_stats(filename, streaming=False):
+    if streaming:
+        return compute_latency_stats_streaming(filename)
+    return compute_latency_stats(load_latencies(filename))
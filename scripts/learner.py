@@ -0,0 +1,144 @@
+import threading
+import time
+
+class WeightStore:
+    """Latest published network weights with a version number, shared between threads.
+
+    The learner publishes a copy of its state dict, and the actor loads it into its own
+    network only when the version changed since its last refresh. Copies are made under
+    the lock, so neither side ever sees a half-written set of weights.
+
+    - Attributes:
+        - `version` (Int) : number of publishes so far, 0 before the first.
+    - Methods:
+        - `publish` (Dict) : store a copy of a state dict as the next version.
+        - `refresh` (nn.Module, Int) : load the latest weights into a network if they are newer
+          than @param version, returns the version the network now has.
+    """
+    def __init__(self):
+        self.lock_ = threading.Lock()
+        self.state_dict_ = None
+        self.version = 0
+
+    def publish(self, state_dict):
+        state_dict = {key: value.detach().clone() for key, value in state_dict.items()}
+        with self.lock_:
+            self.state_dict_ = state_dict
+            self.version += 1
+            return self.version
+
+    def refresh(self, net, version=0):
+        with self.lock_:
+            if self.version == version:
+                return version
+            net.load_state_dict(self.state_dict_)
+            return self.version
+
+class LockedMemory:
+    """View of a replay buffer whose reads and priority updates hold a lock.
+
+    What `AsyncLearner.optimize` gets instead of the buffer: the batch is sampled and the
+    priorities are written back under the lock, while the forward and backward passes in
+    between run without it. A sampled batch is a copy (gathered rows), so the actor may
+    overwrite the same slots meanwhile.
+
+    - Methods:
+        - `__len__`, `sample_weighted`, `update_priorities` : as the buffer's, under the lock.
+    """
+    def __init__(self, memory, lock):
+        self.memory = memory
+        self.lock = lock
+
+    def __len__(self):
+        with self.lock:
+            return len(self.memory)
+
+    def sample_weighted(self, batch_size):
+        with self.lock:
+            return self.memory.sample_weighted(batch_size)
+
+    def update_priorities(self, indices, td_errors):
+        with self.lock:
+            self.memory.update_priorities(indices, td_errors)
+
+class AsyncLearner(threading.Thread):
+    """Learner thread running optimization steps over the replay buffer at its own rate.
+
+    The actor keeps stepping the environment with its own copy of the policy and adds
+    transitions with `push`/`push_batch`; meanwhile this thread calls `optimize` (one
+    optimization step plus target update) whenever the buffer holds a batch, and
+    publishes the policy weights to `weights` every `publish_every` updates. Buffer
+    writes, samples and priority updates are serialized by one lock, which is not held
+    during the gradient step (see LockedMemory). Tensor ops release the GIL, so both
+    sides make progress even on CPU.
+
+    - Attributes:
+        - `memory` (ReplayBuffer) : replay buffer shared with the actor.
+        - `policy_net` (nn.Module) : network being optimized, owned by this thread.
+        - `optimize` (Callable) : one optimization step, called with a LockedMemory of the buffer.
+        - `weights` (WeightStore) : where the policy weights are published.
+        - `publish_every` (Int) : updates between two publishes.
+        - `max_updates_per_step` (Float) : cap on updates per env step, 1 by default as in the
+          synchronous loop (None for no cap), so the learner doesn't spin over a small buffer
+          while the actor waits on the cluster.
+        - `updates`, `env_steps` (Int) : counters.
+    - Methods:
+        - `push` / `push_batch` : add transitions, same arguments as the buffer.
+        - `updates_per_step` : updates so far divided by env steps so far.
+        - `stop` : stop the thread and publish the final weights.
+    """
+    def __init__(self, memory, policy_net, optimize, weights=None, batch_size=1, publish_every=10,
+                 max_updates_per_step=1.0, idle_sleep=0.001):
+        super().__init__(daemon=True)
+        self.memory = memory
+        self.policy_net = policy_net
+        self.optimize = optimize
+        self.weights = weights if weights is not None else WeightStore()
+        self.batch_size = batch_size
+        self.publish_every = publish_every
+        self.max_updates_per_step = max_updates_per_step
+        self.idle_sleep = idle_sleep
+        self.lock = threading.Lock()
+        self.locked_memory_ = LockedMemory(memory, self.lock)
+        self.stop_ = threading.Event()
+        self.updates = 0
+        self.env_steps = 0
+        self.weights.publish(policy_net.state_dict())
+
+    def push(self, *transition):
+        with self.lock:
+            self.memory.push(*transition)
+            self.env_steps += 1
+
+    def push_batch(self, states, *transitions):
+        with self.lock:
+            self.memory.push_batch(states, *transitions)
+            self.env_steps += len(states)
+
+    def updates_per_step(self):
+        return self.updates / self.env_steps if self.env_steps else 0.0
+
+    # Whether an update may run now: a full batch is stored and the cap isn't reached.
+    def ready(self):
+        if len(self.memory) < self.batch_size:
+            return False
+        if self.max_updates_per_step is not None:
+            return self.updates < self.max_updates_per_step * self.env_steps
+        return True
+
+    def run(self):
+        while not self.stop_.is_set():
+            with self.lock:
+                ready = self.ready()
+            if not ready:
+                time.sleep(self.idle_sleep)
+                continue
+            self.optimize(self.locked_memory_)
+            self.updates += 1
+            if self.updates % self.publish_every == 0:
+                self.weights.publish(self.policy_net.state_dict())
+
+    def stop(self):
+        self.stop_.set()
+        self.join()
+        self.weights.publish(self.policy_net.state_dict())
@@ -0,0 +1,201 @@
+import asyncio
+import time
+import numpy as np
+
+# Request payload of the vSwarm functions: helloworld.HelloRequest{name: "Invoke Relay"},
+# encoded by hand so no generated protobuf module is needed.
+HELLO_METHOD = '/helloworld.Greeter/SayHello'
+HELLO_REQUEST = b'\n\x0cInvoke Relay'
+
+# Offsets (seconds from the start) at which requests are issued.
+# distribution : 'poisson' for exponential inter-arrival times, 'constant' for a fixed period
+def arrival_times(rps, duration, distribution='poisson', rng=None):
+    num_requests = (int)(rps * duration)
+    if num_requests == 0:
+        return np.zeros(0)
+    if distribution == 'constant':
+        return np.arange(num_requests) / rps
+    if distribution == 'poisson':
+        rng = rng if rng is not None else np.random.default_rng()
+        # Draw enough gaps that the arrivals almost surely cover the whole duration.
+        num_gaps = num_requests + (int)(6 * np.sqrt(num_requests)) + 16
+        times = np.cumsum(rng.exponential(1 / rps, num_gaps))
+        return times[times < duration]
+    assert False, f"[ERROR] Unknown arrival distribution `{distribution}`."
+
+class HttpClient:
+    """Minimal HTTP/1.1 client over asyncio streams with keep-alive connection reuse.
+
+    Idle connections are kept in a pool and reused; a new one is opened when all are
+    busy, up to `max_connections` (requests then queue, which shows up in their latency).
+    A request on a reused connection that the server closed before answering is sent
+    once more on a new connection, as in control_plane.ApiConnection.
+
+    - Attributes:
+        - `host`, `port` (String, Int) : server address.
+        - `path`, `method`, `body` : request to send.
+        - `max_connections` (Int) : maximum number of open connections.
+    - Methods:
+        - `request` : send one request and read the whole response.
+        - `close` : close all connections.
+    """
+    def __init__(self, host, port, path='/', method='GET', body=b'', max_connections=256):
+        self.host = host
+        self.port = port
+        self.max_connections = max_connections
+        headers = [f'{method} {path} HTTP/1.1', f'Host: {host}:{port}', 'Connection: keep-alive']
+        if body:
+            headers.append(f'Content-Length: {len(body)}')
+        self.request_ = ('\r\n'.join(headers) + '\r\n\r\n').encode() + body
+        self.idle_ = []
+        self.slots_ = None
+
+    async def request(self):
+        if self.slots_ is None:
+            self.slots_ = asyncio.Semaphore(self.max_connections)
+        async with self.slots_:
+            while True:
+                reused = len(self.idle_) > 0
+                if reused:
+                    reader, writer = self.idle_.pop()
+                else:
+                    reader, writer = await asyncio.open_connection(self.host, self.port)
+                try:
+                    writer.write(self.request_)
+                    await writer.drain()
+                    status, keep_alive = await self.read_response(reader)
+                except (asyncio.IncompleteReadError, ConnectionError) as e:
+                    writer.close()
+                    # The server closed the idle connection before it got the request: nothing
+                    # of a response arrived, so the request is sent again on a new connection.
+                    if reused and not (isinstance(e, asyncio.IncompleteReadError) and e.partial):
+                        continue
+                    raise
+                except BaseException:
+                    writer.close()
+                    raise
+                break
+            if keep_alive:
+                self.idle_.append((reader, writer))
+            else:
+                writer.close()
+        if status >= 400:
+            raise ConnectionError(f"[ERROR] HTTP status {status}.")
+
+    # Read a response with a Content-Length body. Returns (status, connection can be reused).
+    async def read_response(self, reader):
+        head = await reader.readuntil(b'\r\n\r\n')
+        lines = head.decode('latin-1').split('\r\n')
+        status = (int)(lines[0].split(' ', 2)[1])
+        length = None
+        keep_alive = True
+        for line in lines[1:]:
+            name, _, value = line.partition(':')
+            name = name.strip().lower()
+            if name == 'content-length':
+                length = (int)(value)
+            elif name == 'connection' and value.strip().lower() == 'close':
+                keep_alive = False
+        if length is None:
+            raise ConnectionError("[ERROR] Responses without Content-Length are not supported.")
+        await reader.readexactly(length)
+        return status, keep_alive
+
+    async def close(self):
+        while self.idle_:
+            _, writer = self.idle_.pop()
+            writer.close()
+
+class GrpcClient:
+    """Unary gRPC client over one grpc.aio channel (HTTP/2 multiplexes all requests).
+
+    By default it calls `helloworld.Greeter/SayHello` like the vSwarm invoker. Requires
+    the `grpcio` package.
+    """
+    def __init__(self, host, port, method=HELLO_METHOD, payload=HELLO_REQUEST):
+        try:
+            import grpc
+        except ImportError:
+            assert False, "[ERROR] GrpcClient requires the `grpcio` package."
+        self.grpc_ = grpc
+        self.target = f'{host}:{port}'
+        self.method = method
+        self.payload = payload
+        self.channel_ = None
+
+    async def request(self):
+        # grpc.aio channels are bound to the running event loop, open it on first use.
+        if self.channel_ is None:
+            self.channel_ = self.grpc_.aio.insecure_channel(self.target)
+            # Payloads are raw serialized protobuf bytes.
+            self.call_ = self.channel_.unary_unary(self.method, request_serializer=None, response_deserializer=None)
+        await self.call_(self.payload)
+
+    async def close(self):
+        if self.channel_ is not None:
+            await self.channel_.close()
+            self.channel_ = None
+
+class LoadGenerator:
+    """Open-loop load generator: requests are issued on schedule, whether or not earlier ones completed.
+
+    Latencies are measured from the scheduled issue time, so a generator or server that
+    falls behind shows up in the latencies instead of silently lowering the load.
+
+    - Attributes:
+        - `client` (HttpClient | GrpcClient) : anything with `async request()` and `async close()`.
+        - `rps` (Float) : target requests per second.
+        - `duration` (Float) : seconds to issue requests for.
+        - `distribution` (String) : 'poisson' or 'constant' arrivals.
+        - `request_timeout` (Float) : seconds before a request counts as failed.
+        - `drain_timeout` (Float) : seconds to wait for outstanding requests after the last one is issued.
+    - Methods:
+        - `run` : coroutine, returns `(issued, completed), (real_rps, target_rps), latencies` (µs, like the invoker).
+    """
+    def __init__(self, client, rps, duration, distribution='poisson', request_timeout=10, drain_timeout=10, seed=None):
+        self.client = client
+        self.rps = rps
+        self.duration = duration
+        self.distribution = distribution
+        self.request_timeout = request_timeout
+        self.drain_timeout = drain_timeout
+        self.rng_ = np.random.default_rng(seed)
+
+    async def issue(self, scheduled, latencies, i):
+        try:
+            await asyncio.wait_for(self.client.request(), self.request_timeout)
+        except Exception:
+            return
+        latencies[i] = (time.perf_counter() - scheduled) * 1e6
+
+    async def run(self):
+        schedule = arrival_times(self.rps, self.duration, self.distribution, self.rng_)
+        latencies = np.full(len(schedule), np.nan)
+        tasks = set()
+        start = time.perf_counter()
+        issued = 0
+        while issued < len(schedule):
+            now = time.perf_counter() - start
+            # Issue every request that is due, then sleep until the next one.
+            due = (int)(np.searchsorted(schedule, now, side='right'))
+            for i in range(issued, due):
+                task = asyncio.ensure_future(self.issue(start + schedule[i], latencies, i))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            issued = max(issued, due)
+            if issued < len(schedule):
+                await asyncio.sleep(max(0, schedule[issued] - (time.perf_counter() - start)))
+        elapsed = time.perf_counter() - start
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=self.drain_timeout)
+            for task in pending:
+                task.cancel()
+        await self.client.close()
+
+        latencies = latencies[~np.isnan(latencies)]
+        real_rps = issued / max(elapsed, self.duration) if issued else 0.0
+        return (issued, len(latencies)), (real_rps, float(self.rps)), latencies
+
+# Run a LoadGenerator to completion from synchronous code.
+def generate_load(client, rps, duration, distribution='poisson', **kwargs):
+    return asyncio.run(LoadGenerator(client, rps, duration, distribution, **kwargs).run())
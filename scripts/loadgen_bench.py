@@ -0,0 +1,64 @@
+import argparse
+import asyncio
+import time
+import numpy as np
+
+from multiprocessing import Process, Event
+from latency_stats import compute_latency_stats
+from loadgen import HttpClient, generate_load
+
+# Dummy HTTP/1.1 keep-alive server answering every request with a small fixed body
+# after @param delay_ms. Runs in its own process so the generator has a core to itself.
+def serve(port, delay_ms, ready):
+    body = b'Hello, Invoke Relay'
+    response = b'HTTP/1.1 200 OK\r\nContent-Length: ' + str(len(body)).encode() + b'\r\n\r\n' + body
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                await reader.readuntil(b'\r\n\r\n')
+                if delay_ms > 0:
+                    await asyncio.sleep(delay_ms / 1000)
+                writer.write(response)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+
+    async def main():
+        server = await asyncio.start_server(handle, '127.0.0.1', port, backlog=1024)
+        ready.set()
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(main())
+
+def main(args):
+    ready = Event()
+    server = Process(target=serve, args=(args.port, args.delay, ready), daemon=True)
+    server.start()
+    ready.wait()
+
+    print(f'{"target rps":>10} {"real rps":>10} {"issued":>8} {"completed":>10} {"p50 (ms)":>9} {"p99 (ms)":>9} {"cpu (s)":>8}')
+    for rps in [int(r) for r in args.rps.split(',')]:
+        client = HttpClient('127.0.0.1', args.port)
+        cpu = time.process_time()
+        (issued, completed), (real_rps, target_rps), lats = generate_load(client, rps, args.duration, args.distribution)
+        cpu = time.process_time() - cpu
+        stats = compute_latency_stats(lats)
+        p50, p99 = (stats.lat_50 / 1000, stats.lat_99 / 1000) if stats is not None else (np.nan, np.nan)
+        print(f'{target_rps:>10.0f} {real_rps:>10.1f} {issued:>8} {completed:>10} {p50:>9.3f} {p99:>9.3f} {cpu:>8.2f}')
+
+    server.terminate()
+
+#
+# Example cmd:
+#   python3 loadgen_bench.py --rps 100,500,1000,2000,4000 --duration 5
+#
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rps', default='100,500,1000,2000,4000', help='Comma-separated target RPS values')
+    parser.add_argument('--duration', type=float, default=5, help='Seconds of load per target RPS')
+    parser.add_argument('--distribution', default='poisson', help='Arrival distribution: poisson or constant')
+    parser.add_argument('--delay', type=float, default=1, help='Server processing time per request (ms)')
+    parser.add_argument('--port', type=int, default=18080, help='Port of the dummy server')
+    args = parser.parse_args()
+    main(args)
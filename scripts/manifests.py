@@ -0,0 +1,128 @@
+import time
+
+from functools import lru_cache
+from os import path
+
+import yaml
+from yaml.loader import SafeLoader
+
+# Take Deployment, Service, and HPA dicts and reassign the names.
+def rename_yaml(dep, svc, hpa, new_name):
+    # Update Deployment name.
+    dep['metadata']['name'] = new_name
+    dep['metadata']['labels']['app'] = new_name
+    dep['spec']['selector']['matchLabels']['app'] = new_name
+    dep['spec']['template']['metadata']['labels']['app'] = new_name
+    for i in range(len(dep['spec']['template']['spec']['containers'])):
+        if dep['spec']['template']['spec']['containers'][i]['name'] != 'relay':
+            dep['spec']['template']['spec']['containers'][i]['name'] = new_name
+    # Update chaining.
+    if "-addr" in dep['spec']['template']['spec']['containers'][i]['args']:
+        address = dep['spec']['template']['spec']['containers'][i]['args'][1]
+        ind = address.index('.')
+        address = address[:ind] + new_name[-11:] + address[ind:]
+        dep['spec']['template']['spec']['containers'][i]['args'][1] = address
+    # Update Service name.
+    svc['metadata']['name'] = new_name
+    svc['spec']['selector']['app'] = new_name
+
+    # Update HPA name.
+    hpa['metadata']['name'] = new_name + '-hpa'
+    hpa['spec']['scaleTargetRef']['name'] = new_name
+
+    return dep, svc, hpa
+
+# (Deployment, Service, HPA) dicts of k8s-yamls/<@param function>.yaml, parsed once per process.
+# Never modify them: render_function returns copies.
+@lru_cache(maxsize=None)
+def base_manifests(function):
+    with open(path.join(path.dirname(__file__), f"k8s-yamls/{function}.yaml")) as f:
+        return tuple(yaml.load_all(f, Loader=SafeLoader))
+
+# Copy of a parsed manifest: new dicts and lists, shared scalars (which are immutable).
+# About 2.5x faster than copy.deepcopy, which also memoizes and dispatches on every scalar.
+def copy_manifest(obj):
+    if isinstance(obj, dict):
+        return {k: copy_manifest(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [copy_manifest(v) for v in obj]
+    return obj
+
+# Deployment, Service and HPA dicts of @param function renamed to @param new_name, from the cache.
+# @param scale freezes the HPA at that many replicas.
+# Returns: (dep, svc, hpa)
+def render_function(function, new_name=None, scale=None):
+    dep, svc, hpa = [copy_manifest(m) for m in base_manifests(function)]
+    if new_name is not None:
+        dep, svc, hpa = rename_yaml(dep, svc, hpa, new_name)
+    if scale is not None:
+        hpa['spec']['minReplicas'] = int(scale)
+        hpa['spec']['maxReplicas'] = int(scale)
+    return dep, svc, hpa
+
+# k8s API clients by kind, created once per process (after the kube config is loaded).
+@lru_cache(maxsize=None)
+def kind_apis():
+    from kubernetes import client
+    return {
+        'Deployment': (client.AppsV1Api(), 'namespaced_deployment'),
+        'Service': (client.CoreV1Api(), 'namespaced_service'),
+        'HorizontalPodAutoscaler': (client.AutoscalingV2Api(), 'namespaced_horizontal_pod_autoscaler'),
+    }
+
+def manifest_api(manifest):
+    kind = manifest['kind']
+    if kind not in kind_apis():
+        assert False, f"\n[ERROR] Cannot apply manifests of kind `{kind}`."
+    api, resource = kind_apis()[kind]
+    return api, resource, manifest['metadata'].get('namespace', 'default')
+
+# Create a manifest dict through the kubernetes client, as `kubectl create -f` would.
+# Returns: the created object.
+def create_manifest(manifest):
+    from kubernetes.client.rest import ApiException
+    api, resource, namespace = manifest_api(manifest)
+    try:
+        return getattr(api, f'create_{resource}')(namespace=namespace, body=manifest)
+    except ApiException as e:
+        assert False, f"\n[ERROR] Failed to create {manifest['kind']} `{manifest['metadata']['name']}`\n[ERROR] Error message: {e.reason}"
+
+# Read the object of a manifest dict through the kubernetes client.
+def read_manifest(manifest):
+    api, resource, namespace = manifest_api(manifest)
+    return getattr(api, f'read_{resource}')(name=manifest['metadata']['name'], namespace=namespace)
+
+# Delete the object of a manifest dict through the kubernetes client. Returns once the delete is
+# accepted; with foreground propagation the object is gone only later, see wait_deleted.
+def delete_manifest(manifest):
+    from kubernetes import client
+    from kubernetes.client.rest import ApiException
+    api, resource, namespace = manifest_api(manifest)
+    try:
+        getattr(api, f'delete_{resource}')(name=manifest['metadata']['name'], namespace=namespace,
+                                           body=client.V1DeleteOptions(propagation_policy="Foreground"))
+    except ApiException as e:
+        assert False, f"\n[ERROR] Failed to delete {manifest['kind']} `{manifest['metadata']['name']}`\n[ERROR] Error message: {e.reason}"
+
+# Wait until the objects of @param manifests are gone (read returns 404), as `kubectl delete --wait`.
+# Raises TimeoutError if some are still there after @param timeout seconds.
+def wait_deleted(manifests, timeout=60, poll_interval=0.5):
+    from kubernetes.client.rest import ApiException
+    deadline = time.time() + timeout
+    pending = list(manifests)
+    while True:
+        remaining = []
+        for manifest in pending:
+            try:
+                read_manifest(manifest)
+            except ApiException as e:
+                if e.status != 404:
+                    raise
+                continue
+            remaining.append(manifest)
+        pending = remaining
+        if not pending:
+            return
+        if time.time() >= deadline:
+            raise TimeoutError(f"[ERROR] {[m['metadata']['name'] for m in pending]} not deleted within {timeout} seconds.")
+        time.sleep(poll_interval)
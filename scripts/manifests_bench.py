@@ -0,0 +1,66 @@
+import argparse
+import copy
+import os
+import random
+import string
+import tempfile
+import time
+import yaml
+
+from os import path
+from yaml.loader import SafeLoader
+from manifests import base_manifests, copy_manifest, rename_yaml, render_function
+
+# Renders per second of @param render over @param n renders of @param function.
+def bench(render, function, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        render(function, function + '-' + ''.join(random.choices(string.ascii_lowercase, k=10)))
+    return n / (time.perf_counter() - start)
+
+# Before manifests.py: parse the base YAML, rename, dump to k8s-yamls/tmp and remove it again
+# (as Service.delete_service does).
+def render_file(function, new_name, tmp_dir):
+    with open(path.join(path.dirname(__file__), f"k8s-yamls/{function}.yaml")) as f:
+        dep, svc, hpa = yaml.load_all(f, Loader=SafeLoader)
+    new_dep, new_svc, new_hpa = rename_yaml(dep, svc, hpa, new_name)
+    file_name = f"{tmp_dir}/{new_name}.yaml"
+    with open(file_name, 'x') as f:
+        yaml.dump_all([new_dep, new_svc, new_hpa], f)
+    os.remove(file_name)
+    return new_dep, new_svc, new_hpa
+
+# Cached base manifests with copy.deepcopy instead of copy_manifest.
+def render_deepcopy(function, new_name):
+    dep, svc, hpa = copy.deepcopy(base_manifests(function))
+    return rename_yaml(dep, svc, hpa, new_name)
+
+def main(args):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for function in args.functions:
+            # Same manifests either way.
+            with open(path.join(path.dirname(__file__), f"k8s-yamls/{function}.yaml")) as f:
+                expected = rename_yaml(*yaml.load_all(f, Loader=SafeLoader), function + '-abcdefghij')
+            assert list(render_function(function, function + '-abcdefghij')) == list(expected), function
+            # Renders don't share mutable state with the cache.
+            render_function(function, function + '-klmnopqrst')[0]['spec']['replicas'] = 1000
+            assert base_manifests(function)[0]['spec'].get('replicas') != 1000
+
+            file_rps = bench(lambda f, name: render_file(f, name, tmp_dir), function, args.n // 10)
+            deepcopy_rps = bench(render_deepcopy, function, args.n)
+            cached_rps = bench(render_function, function, args.n)
+            print(f'{function}: file round trip {file_rps:.0f}/s, cached + deepcopy {deepcopy_rps:.0f}/s, '
+                  f'cached + copy_manifest {cached_rps:.0f}/s ({cached_rps / file_rps:.0f}x)')
+
+#
+# Example cmd:
+#   python3 manifests_bench.py
+#   python3 manifests_bench.py --functions fibonacci-python streaming -n 20000
+#
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--functions', nargs='*', default=['fibonacci-python', 'hotel-app-geo', 'streaming'],
+                        help='Functions of k8s-yamls/ to render')
+    parser.add_argument('-n', type=int, default=10000, help='Number of renders (a tenth for the file round trip)')
+    args = parser.parse_args()
+    main(args)
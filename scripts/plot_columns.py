@@ -1,33 +1,15 @@
 import argparse
 import pandas as pd
-import pickle
 from data_processing import Data, compute_rps_deltas
+from dataset import read_data_frame, data_id as get_data_id
 
 def main(args):
     benchmark = args.b
     data_file = args.f
     xlabel = args.x
     ylabel = args.y
-    data_id = data_file[-17:-7]
-    # Load pickle file
-    with open(data_file, 'rb') as handle:
-        data = pickle.load(handle)
-        df = pd.DataFrame(data)
-    df.columns = ['timestamp',
-                  'benchmark', 
-                  'cpu_util',
-                  'mem_util',
-                  'replicas',
-                  'cpu_requests', 'cpu_limits', 'mem_requests', 'mem_limits',
-                  'duration', 
-                  'issued', 
-                  'completed', 
-                  'rps_real', 
-                  'rps_target', 
-                  '50th', '90th', '99th', '99.9th', 
-                  'avg_cpu_idle', 'avg_cpu_user', 'avg_cpu_system',
-                              'avg_mem_free',
-                              'avg_net_transmit (bps)', 'avg_net_receive (bps)']
+    data_id = get_data_id(data_file)
+    df = read_data_frame(data_file)
     df['rps_delta'] = compute_rps_deltas(df['rps_real'], df['rps_target'])
     folder = './data-plots'
     data_object = Data(df, data_id)
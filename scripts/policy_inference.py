@@ -0,0 +1,92 @@
+import copy
+import math
+import torch
+
+# Epsilon-greedy schedule defaults, as in dqn_main.py.
+EPS_START = 0.9
+EPS_END = 0.05
+EPS_DECAY = 150
+
+# Optimized copy of @param net for inference.
+# mode : None to run @param net itself, 'script' for a frozen TorchScript copy, 'compile' for torch.compile
+def optimize_for_inference(net, mode='script'):
+    if mode is None:
+        return net
+    if mode == 'script':
+        if not isinstance(net, torch.jit.ScriptModule):
+            net = torch.jit.script(copy.deepcopy(net).eval())
+        else:
+            net = copy.deepcopy(net).eval()
+        return torch.jit.optimize_for_inference(torch.jit.freeze(net))
+    if mode == 'compile':
+        return torch.compile(copy.deepcopy(net).eval(), dynamic=True)
+    assert False, f"[ERROR] Unknown inference mode `{mode}`."
+
+class PolicyService:
+    """Batched action selection for a Q-network, shared by any number of environments.
+
+    States from many environments (or benchmarks) go through one forward pass in
+    `torch.inference_mode`. The network can be a frozen TorchScript copy (fixed weights,
+    e.g. a trained policy_net.pth served as an autoscaler) or the live training network
+    (`mode=None`, which sees every optimizer step). The exploration schedule has its
+    own step counter instead of a global.
+
+    - Attributes:
+        - `net` (nn.Module) : network the actions are computed with.
+        - `mode` (String) : None, 'script' or 'compile', see `optimize_for_inference`.
+        - `steps` (Int) : decisions taken so far, which drives epsilon.
+    - Methods:
+        - `load` (String) : classmethod, serve a model saved by dqn_main.py.
+        - `q_values` (Tensor) : Q-values (K, n_actions) of states (K, n_observations).
+        - `greedy` (Tensor) : best action of each state, (K,).
+        - `select` (Tensor) : epsilon-greedy action of each state, (K,); advances epsilon by K.
+        - `select_explored` (Tensor) : `select`, plus whether each action was random, (K,).
+        - `update_weights` (Dict) : load new weights (and re-optimize a frozen copy).
+    """
+    def __init__(self, net, n_actions=None, mode='script', device='cpu',
+                 eps_start=EPS_START, eps_end=EPS_END, eps_decay=EPS_DECAY):
+        self.device = torch.device(device)
+        self.source_net = net.to(self.device)
+        self.mode = mode
+        self.net = optimize_for_inference(self.source_net, mode)
+        self.n_actions = n_actions
+        self.eps_start = eps_start
+        self.eps_end = eps_end
+        self.eps_decay = eps_decay
+        self.steps = 0
+
+    @classmethod
+    def load(cls, filename, mode='script', device='cpu', **kwargs):
+        return cls(torch.jit.load(filename, map_location=device), mode=mode, device=device, **kwargs)
+
+    def tensor(self, states):
+        states = torch.as_tensor(states, dtype=torch.float32, device=self.device)
+        return states.view(1, -1) if states.dim() == 1 else states
+
+    def q_values(self, states):
+        with torch.inference_mode():
+            return self.net(self.tensor(states))
+
+    def greedy(self, states):
+        return self.q_values(states).argmax(1)
+
+    # Current exploration rate, decaying exponentially with the number of decisions.
+    def epsilon(self):
+        return self.eps_end + (self.eps_start - self.eps_end) * math.exp(-1. * self.steps / self.eps_decay)
+
+    def select(self, states):
+        return self.select_explored(states)[0]
+
+    def select_explored(self, states):
+        eps_threshold = self.epsilon()
+        q_values = self.q_values(states)
+        self.steps += len(q_values)
+        greedy = q_values.argmax(1)
+        n_actions = self.n_actions if self.n_actions is not None else q_values.shape[1]
+        explore = torch.rand(greedy.shape, device=self.device) < eps_threshold
+        return torch.where(explore, torch.randint(n_actions, greedy.shape, device=self.device), greedy), explore
+
+    def update_weights(self, state_dict):
+        self.source_net.load_state_dict(state_dict)
+        if self.net is not self.source_net:
+            self.net = optimize_for_inference(self.source_net, self.mode)
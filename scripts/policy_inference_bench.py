@@ -0,0 +1,66 @@
+import argparse
+import time
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from policy_inference import PolicyService
+
+# Same as dqn_main.DQN.
+class DQN(nn.Module):
+    def __init__(self, n_observations, n_actions):
+        super(DQN, self).__init__()
+        self.layer1 = nn.Linear(n_observations, 128)
+        self.layer2 = nn.Linear(128, 128)
+        self.layer3 = nn.Linear(128, n_actions)
+
+    def forward(self, x):
+        x = F.relu(self.layer1(x))
+        x = F.relu(self.layer2(x))
+        return self.layer3(x)
+
+# Greedy action of one 1xN state as dqn_main.select_action computes it.
+def legacy_select(policy_net, state):
+    with torch.no_grad():
+        return policy_net(state).max(1)[1].view(1, 1)
+
+def time_it(fn, reps):
+    for _ in range(10):
+        fn()
+    start = time.perf_counter()
+    for _ in range(reps):
+        fn()
+    return (time.perf_counter() - start) / reps * 1e6
+
+def main(args):
+    torch.set_num_threads(args.threads)
+    net = DQN(args.n_observations, args.n_actions)
+    if args.model:
+        net = torch.jit.load(args.model)
+    modes = [None if m == 'eager' else m for m in args.modes.split(',')]
+    services = {m: PolicyService(net, mode=m) for m in modes}
+    print(f'{"batch":>6} {"legacy loop (us)":>17} ' + ' '.join(f'{str(m or "eager") + " (us)":>15}' for m in modes))
+    for batch in [int(b) for b in args.batch.split(',')]:
+        states = torch.randn(batch, args.n_observations)
+        rows = [states[i:i+1] for i in range(batch)]
+        # One forward pass per environment, as with K copies of select_action.
+        legacy_us = time_it(lambda: [legacy_select(net, row) for row in rows], args.reps)
+        times = [time_it(lambda: services[m].greedy(states), args.reps) for m in modes]
+        print(f'{batch:>6} {legacy_us:>17.1f} ' + ' '.join(f'{t:>15.1f}' for t in times))
+
+#
+# Example cmd:
+#   python3 policy_inference_bench.py --batch 1,8,64,512 --modes eager,script
+#   python3 policy_inference_bench.py --model saved_models/<run>/policy_net.pth
+#
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batch', default='1,8,64,512', help='Comma-separated numbers of states per decision')
+    parser.add_argument('--modes', default='eager,script', help='Comma-separated inference modes: eager, script, compile')
+    parser.add_argument('--model', default=None, help='Saved policy_net.pth to serve instead of a random DQN')
+    parser.add_argument('--n-observations', type=int, default=6, help='State size, 6 as in RLEnv')
+    parser.add_argument('--n-actions', type=int, default=27, help='Number of actions, 27 for 3 benchmarks')
+    parser.add_argument('--reps', type=int, default=2000, help='Decisions per measurement')
+    parser.add_argument('--threads', type=int, default=1, help='torch intra-op threads')
+    args = parser.parse_args()
+    main(args)
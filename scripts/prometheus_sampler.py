@@ -0,0 +1,187 @@
+import os
+import re
+import time
+import numpy as np
+import requests
+
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+
+# Column layout of the sampled metrics array, one row per worker node.
+METRIC_COLUMNS = ['cpu_idle', 'cpu_user', 'cpu_system', 'net_tx', 'net_rx', 'mem_free']
+
+# Build one combined PromQL query for all node metrics over the past @param interval_sec.
+# Every series is tagged with a `metric` label (one of METRIC_COLUMNS) and grouped by
+# `instance`, so the same query works against a per-node Prometheus and against a single
+# Prometheus that scrapes every node.
+def build_node_query(interval_sec):
+    # Average CPU idle/user/system cycles for all CPUs, [0-1]
+    cpu = (f'label_replace(avg by (instance, mode) (rate(node_cpu_seconds_total{{mode=~"idle|user|system"}}[{interval_sec}s])), '
+           f'"metric", "cpu_$1", "mode", "(.*)")')
+    # Sum of the total network throughput for all devices, Bytes/s
+    net_tx = (f'label_replace(sum by (instance) (rate(node_network_transmit_bytes_total[{interval_sec}s])), '
+              f'"metric", "net_tx", "", "")')
+    net_rx = (f'label_replace(sum by (instance) (rate(node_network_receive_bytes_total[{interval_sec}s])), '
+              f'"metric", "net_rx", "", "")')
+    # Average free memory over the interval as a fraction of total memory, [0-1]
+    mem = (f'label_replace(avg by (instance) (avg_over_time(node_memory_MemAvailable_bytes[{interval_sec}s]) '
+           f'/ node_memory_MemTotal_bytes), "metric", "mem_free", "", "")')
+    return ' or '.join([cpu, net_tx, net_rx, mem])
+
+# Parse the result of build_node_query into {instance: row}, where row follows METRIC_COLUMNS.
+def parse_node_result(result):
+    rows = {}
+    for series in result:
+        instance = series['metric'].get('instance', '')
+        metric = series['metric'].get('metric')
+        if metric not in METRIC_COLUMNS:
+            continue
+        if instance not in rows:
+            rows[instance] = np.full(len(METRIC_COLUMNS), np.nan)
+        rows[instance][METRIC_COLUMNS.index(metric)] = (float)(series['value'][1])
+    return rows
+
+# Sort key of a Prometheus `instance` label that compares the numbers in it as numbers,
+# so 10.0.0.2:9100 comes before 10.0.0.10:9100.
+def instance_sort_key(instance):
+    return [(int)(part) if part.isdigit() else part for part in re.split(r'([0-9]+)', instance)]
+
+# Addresses of the nodes of a CoreV1Api().list_node() result, as {node name: [address]}: the
+# InternalIP and Hostname entries of `status.addresses`, which Prometheus targets are set to.
+def node_addresses(nodes):
+    ret = {}
+    for node in nodes.items:
+        ret[node.metadata.name] = [address.address for address in (node.status.addresses or [])
+                                   if address.type in ('InternalIP', 'Hostname')]
+    return ret
+
+# Worker ids of the instances reported by one shared endpoint, as {instance: worker_id}.
+# With @param hostnames ({worker_id: hostname}, as Env.k_worker_hostnames_), every instance
+# gets the id of the worker it runs on and instances of other nodes (e.g. the master) are
+# dropped. An instance matches its worker by hostname, or by one of the node's
+# @param addresses ({hostname: [address]}, see node_addresses), since targets are often
+# IPs (setup_testbed.py scrapes `$(hostname -i):9100`). Without hostnames, the instances
+# get ids 1..N in numeric order.
+def assign_worker_ids(instances, hostnames=None, addresses=None):
+    if hostnames is None:
+        return {instance: i + 1 for i, instance in enumerate(sorted(instances, key=instance_sort_key))}
+    worker_ids = {}
+    for w_id, hostname in hostnames.items():
+        worker_ids[hostname] = w_id
+        for address in (addresses or {}).get(hostname, []):
+            worker_ids[address] = w_id
+    ret = {}
+    for instance in instances:
+        host = instance.rsplit(':', 1)[0].strip('[]')
+        # The instance may carry the node's FQDN where the hostname is the short name.
+        w_id = worker_ids.get(host, worker_ids.get(host.split('.')[0]))
+        if w_id is not None:
+            ret[instance] = w_id
+    missing = sorted(set(hostnames) - set(ret.values()))
+    if missing:
+        assert False, f"[ERROR] Prometheus reported no node metrics for workers {[hostnames[w_id] for w_id in missing]}."
+    return ret
+
+# Convert a nodes x metrics array back to the dict shape returned by Env.sample_env:
+# {worker_id: {'cpu': [idle, user, system], 'net': [tx, rx], 'mem': free}}
+def array_to_env_state(worker_ids, samples):
+    ret = {}
+    for w_id, row in zip(worker_ids, samples):
+        ret[w_id] = {'cpu': [row[0], row[1], row[2]],
+                     'net': [row[3], row[4]],
+                     'mem': row[5]}
+    return ret
+
+
+class PrometheusSampler:
+    """Batched, concurrent sampler of node metrics over one or more Prometheus endpoints.
+
+    Instead of one HTTP round-trip per metric per worker, every endpoint gets a single
+    combined query (see `build_node_query`). All endpoints are queried at the same time
+    over a shared keep-alive session, so a sample takes as long as the slowest node rather
+    than the sum of all nodes. The answers are parsed straight into a NumPy array shaped
+    nodes x metrics.
+
+    - Attributes:
+        - `urls` (Dict[Int, String]) : Prometheus base URLs keyed by worker id.
+        - `timeout` (Float) : timeout of a single request, in seconds.
+        - `retries` (Int) : number of retries per endpoint before giving up.
+        - `hostnames` (Dict[Int, String]) : worker hostnames keyed by worker id, to tell the
+            instances of a shared endpoint apart (see `assign_worker_ids`).
+        - `addresses` (Dict[String, List[String]]) : node addresses keyed by hostname, for
+            instances that are scraped by IP.
+    - Methods:
+        - `sample` (Int) : query all endpoints, return (worker_ids, nodes x metrics array).
+        - `sample_env` (Int) : same as `sample`, in the dict shape of `Env.sample_env`.
+    """
+    def __init__(self, urls, timeout=5, retries=2, backoff=0.2, hostnames=None, addresses=None):
+        self.urls = urls
+        self.hostnames = hostnames
+        self.addresses = addresses
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pid_ = None
+
+    # Session and thread pool are created lazily and re-created after a fork, since
+    # data collection forks a process per benchmark and neither survives the fork.
+    def setup_pool(self):
+        if self.pid_ == os.getpid():
+            return
+        self.session_ = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max(len(self.urls), 1), pool_maxsize=4)
+        self.session_.mount('http://', adapter)
+        self.session_.mount('https://', adapter)
+        self.executor_ = ThreadPoolExecutor(max_workers=max(len(self.urls), 1))
+        self.pid_ = os.getpid()
+
+    # Run @param query on the endpoint of worker @param p_id, with timeout and retries.
+    def query_endpoint(self, p_id, query):
+        url = self.urls[p_id].rstrip('/') + '/api/v1/query'
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.session_.get(url, params={'query': query}, timeout=self.timeout, verify=False)
+                response.raise_for_status()
+                return response.json()['data']['result']
+            except (requests.RequestException, ValueError, KeyError) as e:
+                if attempt == self.retries:
+                    raise Exception(f"[ERROR] Prometheus for worker {p_id} failed after {attempt + 1} attempts: {e}")
+                time.sleep(self.backoff * 2**attempt)
+
+    # Query all endpoints over the past @param interval_sec.
+    # With per-node endpoints every endpoint keeps its worker id; the instances of a single
+    # shared endpoint get their worker ids from assign_worker_ids.
+    def sample(self, interval_sec):
+        self.setup_pool()
+        query = build_node_query(interval_sec)
+        shared = len(self.urls) == 1
+        p_ids = sorted(self.urls)
+        results = self.executor_.map(lambda p_id: self.query_endpoint(p_id, query), p_ids)
+
+        worker_ids = []
+        rows = []
+        for p_id, result in zip(p_ids, results):
+            per_instance = parse_node_result(result)
+            if len(per_instance) == 0:
+                assert False, f"[ERROR] Prometheus for worker {p_id} returned no node metrics."
+            if not shared and len(per_instance) > 1:
+                assert False, f"[ERROR] Prometheus for worker {p_id} reported {len(per_instance)} nodes, expected 1."
+            if not shared:
+                worker_ids.append(p_id)
+                rows += list(per_instance.values())
+                continue
+            instance_ids = assign_worker_ids(per_instance, self.hostnames, self.addresses)
+            for instance in sorted(instance_ids, key=instance_ids.get):
+                worker_ids.append(instance_ids[instance])
+                rows.append(per_instance[instance])
+
+        samples = np.vstack(rows)
+        if np.isnan(samples).any():
+            assert False, "[ERROR] Some node metrics are missing from the Prometheus response."
+        # Network throughput in bps
+        samples[:, 3:5] *= 8
+        return worker_ids, samples
+
+    def sample_env(self, interval_sec):
+        worker_ids, samples = self.sample(interval_sec)
+        return array_to_env_state(worker_ids, samples)
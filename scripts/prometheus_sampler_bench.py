@@ -0,0 +1,130 @@
+import argparse
+import json
+import threading
+import time
+import numpy as np
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from prometheus_api_client import PrometheusConnect
+from prometheus_sampler import PrometheusSampler
+
+# Fake Prometheus HTTP server.
+# Requests for node i take `delay_s * i / num_nodes` to answer, so the slowest node dominates a
+# concurrent sample while a sequential sample pays for every node.
+# `/api/v1/query` answers for every simulated node (a Prometheus scraping the whole cluster),
+# `/node<i>/api/v1/query` answers for node i only (a Prometheus per worker, as in setup_testbed.py).
+class FakePrometheusHandler(BaseHTTPRequestHandler):
+    num_nodes = 3
+    delay_s = 0.002
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query).get('query', [''])[0]
+        prefix = url.path[:-len('/api/v1/query')].strip('/')
+        if prefix.startswith('node'):
+            nodes = [int(prefix[4:])]
+        else:
+            nodes = list(range(1, self.num_nodes + 1))
+        # Simulate query evaluation time.
+        time.sleep(self.delay_s * (nodes[0] / self.num_nodes if len(nodes) == 1 else 1))
+
+        now = time.time()
+        result = []
+        if 'label_replace' in query:
+            for n in nodes:
+                instance = f'10.0.0.{n}:9100'
+                values = {'cpu_idle': 0.7, 'cpu_user': 0.2, 'cpu_system': 0.1,
+                          'net_tx': 1e5 * n, 'net_rx': 2e5 * n, 'mem_free': 0.5}
+                for metric, value in values.items():
+                    result.append({'metric': {'instance': instance, 'metric': metric}, 'value': [now, str(value)]})
+            body = {'status': 'success', 'data': {'resultType': 'vector', 'result': result}}
+        elif 'MemAvailable' in query:
+            values = [[now - i, str(8 * 2**30)] for i in range(10)]
+            body = {'status': 'success', 'data': {'resultType': 'matrix', 'result': [{'metric': {}, 'values': values}]}}
+        elif 'MemTotal' in query:
+            body = {'status': 'success', 'data': {'resultType': 'vector', 'result': [{'metric': {}, 'value': [now, str(16 * 2**30)]}]}}
+        else:
+            body = {'status': 'success', 'data': {'resultType': 'vector', 'result': [{'metric': {}, 'value': [now, '0.5']}]}}
+
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+class FakePrometheusServer(ThreadingHTTPServer):
+    # All nodes are queried at once, keep the default backlog of 5 from dropping connections.
+    request_queue_size = 256
+    daemon_threads = True
+
+# Per-worker sampling loop as it was in k8s_env_shim.Env.sample_env: 6 queries per worker + MemTotal.
+def legacy_sample_env(k_worker_metrics, interval_sec):
+    ret = {}
+    total_mem = None
+    for p_id, p_metric in k_worker_metrics.items():
+        tpl = {}
+        cpu_idle = (float)(p_metric.custom_query(
+            query=f'avg(rate(node_cpu_seconds_total{{mode="idle"}}[{interval_sec}s]))')[0]['value'][1])
+        cpu_user = (float)(p_metric.custom_query(
+            query=f'avg(rate(node_cpu_seconds_total{{mode="user"}}[{interval_sec}s]))')[0]['value'][1])
+        cpu_system = (float)(p_metric.custom_query(
+            query=f'avg(rate(node_cpu_seconds_total{{mode="system"}}[{interval_sec}s]))')[0]['value'][1])
+        tpl['cpu'] = [cpu_idle, cpu_user, cpu_system]
+        network_rx_bps = (float)(p_metric.custom_query(
+            query=f'sum(rate(node_network_receive_bytes_total[{interval_sec}s]))')[0]['value'][1]) * 8
+        network_tx_bps = (float)(p_metric.custom_query(
+            query=f'sum(rate(node_network_transmit_bytes_total[{interval_sec}s]))')[0]['value'][1]) * 8
+        tpl['net'] = [network_tx_bps, network_rx_bps]
+        mem_free = p_metric.custom_query(query=f'node_memory_MemAvailable_bytes[{interval_sec}s]')[0]['values']
+        mem_free_avg = np.average(np.array([(int)(val) for (_, val) in mem_free]))
+        if total_mem == None:
+            total_mem = (int)(p_metric.custom_query(query=f'node_memory_MemTotal_bytes')[0]['value'][1])
+        tpl['mem'] = mem_free_avg / (float)(total_mem)
+        ret[p_id] = tpl
+    return ret
+
+def time_it(fn, reps):
+    times = []
+    for _ in range(reps):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return np.median(times) * 1000
+
+def main(args):
+    server = FakePrometheusServer(('127.0.0.1', 0), FakePrometheusHandler)
+    FakePrometheusHandler.delay_s = args.delay / 1000
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_address[1]}'
+
+    print(f'{"nodes":>6} {"legacy (ms)":>12} {"per-node (ms)":>14} {"shared (ms)":>12}')
+    for num_nodes in [int(n) for n in args.nodes.split(',')]:
+        FakePrometheusHandler.num_nodes = num_nodes
+        per_node = {i: PrometheusConnect(url=f'{base_url}/node{i}', disable_ssl=True) for i in range(1, num_nodes + 1)}
+        per_node_sampler = PrometheusSampler({i: f'{base_url}/node{i}' for i in range(1, num_nodes + 1)})
+        shared_sampler = PrometheusSampler({1: base_url})
+        assert len(shared_sampler.sample_env(30)) == num_nodes
+
+        legacy_ms = time_it(lambda: legacy_sample_env(per_node, 30), args.reps)
+        per_node_ms = time_it(lambda: per_node_sampler.sample(30), args.reps)
+        shared_ms = time_it(lambda: shared_sampler.sample(30), args.reps)
+        print(f'{num_nodes:>6} {legacy_ms:>12.2f} {per_node_ms:>14.2f} {shared_ms:>12.2f}')
+
+    server.shutdown()
+
+#
+# Example cmd:
+#   python3 prometheus_sampler_bench.py --nodes 3,8,16,32,64 --delay 2
+#
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--nodes', default='3,8,16,32,64', help='Comma-separated numbers of simulated nodes')
+    parser.add_argument('--delay', type=float, default=2, help='Simulated query evaluation time per request (ms)')
+    parser.add_argument('--reps', type=int, default=5, help='Repetitions per measurement')
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,83 @@
+import math
+import time
+
+from kubernetes import watch
+from kubernetes.client.rest import ApiException
+
+# (name, generation, observed generation, ready replicas, desired replicas) of a Deployment as
+# returned by AppsV1Api, or as a JSON dict of the REST API (see control_plane.py).
+def deployment_fields(dep):
+    if isinstance(dep, dict):
+        status = dep.get('status') or {}
+        return (dep['metadata'].get('name'), dep['metadata'].get('generation'), status.get('observedGeneration'),
+                status.get('readyReplicas'), dep.get('spec', {}).get('replicas'))
+    return (dep.metadata.name, dep.metadata.generation, dep.status.observed_generation,
+            dep.status.ready_replicas, dep.spec.replicas)
+
+# Check if a Deployment (as returned by AppsV1Api, or as a dict) has all of its replicas ready.
+def deployment_is_ready(dep):
+    _, generation, observed_generation, ready_replicas, replicas = deployment_fields(dep)
+    # The controller has not seen the latest spec yet, so the status is stale.
+    if observed_generation is not None and generation is not None and observed_generation < generation:
+        return False
+    return (ready_replicas or 0) == (replicas or 0)
+
+# Drop @param dep from @param pending if it is ready, after a list or a watch event of @param event_type.
+# The list-then-watch wait of ReadinessWaiter and ControlPlaneClient.wait_ready.
+def update_pending(pending, dep, event_type='ADDED'):
+    name = deployment_fields(dep)[0]
+    if event_type != 'DELETED' and name in pending and deployment_is_ready(dep):
+        pending.discard(name)
+
+class ReadinessWaiter:
+    """Event-driven wait for Deployments to become ready.
+
+    Lists the Deployments of a namespace once, then follows a single watch on that
+    namespace until every requested Deployment reports `readyReplicas == spec.replicas`
+    or the shared deadline passes. No polling and no `kubectl` subprocesses.
+
+    - Attributes:
+        - `api` (AppsV1Api) : k8s API.
+        - `namespace` (String) : namespace of the Deployments.
+        - `watch_factory` (Callable) : returns an object with `stream` and `stop`, `kubernetes.watch.Watch` by default.
+    - Methods:
+        - `wait` (List[String], Float) : block until all named Deployments are ready.
+            - Raises TimeoutError if the deadline passes first.
+    """
+    def __init__(self, api, namespace='default', watch_factory=watch.Watch):
+        self.api = api
+        self.namespace = namespace
+        self.watch_factory = watch_factory
+
+    # List all Deployments, drop the ready ones from @param pending and return the resource version to watch from.
+    def list_pending(self, pending):
+        resp = self.api.list_namespaced_deployment(self.namespace)
+        for dep in resp.items:
+            update_pending(pending, dep)
+        return resp.metadata.resource_version
+
+    def wait(self, names, timeout):
+        deadline = time.time() + timeout
+        pending = set(names)
+        resource_version = self.list_pending(pending)
+        while pending:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise TimeoutError(f"[ERROR] Deployments {sorted(pending)} not ready within {timeout} seconds.")
+            w = self.watch_factory()
+            try:
+                for event in w.stream(self.api.list_namespaced_deployment, self.namespace,
+                                      resource_version=resource_version,
+                                      timeout_seconds=max(1, math.ceil(remaining))):
+                    dep = event['object']
+                    resource_version = dep.metadata.resource_version
+                    update_pending(pending, dep, event['type'])
+                    if not pending or time.time() >= deadline:
+                        break
+            except ApiException as e:
+                # Resource version too old, start over from a fresh list.
+                if e.status != 410:
+                    raise
+                resource_version = self.list_pending(pending)
+            finally:
+                w.stop()
@@ -0,0 +1,258 @@
+import struct
+import zipfile
+import numpy as np
+import torch
+
+# Arrays of an .npz file, memory-mapped (copy-on-write) straight from the file where the
+# member is stored uncompressed, as np.savez writes them; np.load does not memory-map .npz.
+def load_npz_arrays(filename):
+    arrays = {}
+    with zipfile.ZipFile(filename) as archive, open(filename, 'rb') as f:
+        for info in archive.infolist():
+            name = info.filename[:-len('.npy')]
+            # Local file header: 30 bytes, then the file name and the extra field.
+            f.seek(info.header_offset + 26)
+            name_length, extra_length = struct.unpack('<HH', f.read(4))
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(f) if info.compress_type == zipfile.ZIP_STORED else None
+            if version not in [(1, 0), (2, 0)]:
+                with archive.open(info) as member:
+                    arrays[name] = np.lib.format.read_array(member)
+                continue
+            read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+            shape, fortran_order, dtype = read_header(f)
+            if dtype.hasobject:
+                assert False, f"[ERROR] Cannot load Python objects from {filename}."
+            arrays[name] = np.memmap(f, dtype=dtype, mode='c', offset=f.tell(), shape=shape,
+                                     order='F' if fortran_order else 'C')
+    return arrays
+
+class ReplayBuffer:
+    """Preallocated ring buffer of transitions, one contiguous tensor per field.
+
+    Transitions are written in place at `position`, overwriting the oldest ones once
+    `capacity` is reached, and a batch is sampled with one random index tensor and one
+    gather per field: there are no per-transition Python objects.
+
+    - Attributes:
+        - `capacity` (Int) : maximum number of transitions.
+        - `states`, `next_states` (Tensor) : (capacity, n_observations) float32.
+        - `actions` (Tensor) : (capacity,) int64.
+        - `rewards` (Tensor) : (capacity,) float32.
+        - `dones` (Tensor) : (capacity,) bool, True where the next state is terminal.
+    - Methods:
+        - `push` : add one transition, with the arguments of the old ReplayMemory.push (next_state None if terminal).
+        - `push_batch` : add K transitions at once.
+        - `sample` (Int) : returns `states, actions (B, 1), rewards, next_states, dones`.
+        - `sample_weighted` (Int) : `sample` plus importance-sampling weights and buffer indices.
+        - `update_priorities` : no-op, see PrioritizedReplayBuffer.
+        - `save` / `load` : write to / read from an uncompressed .npz file.
+    """
+    def __init__(self, capacity, n_observations, device='cpu'):
+        self.capacity = capacity
+        self.n_observations = n_observations
+        self.device = device
+        self.states = torch.zeros((capacity, n_observations), dtype=torch.float32, device=device)
+        self.next_states = torch.zeros((capacity, n_observations), dtype=torch.float32, device=device)
+        self.actions = torch.zeros(capacity, dtype=torch.int64, device=device)
+        self.rewards = torch.zeros(capacity, dtype=torch.float32, device=device)
+        self.dones = torch.zeros(capacity, dtype=torch.bool, device=device)
+        self.position = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def push(self, state, action, next_state, reward):
+        i = self.position
+        self.states[i] = torch.as_tensor(state).view(-1)
+        self.actions[i] = torch.as_tensor(action).view(-1)[0]
+        self.rewards[i] = torch.as_tensor(reward).view(-1)[0]
+        if next_state is None:
+            self.next_states[i] = 0
+            self.dones[i] = True
+        else:
+            self.next_states[i] = torch.as_tensor(next_state).view(-1)
+            self.dones[i] = False
+        self.position = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    # Add K transitions; rows of @param next_states where @param dones is True are ignored.
+    # Buffer slots of a batch of @param count transitions, the ones sequential pushes would end in.
+    # Only the last `capacity` transitions of a larger batch are kept.
+    # Returns: (rows of the batch to keep, their slots)
+    def batch_slots(self, count):
+        keep = min(count, self.capacity)
+        start = self.position + count - keep
+        return slice(count - keep, count), (start + torch.arange(keep, device=self.device)) % self.capacity
+
+    def push_batch(self, states, actions, next_states, rewards, dones):
+        count = len(states)
+        rows, index = self.batch_slots(count)
+        dones = torch.as_tensor(dones, device=self.device).view(-1).bool()[rows]
+        self.states[index] = torch.as_tensor(states, device=self.device).float()[rows]
+        self.actions[index] = torch.as_tensor(actions, device=self.device).view(-1).long()[rows]
+        self.rewards[index] = torch.as_tensor(rewards, device=self.device).view(-1).float()[rows]
+        next_states = torch.as_tensor(next_states, device=self.device).float()[rows]
+        self.next_states[index] = torch.where(dones.unsqueeze(1), 0, next_states)
+        self.dones[index] = dones
+        self.position = (self.position + count) % self.capacity
+        self.size = min(self.size + count, self.capacity)
+
+    # Indices of the transitions to use for @param batch_size samples.
+    def sample_indices(self, batch_size):
+        return torch.randint(self.size, (batch_size,), device=self.device)
+
+    def gather(self, index):
+        return (self.states[index], self.actions[index].unsqueeze(1), self.rewards[index],
+                self.next_states[index], self.dones[index])
+
+    def sample(self, batch_size):
+        return self.gather(self.sample_indices(batch_size))
+
+    # Sample a batch with its importance-sampling weights (all ones here) and buffer indices,
+    # the interface shared with PrioritizedReplayBuffer.
+    # Returns: states, actions, rewards, next_states, dones, weights, indices
+    def sample_weighted(self, batch_size):
+        index = self.sample_indices(batch_size)
+        weights = torch.ones(batch_size, dtype=torch.float32, device=self.device)
+        return self.gather(index) + (weights, index)
+
+    # Uniform sampling ignores priorities.
+    def update_priorities(self, indices, td_errors):
+        pass
+
+    # Arrays written by `save` on top of the transitions.
+    def extra_arrays(self):
+        return {}
+
+    def restore_extra_arrays(self, data):
+        pass
+
+    # The arrays are written as they are, no pickling of Python objects.
+    def save(self, filename):
+        fields = {name: getattr(self, name)[:self.size].cpu().numpy()
+                  for name in ('states', 'actions', 'rewards', 'next_states', 'dones')}
+        np.savez(filename, position=self.position, capacity=self.capacity, **fields, **self.extra_arrays())
+
+    # The arrays are memory-mapped and copied once, straight into the preallocated tensors.
+    @classmethod
+    def load(cls, filename, device='cpu', **kwargs):
+        data = load_npz_arrays(filename)
+        buffer = cls((int)(data['capacity']), data['states'].shape[1], device, **kwargs)
+        size = len(data['states'])
+        for name in ('states', 'actions', 'rewards', 'next_states', 'dones'):
+            getattr(buffer, name)[:size].copy_(torch.from_numpy(data[name]))
+        buffer.position = (int)(data['position'])
+        buffer.size = size
+        buffer.restore_extra_arrays(data)
+        return buffer
+
+class SumTree:
+    """Binary tree over `capacity` non-negative values where each node holds the sum of its children.
+
+    Stored as one flat array (root at 1, leaves at `leaf_offset + i`). Updates and prefix-sum
+    searches walk one level at a time for a whole batch, so both cost O(log n) NumPy
+    operations per batch instead of per element.
+
+    - Methods:
+        - `update` (np.ndarray, np.ndarray) : set the values at some indices.
+        - `find` (np.ndarray) : index of the leaf where each prefix sum falls.
+        - `total` : sum of all values.
+    """
+    def __init__(self, capacity):
+        self.leaf_offset = 1
+        while self.leaf_offset < capacity:
+            self.leaf_offset *= 2
+        self.tree = np.zeros(2 * self.leaf_offset, dtype=np.float64)
+
+    def total(self):
+        return self.tree[1]
+
+    def values(self, index):
+        return self.tree[self.leaf_offset + index]
+
+    def update(self, index, values):
+        if len(index) == 0:
+            return
+        node = self.leaf_offset + np.asarray(index)
+        self.tree[node] = values
+        node = np.unique(node // 2)
+        while node[0] >= 1:
+            self.tree[node] = self.tree[2 * node] + self.tree[2 * node + 1]
+            node = np.unique(node // 2)
+
+    def find(self, prefix_sums):
+        prefix_sums = np.array(prefix_sums, dtype=np.float64)
+        node = np.ones(len(prefix_sums), dtype=np.int64)
+        while node[0] < self.leaf_offset:
+            left = self.tree[2 * node]
+            go_right = prefix_sums >= left
+            prefix_sums -= np.where(go_right, left, 0)
+            node = 2 * node + go_right
+        return node - self.leaf_offset
+
+class PrioritizedReplayBuffer(ReplayBuffer):
+    """ReplayBuffer sampling transitions in proportion to priority ** alpha (proportional PER).
+
+    New transitions get the largest priority seen so far, so each is replayed at least
+    once soon. `update_priorities` sets the priorities of a sampled batch from its TD
+    errors. The importance-sampling weights (N * P(i)) ** -beta are normalized by the
+    largest weight of the batch, and beta is annealed linearly to 1 over `beta_steps` samples.
+
+    - Attributes:
+        - `alpha` (Float) : how much prioritization is used, 0 is uniform.
+        - `beta` (Float) : current importance-sampling exponent.
+        - `eps` (Float) : added to the TD errors so no priority is 0.
+    """
+    def __init__(self, capacity, n_observations, device='cpu', alpha=0.6, beta=0.4, beta_steps=100000, eps=1e-5):
+        super().__init__(capacity, n_observations, device)
+        self.alpha = alpha
+        self.beta = beta
+        self.beta_increment = (1.0 - beta) / beta_steps if beta_steps else 0
+        self.eps = eps
+        self.max_priority = 1.0
+        self.tree_ = SumTree(capacity)
+
+    def push(self, state, action, next_state, reward):
+        index = self.position
+        super().push(state, action, next_state, reward)
+        self.tree_.update(np.array([index]), self.max_priority ** self.alpha)
+
+    def push_batch(self, states, actions, next_states, rewards, dones):
+        _, index = self.batch_slots(len(states))
+        index = index.cpu().numpy()
+        super().push_batch(states, actions, next_states, rewards, dones)
+        self.tree_.update(index, self.max_priority ** self.alpha)
+
+    # One prefix sum per equal segment of the total priority (stratified sampling).
+    def sample_weighted(self, batch_size):
+        total = self.tree_.total()
+        prefix_sums = (np.arange(batch_size) + np.random.random(batch_size)) * total / batch_size
+        index = np.minimum(self.tree_.find(prefix_sums), self.size - 1)
+        probabilities = self.tree_.values(index) / total
+        weights = (self.size * probabilities) ** -self.beta
+        weights /= weights.max()
+        self.beta = min(1.0, self.beta + self.beta_increment * batch_size)
+        index = torch.from_numpy(index).to(self.device)
+        weights = torch.as_tensor(weights, dtype=torch.float32, device=self.device)
+        return self.gather(index) + (weights, index)
+
+    def update_priorities(self, indices, td_errors):
+        priorities = np.abs(torch.as_tensor(td_errors).detach().view(-1).cpu().numpy()) + self.eps
+        self.max_priority = max(self.max_priority, priorities.max())
+        self.tree_.update(torch.as_tensor(indices).cpu().numpy(), priorities ** self.alpha)
+
+    def extra_arrays(self):
+        return {'priorities': self.tree_.values(np.arange(self.size)),
+                'max_priority': self.max_priority,
+                'beta': self.beta}
+
+    # Buffers saved without priorities start with every transition at priority 1.
+    def restore_extra_arrays(self, data):
+        if 'priorities' in data:
+            self.tree_.update(np.arange(self.size), data['priorities'])
+            self.max_priority = (float)(data['max_priority'])
+            self.beta = (float)(data['beta'])
+        elif self.size > 0:
+            self.tree_.update(np.arange(self.size), self.max_priority ** self.alpha)
@@ -0,0 +1,91 @@
+import argparse
+import random
+import time
+import numpy as np
+import torch
+
+from collections import namedtuple, deque
+from replay_buffer import ReplayBuffer
+
+# Replay memory as it was in dqn_main.py: a deque of namedtuples of 1xN tensors.
+Transition = namedtuple('Transition', ('state', 'action', 'next_state', 'reward'))
+
+class LegacyReplayMemory(object):
+    def __init__(self, capacity):
+        self.memory = deque([], maxlen=capacity)
+
+    def push(self, *args):
+        self.memory.append(Transition(*args))
+
+    def sample(self, batch_size):
+        return random.sample(self.memory, batch_size)
+
+    def __len__(self):
+        return len(self.memory)
+
+# Sample and collate a batch as dqn_main.optimize_model did.
+def legacy_sample(memory, batch_size):
+    batch = Transition(*zip(*memory.sample(batch_size)))
+    non_final_mask = torch.tensor(tuple(map(lambda s: s is not None, batch.next_state)), dtype=torch.bool)
+    non_final_next_states = torch.cat([s for s in batch.next_state if s is not None])
+    return (torch.cat(batch.state), torch.cat(batch.action), torch.cat(batch.reward),
+            non_final_next_states, non_final_mask)
+
+def fill_legacy(capacity, n_observations):
+    memory = LegacyReplayMemory(capacity)
+    states = torch.randn(capacity, n_observations)
+    for i in range(capacity):
+        memory.push(states[i:i+1].clone(), torch.tensor([[i % 27]]), states[i:i+1].clone(), torch.tensor([1.0]))
+    return memory
+
+def fill_buffer(capacity, n_observations, chunk=4096):
+    buffer = ReplayBuffer(capacity, n_observations)
+    for start in range(0, capacity, chunk):
+        count = min(chunk, capacity - start)
+        states = torch.randn(count, n_observations)
+        buffer.push_batch(states, torch.randint(27, (count,)), states, torch.ones(count), torch.zeros(count, dtype=torch.bool))
+    return buffer
+
+def time_it(fn, reps):
+    start = time.perf_counter()
+    for _ in range(reps):
+        fn()
+    return (time.perf_counter() - start) / reps * 1e6
+
+def main(args):
+    torch.set_num_threads(1)
+    batch_sizes = [int(b) for b in args.batch.split(',')]
+    print(f'{"capacity":>9} {"batch":>6} {"legacy (us)":>12} {"ring (us)":>10} {"speedup":>8}')
+    for capacity in [int(c) for c in args.capacities.split(',')]:
+        start = time.perf_counter()
+        legacy = fill_legacy(capacity, args.n_observations) if capacity <= args.max_legacy else None
+        legacy_fill = time.perf_counter() - start
+        start = time.perf_counter()
+        buffer = fill_buffer(capacity, args.n_observations)
+        buffer_fill = time.perf_counter() - start
+        for batch_size in batch_sizes:
+            legacy_us = time_it(lambda: legacy_sample(legacy, batch_size), args.reps) if legacy is not None else np.nan
+            ring_us = time_it(lambda: buffer.sample(batch_size), args.reps)
+            print(f'{capacity:>9} {batch_size:>6} {legacy_us:>12.1f} {ring_us:>10.1f} {legacy_us / ring_us:>7.1f}x')
+        print(f'{"":>9} fill: legacy {legacy_fill:.2f} s, ring {buffer_fill:.2f} s')
+        start = time.perf_counter()
+        buffer.save(args.save_file)
+        save_s = time.perf_counter() - start
+        start = time.perf_counter()
+        ReplayBuffer.load(args.save_file)
+        print(f'{"":>9} ring save {save_s:.3f} s, load {time.perf_counter() - start:.3f} s')
+
+#
+# Example cmd:
+#   python3 replay_buffer_bench.py --capacities 10000,100000,1000000 --batch 8,128
+#
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--capacities', default='10000,100000,1000000', help='Comma-separated buffer capacities')
+    parser.add_argument('--batch', default='8,128', help='Comma-separated batch sizes')
+    parser.add_argument('--n-observations', type=int, default=6, help='State size, 6 as in RLEnv')
+    parser.add_argument('--reps', type=int, default=2000, help='Samples per measurement')
+    parser.add_argument('--save-file', default='/tmp/replay_buffer_bench.npz', help='Where to save the ring buffer')
+    parser.add_argument('--max-legacy', type=int, default=1000000, help='Largest capacity to fill the legacy memory for')
+    args = parser.parse_args()
+    main(args)
@@ -17,6 +17,7 @@ from k8s_env_shim import Env
 from pprint import pprint
 from setup_service import Service
 from setup_deployment import Deployment
+from latency_stats import compute_latency_stats
 
 # Some util functions.
 
@@ -244,20 +245,20 @@ class RLEnv:
 
         # Get latencies.
         lat_stat = self.env.get_latencies(stat_lat_filename)
-        lat_stat.sort()
 
         # Check if requests were completed.
         if len(lat_stat) == 0:
             assert False, '[ERROR] No latencies were collected. Perhaps try using a smaller RPS value if this problem persists.\n'
+        lat_50, lat_90, lat_99, lat_999 = compute_latency_stats(lat_stat).percentiles()
         
         # Print statistics.
         print("[INFO] Invocation statistics:\n")
         print(
             f'    stat: {stat_issued}, {stat_completed}, {stat_real_rps}, {stat_target_rps}, latency file: {stat_lat_filename}')
-        print('    50th: ', lat_stat[(int)(len(lat_stat) * 0.5)])
-        print('    90th: ', lat_stat[(int)(len(lat_stat) * 0.90)])
-        print('    99th: ', lat_stat[(int)(len(lat_stat) * 0.99)])
-        print('    99.9th: ', lat_stat[(int)(len(lat_stat) * 0.999)])
+        print('    50th: ', lat_50)
+        print('    90th: ', lat_90)
+        print('    99th: ', lat_99)
+        print('    99.9th: ', lat_999)
         print('    env_state:')
         pprint(env_state)
 
@@ -265,7 +266,7 @@ class RLEnv:
         rps_delta = np.abs(stat_real_rps - stat_target_rps)
         rps_ratio = rps_delta / stat_target_rps
         avg_cpu_usage = np.mean([env_state[i]['cpu'][1] for i in range(1, len(env_state)+1)])
-        tail_lat = lat_stat[(int)(len(lat_stat) * 0.99)]
+        tail_lat = lat_99
         QOS_LAT = 100000
         lat_ratio = tail_lat / QOS_LAT
 
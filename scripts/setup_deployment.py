@@ -5,6 +5,7 @@ from os import path
 from subprocess import run
 from pprint import pprint
 from kubernetes import client
+from readiness import ReadinessWaiter, deployment_is_ready
 
 class Deployment:
 
@@ -48,7 +49,7 @@ class Deployment:
 
         # Instantiate the deployment object
         self.deployment_object = client.V1Deployment(
-            self.dep['apiVersion'],
+            api_version=self.dep['apiVersion'],
             kind="Deployment",
             metadata=client.V1ObjectMeta(name=self.deployment_name, namespace=self.namespace),
             spec=spec,
@@ -56,9 +57,10 @@ class Deployment:
 
 
     def create_deployment(self):
-        # Create deployment
+        # Create deployment from the full manifest, with its resources and affinity, so it
+        # isn't rolled out a second time when the rest of its YAML is applied.
         resp = self.api.create_namespaced_deployment(
-            body=self.deployment_object, namespace="default"
+            body=self.dep, namespace=self.namespace
         )
 
         print(f"\n[UPDATE] deployment `{self.deployment_name}` created.\n")
@@ -66,12 +68,12 @@ class Deployment:
     
     # Check if all pods are ready.
     def is_ready(self):
-        # Command to check rollout status
-        status_cmd = f"kubectl rollout status deployment/{self.deployment_name}"
-        # Run the command.
-        ret = run(status_cmd, capture_output=True, shell=True, universal_newlines=True).stdout
-        # Check if the output message shows successful rollout
-        return ret == '''deployment "''' + self.deployment_name + '''" successfully rolled out\n'''
+        dep = self.api.read_namespaced_deployment_status(name=self.deployment_name, namespace=self.namespace)
+        return deployment_is_ready(dep)
+
+    # Block until all pods are ready, raises TimeoutError after @param timeout seconds.
+    def wait_until_ready(self, timeout=60):
+        ReadinessWaiter(self.api, self.namespace).wait([self.deployment_name], timeout)
 
     def get_deployment_object(self):
         return self.deployment_object
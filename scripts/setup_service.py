@@ -3,14 +3,30 @@ from subprocess import run
 from pprint import pprint
 import os
 
+from manifests import create_manifest, read_manifest, delete_manifest, wait_deleted
+
 class Service:
 
-    def __init__(self, name, service_file, port):
+    # manifests : Deployment, Service and HPA dicts (see manifests.render_function) applied through the
+    #             kubernetes client instead of `kubectl apply -f service_file`
+    def __init__(self, name, service_file, port, manifests=None):
         self.name = name
         self.service_file = service_file
         self.port = port
+        self.manifests = manifests
+        self.ip_ = None
 
     def create_service(self):
+        if self.manifests is not None:
+            # The Deployment is created from the same dict by Deployment.create_deployment.
+            for manifest in self.manifests:
+                if manifest['kind'] == 'Deployment':
+                    continue
+                obj = create_manifest(manifest)
+                if manifest['kind'] == 'Service':
+                    self.ip_ = obj.spec.cluster_ip
+            print(f"\n[UPDATE] service `{self.name}` created.")
+            return
 
         # Create Service, Deployment, and HPA
         ret = run(f'kubectl apply -f {self.service_file}', shell=True, capture_output=True)
@@ -20,6 +36,13 @@ class Service:
         print(f"\n[UPDATE] service with manifest `{self.service_file}` created.")
 
     def get_service_ip(self):
+        # Known once the Service was created or read through the client.
+        if self.ip_ is not None:
+            return self.ip_
+        if self.manifests is not None:
+            svc = next(manifest for manifest in self.manifests if manifest['kind'] == 'Service')
+            self.ip_ = read_manifest(svc).spec.cluster_ip
+            return self.ip_
         # Get Cluster IP
         ip_cmd = f"kubectl get service/{self.name} -o jsonpath='{{.spec.clusterIP}}'"
         ret = run(ip_cmd, capture_output=True, shell=True, universal_newlines=True)
@@ -31,8 +54,16 @@ class Service:
         return ip
 
 
-    def delete_service(self):
+    def delete_service(self, timeout=60):
         # Delete deployment
+        if self.manifests is not None:
+            for manifest in self.manifests:
+                delete_manifest(manifest)
+            # Return once the objects are gone, as `kubectl delete -f` does.
+            wait_deleted(self.manifests, timeout)
+            self.ip_ = None
+            print(f"\n[DELETED] service `{self.name}` deleted.")
+            return
 
         # Delete Service
         ret = run(f'kubectl delete -f {self.service_file}', capture_output=True, shell=True)
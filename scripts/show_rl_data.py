@@ -1,7 +1,9 @@
 import pickle
 import pandas as pd
 import argparse
+from os import path
 from data_processing import make_dir
+from step_log import read_step_log
 import matplotlib.pyplot as plt
 
 def plot_reward(df):
@@ -15,7 +17,7 @@ def plot_reward(df):
 
 def plot_replicas(df):
     x = df['step']
-    ys = [df[df.columns[i]] for i in range(7, len(df.columns))]
+    ys = [df[column] for column in df.columns if column.startswith('replicas_')]
     colors = ['r', 'b', 'g']
     for i in range(len(ys)):
         y = ys[i]
@@ -27,12 +29,19 @@ def plot_replicas(df):
     plt.savefig('replicas.png')
     
 
+# Load the steps of a run, from a step log (.jsonl, also while the run is going on)
+# or a pickle of older runs.
+def load_rl_data(file):
+    if file.endswith('.jsonl'):
+        return pd.DataFrame(read_step_log(file))
+    with open(file, 'rb') as handle:
+        return pd.DataFrame(pickle.load(handle))
+
 def main(args):
     file = args.f
-    id = file[-13:-7]
-    with open(file, 'rb') as handle:
-        data = pickle.load(handle)
-        df = pd.DataFrame(data)
+    # run-<id>.jsonl or run-<id>.pickle
+    id = path.splitext(path.basename(file))[0][len('run-'):]
+    df = load_rl_data(file)
     make_dir('./rl-csv-data')
     df.to_csv(f'./rl-csv-data/{id}.csv', columns=df.columns)
     plot_reward(df)
@@ -0,0 +1,309 @@
+import numpy as np
+import pandas as pd
+
+from dataset import read_data_frame
+from prometheus_sampler import METRIC_COLUMNS, array_to_env_state
+from latency_histogram import LatencyHistogram
+
+# Length of the random id appended to function names, e.g. `fibonacci-python-abcdefghij`.
+RAND_ID_SUFFIX_LEN = 11
+
+# Erlang C: probability that a request has to wait in an M/M/c queue with @param c servers
+# and offered load @param a = rps / mu. Vectorized, 1 where the queue is unstable.
+def erlang_c(c, a):
+    if np.ndim(c) == 0 and np.ndim(a) == 0:
+        return erlang_c_scalar((int)(c), (float)(a))
+    c, a = np.broadcast_arrays(np.asarray(c, dtype=np.int64), np.asarray(a, dtype=np.float64))
+    # Erlang B by recursion, then convert to Erlang C.
+    b = np.ones(c.shape)
+    for k in range(1, (int)(c.max()) + 1 if c.size else 1):
+        step = k <= c
+        b = np.where(step, a * b / (k + a * b), b)
+    rho = a / c
+    with np.errstate(divide='ignore', invalid='ignore'):
+        prob = b / (1 - rho * (1 - b))
+    return np.where(rho < 1, prob, 1.0)
+
+# Erlang C of a single queue, without the array overhead.
+def erlang_c_scalar(c, a):
+    if a >= c:
+        return 1.0
+    b = 1.0
+    for k in range(1, c + 1):
+        b = a * b / (k + a * b)
+    return b / (1 - a / c * (1 - b))
+
+class QueueModel:
+    """M/M/c model of one benchmark: every replica serves `mu` requests per second.
+
+    The response time of a request is `base_latency` + service time + waiting time.
+    While the load is below the capacity of the replicas the waiting time follows the
+    M/M/c queue; above it the backlog grows linearly over the invocation, so late
+    requests wait proportionally longer.
+
+    - Attributes:
+        - `mu` (Float) : requests per second served by one replica.
+        - `base_latency` (Float) : fixed latency of every request (seconds), e.g. network.
+    - Methods:
+        - `percentiles` : response time percentiles (µs, like the invoker).
+        - `sample` : draw response times (µs).
+        - `fit` : fit a model to measured (replicas, rps, duration, latency percentiles).
+    """
+    def __init__(self, mu=200.0, base_latency=1e-3):
+        self.mu = mu
+        self.base_latency = base_latency
+
+    def __repr__(self):
+        return f'QueueModel(mu={self.mu:.3f}, base_latency={self.base_latency:.6f})'
+
+    # Response time percentiles @param qs (µs) for each (replicas, rps, duration), broadcast together.
+    # Returns an array of shape broadcast_shape + (len(qs),).
+    def percentiles(self, replicas, rps, duration, qs, mu=None, iterations=30):
+        mu = self.mu if mu is None else mu
+        replicas, rps, duration, mu = np.broadcast_arrays(np.maximum(replicas, 1), rps, duration, mu)
+        replicas, rps, duration, mu = [np.asarray(x, dtype=np.float64)[..., None] for x in (replicas, rps, duration, mu)]
+        qs = np.asarray(qs, dtype=np.float64)
+        capacity = replicas * mu
+        wait = erlang_c(replicas.astype(np.int64), rps / mu)
+        theta = np.maximum(capacity - rps, 1e-9)
+        # Stable queue: P(T > t) = (1 - C) e^{-mu t} + C (theta e^{-mu t} - mu e^{-theta t}) / (theta - mu),
+        # solved for t by bisection. When theta == mu the second term is C (1 + mu t) e^{-mu t}.
+        diff = theta - mu
+        close = np.abs(diff) <= 1e-9
+        diff = np.where(close, 1, diff)
+        coef_mu = np.where(close, 1, (1 - wait) + wait * theta / diff)
+        coef_theta = np.where(close, 0, wait * mu / diff)
+        coef_t = np.where(close, wait * mu, 0)
+        lo = np.zeros(np.broadcast_shapes(mu.shape, qs.shape))
+        hi = 2 * -np.log((1 - qs) / 2) * np.maximum(1 / mu, 1 / theta) + lo
+        with np.errstate(over='ignore', under='ignore'):
+            for _ in range(iterations):
+                t = (lo + hi) / 2
+                tail = (coef_mu + coef_t * t) * np.exp(-mu * t) - coef_theta * np.exp(-theta * t)
+                above = tail > 1 - qs
+                lo = np.where(above, t, lo)
+                hi = np.where(above, hi, t)
+        stable = (lo + hi) / 2
+        # Unstable queue: the backlog grows at (rps - capacity) over the invocation.
+        backlog = qs * duration * np.maximum(rps - capacity, 0) / capacity
+        unstable = -np.log(1 - qs) / mu + backlog
+        return (self.base_latency + np.where(rps < capacity, stable, unstable)) * 1e6
+
+    # Draw @param n response times (µs) for @param replicas serving @param rps.
+    def sample(self, replicas, rps, duration, n, rng):
+        replicas = max(replicas, 1)
+        capacity = replicas * self.mu
+        service = rng.exponential(1 / self.mu, n)
+        if rps < capacity:
+            waits = rng.random(n) < erlang_c(replicas, rps / self.mu)
+            queueing = waits * rng.exponential(1 / (capacity - rps), n)
+        else:
+            queueing = rng.random(n) * duration * (rps - capacity) / capacity
+        return (self.base_latency + service + queueing) * 1e6
+
+    # Fit `mu` on a log grid and `base_latency` as the median residual, minimizing the squared
+    # log error of the 50th, 90th and 99th percentiles (µs, one row per measurement).
+    @classmethod
+    def fit(cls, replicas, rps, duration, lats, mus=np.logspace(0, 4, 161)):
+        replicas, rps, duration = [np.asarray(x, dtype=np.float64) for x in (replicas, rps, duration)]
+        lats = np.asarray(lats, dtype=np.float64)
+        model = cls(base_latency=0)
+        # (mus, rows, percentiles)
+        predicted = model.percentiles(replicas[None, :], rps[None, :], duration[None, :], (0.5, 0.9, 0.99),
+                                      mu=mus[:, None])
+        base = np.maximum(np.median(lats[None, :, 0] - predicted[:, :, 0], axis=1), 0)
+        errors = np.mean((np.log(lats[None]) - np.log(predicted + base[:, None, None])) ** 2, axis=(1, 2))
+        best = (int)(np.argmin(errors))
+        return cls(mus[best], base[best] / 1e6)
+
+# Columns the queueing models are fitted on.
+FIT_COLUMNS = ['benchmark', 'replicas', 'duration', 'completed', 'rps_real', '50th', '90th', '99th']
+
+# Load data_collection.py datasets (or older pickles) into one DataFrame, with only the FIT_COLUMNS.
+def load_data_frame(data_files):
+    return pd.concat([read_data_frame(data_file, FIT_COLUMNS) for data_file in data_files], ignore_index=True)
+
+# Fit a QueueModel per benchmark of @param df. Chained benchmarks use their smallest replica count.
+# Returns: {benchmark: QueueModel}
+def fit_models(df, min_rows=3):
+    df = df[(df['completed'] > 0) & (df['50th'] > 0)]
+    models = {}
+    for benchmark, rows in df.groupby('benchmark'):
+        if len(rows) < min_rows:
+            continue
+        replicas = rows['replicas'].map(min)
+        lats = rows[['50th', '90th', '99th']].to_numpy()
+        models[benchmark] = QueueModel.fit(replicas, rows['rps_real'], rows['duration'], lats)
+    return models
+
+# Model of @param benchmark (an entry of the benchmarks config): fit_models keys a model by the
+# dataset `benchmark` column, the benchmark's name, or by its entry point.
+def benchmark_model(models, benchmark, default_model):
+    return models.get(benchmark['entry-point'], models.get(benchmark['name'], default_model))
+
+# Node metrics of simulated clusters, with the load spread evenly over the nodes plus a little noise.
+# @param busy_cores, total_rps, total_replicas : scalars, or arrays of shape (K,) for K clusters.
+# Returns: array of shape (num_nodes, len(METRIC_COLUMNS)), or (K, num_nodes, len(METRIC_COLUMNS)).
+def node_metrics(busy_cores, total_rps, total_replicas, num_nodes, cores_per_node, mem_per_replica, bytes_per_request, rng):
+    busy_cores, total_rps, total_replicas = [np.asarray(x, dtype=np.float64)[..., None]
+                                             for x in (busy_cores, total_rps, total_replicas)]
+    shape = busy_cores.shape[:-1] + (num_nodes,)
+    cpu_busy = np.clip(busy_cores / (num_nodes * cores_per_node) + rng.normal(0, 0.01, shape), 0, 1)
+    mem_used = mem_per_replica * total_replicas / num_nodes
+    net = np.broadcast_to(total_rps * bytes_per_request * 8 / num_nodes, shape)
+    values = {'cpu_idle': 1 - cpu_busy,
+              'cpu_user': 0.9 * cpu_busy,
+              'cpu_system': 0.1 * cpu_busy,
+              'net_tx': net,
+              'net_rx': net,
+              'mem_free': np.clip(1 - mem_used + rng.normal(0, 0.005, shape), 0, 1)}
+    return np.stack([values[column] for column in METRIC_COLUMNS], axis=-1)
+
+class SimInvocation:
+    """Finished invocation of SimEnv, with the interface of invoker.InvokerRun used by KubernetesEnv."""
+    def __init__(self, name, stats):
+        self.name = name
+        self.stats = stats
+
+    def result(self, timeout=None):
+        return self.stats
+
+    def done(self):
+        return True
+
+    def cancel(self, grace_period=5):
+        pass
+
+class SimEnv:
+    """Simulated cluster with the interface of k8s_env_shim.Env.
+
+    Replica counts are kept in memory and change instantly, invocations return at once
+    with latencies drawn from the QueueModel of the invoked function, and node metrics are
+    derived from the load of the last invocations. Nothing is slept, so KubernetesEnv and
+    RLEnv can step thousands of times per second offline.
+
+    - Attributes:
+        - `models` (Dict[String, QueueModel]) : models by benchmark/function name, without the random id.
+        - `default_model` (QueueModel) : model of functions missing from `models`.
+        - `benchmarks` (List[Dict]) : benchmarks config, to find the model of a chained benchmark's functions.
+        - `num_nodes` (Int) : simulated worker nodes.
+        - `cores_per_node` (Int) : CPU cores per node, for the CPU utilization.
+        - `mem_per_replica` (Float) : fraction of a node's memory used by one replica.
+        - `bytes_per_request` (Int) : request plus response size, for the network throughput.
+        - `max_samples` (Int) : latencies drawn per invocation at most.
+    - Methods:
+        - `from_data` : fit the models from data_collection.py datasets.
+        - Same methods as k8s_env_shim.Env: `setup_prometheus`, `setup_functions`, `scale_deployments`,
+          `get_replicas`, `is_deployed`, `delete_functions`, `start_invocation`, `invoke_service`, `get_latencies`,
+          `sample_env`, `delete_latency_files`.
+    """
+    def __init__(self, models=None, default_model=None, benchmarks=None, num_nodes=3, cores_per_node=16,
+                 mem_per_replica=0.01, bytes_per_request=1024, max_samples=2000, seed=None, verbose=False):
+        self.models = models if models is not None else {}
+        self.default_model = default_model if default_model is not None else QueueModel()
+        self.benchmarks = benchmarks if benchmarks is not None else []
+        # Benchmark config of every function, e.g. `streaming` -> video-analytics.
+        self.function_benchmarks_ = {function: b for b in self.benchmarks for function in b['functions']}
+        self.num_nodes = num_nodes
+        self.cores_per_node = cores_per_node
+        self.mem_per_replica = mem_per_replica
+        self.bytes_per_request = bytes_per_request
+        self.max_samples = max_samples
+        self.verbose = verbose
+        self.rng_ = np.random.default_rng(seed)
+        self.replicas_ = {}
+        self.load_ = {}
+        self.latencies_ = {}
+        self.num_invocations_ = 0
+
+    @classmethod
+    def from_data(cls, data_files, **kwargs):
+        return cls(models=fit_models(load_data_frame(data_files)), **kwargs)
+
+    def setup_prometheus(self, prometheus_url=None):
+        return 1
+
+    # Model of a function, looked up by its name with and without the random id. A function of a
+    # configured benchmark gets the benchmark's model, as in vector_env.SimVectorEnv.
+    def model_for(self, name):
+        for function in (name, name[:-RAND_ID_SUFFIX_LEN]):
+            if function in self.function_benchmarks_:
+                return benchmark_model(self.models, self.function_benchmarks_[function],
+                                       self.models.get(function, self.default_model))
+            if function in self.models:
+                return self.models[function]
+        return self.default_model
+
+    def setup_functions(self, deployments, services, wait_to_scale=True, timeout=60):
+        for deployment in deployments:
+            self.replicas_[deployment.deployment_name] = deployment.dep['spec'].get('replicas', 1)
+        return 1
+
+    def scale_deployments(self, deployments, replicas, wait_to_scale=True, timeout=30):
+        if not isinstance(deployments, list):
+            deployments = [deployments]
+        for deployment in deployments:
+            if deployment.deployment_name not in self.replicas_:
+                assert False, f"\n[ERROR] Deployment `{deployment.deployment_name}` does not exist."
+            self.replicas_[deployment.deployment_name] = replicas
+
+    def setup_benchmarks(self, benchmarks, timeout=60):
+        return [self.setup_functions(deployments, services) for deployments, services in benchmarks]
+
+    def scale_all(self, deployments, replicas, timeout=30):
+        for deployment, r in zip(deployments, replicas):
+            self.scale_deployments(deployment, r)
+
+    def delete_benchmarks(self, benchmarks):
+        for services in benchmarks:
+            self.delete_functions(services)
+
+    def get_replicas(self, name):
+        return self.replicas_[name]
+
+    def is_deployed(self, name):
+        return name in self.replicas_
+
+    def delete_functions(self, services, deployments_only=False, deployments=None, wait_time=2):
+        names = [d.deployment_name for d in deployments] if deployments_only else [s.name for s in services]
+        for name in names:
+            self.replicas_.pop(name, None)
+            self.load_.pop(name, None)
+
+    def get_worker_num(self):
+        return self.num_nodes
+
+    # Simulate invoking @param service. The latencies are kept in memory under the returned
+    # "file name" until `get_latencies` collects them.
+    def start_invocation(self, service, duration, rps, timeout=None):
+        if service.name not in self.replicas_:
+            assert False, f"\n[ERROR] Service `{service.name}` does not exist."
+        replicas = self.replicas_[service.name]
+        issued = (int)(rps * duration)
+        lats = self.model_for(service.name).sample(replicas, rps, duration, min(issued, self.max_samples), self.rng_)
+        self.num_invocations_ += 1
+        lat_filename = f'rps{rps}_{service.name}-{self.num_invocations_}.csv'
+        self.latencies_[lat_filename] = lats
+        self.load_[service.name] = rps
+        return SimInvocation(service.name, ((issued, issued), (float(rps), float(rps)), lat_filename))
+
+    def invoke_service(self, service, duration, rps, timeout=None):
+        return self.start_invocation(service, duration, rps, timeout=timeout).result()
+
+    # Collect the latencies of an invocation; each of them can be collected once.
+    def get_latencies(self, latency_stat_filename, as_histogram=False):
+        lats = self.latencies_.pop(latency_stat_filename, np.array([]))
+        if as_histogram:
+            return LatencyHistogram().record(lats)
+        return lats
+
+    def delete_latency_files(self):
+        self.latencies_.clear()
+
+    # Node metrics of the current load, spread evenly over the nodes, with a little noise.
+    # Returns: {worker_id: {'cpu': [idel, user, system], 'net': [tx, rx], 'mem': free}}
+    def sample_env(self, interval_sec):
+        busy_cores = sum(rps / self.model_for(name).mu for name, rps in self.load_.items())
+        samples = node_metrics(busy_cores, sum(self.load_.values()), sum(self.replicas_.values()), self.num_nodes,
+                               self.cores_per_node, self.mem_per_replica, self.bytes_per_request, self.rng_)
+        return array_to_env_state(list(range(1, self.num_nodes + 1)), samples)
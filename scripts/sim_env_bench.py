@@ -0,0 +1,45 @@
+import argparse
+import contextlib
+import io
+import json
+import time
+
+from itertools import product
+from KubernetesEnv import KubernetesEnv, make_benchmarks
+from RLEnv import RLEnv, ActionSpace
+from sim_env import SimEnv
+
+def main(args):
+    with open(args.config, 'r') as f:
+        benchmarks = json.load(f)['benchmarks']
+    env = SimEnv.from_data(args.data, benchmarks=benchmarks) if args.data else SimEnv(benchmarks=benchmarks)
+    print('Models:', env.models if env.models else f'default {env.default_model}')
+    bm_objects = make_benchmarks(benchmarks)
+    for bm in bm_objects:
+        env.setup_functions(bm.deployments, bm.services)
+    k8s_env = KubernetesEnv(env, bm_objects)
+    action_space = ActionSpace(list(product([-1, 0, 1], repeat=len(benchmarks))))
+    rl_env = RLEnv(action_space, k8s_env, args.t)
+
+    # The RL loop prints a lot, keep it out of the measurement.
+    with contextlib.redirect_stdout(io.StringIO()):
+        rl_env.reset()
+        start = time.perf_counter()
+        for _ in range(args.steps):
+            rl_env.step(action_space.sample())
+        elapsed = time.perf_counter() - start
+    print(f'{args.steps} steps in {elapsed:.2f} s: {args.steps / elapsed:.0f} steps/s')
+    print('Final replicas:', [bm.replicas for bm in bm_objects])
+
+#
+# Example cmd:
+#   python3 sim_env_bench.py --config dqn_configs.json --data data/data_* --steps 2000
+#
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--config', default='dqn_configs.json', help='Benchmarks config, as for dqn_main.py')
+    parser.add_argument('--data', nargs='*', help='data_collection.py datasets to fit the queueing models on')
+    parser.add_argument('-t', type=int, default=30, help='Simulated invocation time per step (seconds)')
+    parser.add_argument('--steps', type=int, default=2000, help='RL steps to run')
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,91 @@
+import json
+import os
+import threading
+import time
+import numpy as np
+
+# JSON encoding of NumPy scalars and arrays (and tuples, as lists).
+def to_json(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"[ERROR] Cannot log a value of type {type(value)}.")
+
+class StepLog:
+    """Append-only log of RL steps, one JSON record per line.
+
+    Each `append` writes a single line, so the cost of a step doesn't grow with the run.
+    Records are buffered and flushed every `flush_every` records or `flush_interval`
+    seconds, whichever comes first: a timer thread flushes a record still buffered after
+    `flush_interval` seconds, even if no other record follows. A crash loses at most the
+    unflushed records, and a reader (`read_step_log`) can load the file at any time, even
+    while it is written.
+
+    - Attributes:
+        - `filename` (String) : the .jsonl file, appended to if it exists.
+        - `flush_every` (Int) : records between two flushes.
+        - `flush_interval` (Float) : maximum seconds a record stays in the buffer.
+        - `sync` (Bool) : also fsync on flush, so records survive a machine crash.
+    - Methods:
+        - `append` (Dict) : add one record.
+        - `flush` : write the buffered records.
+        - `close` : flush and close the file.
+    """
+    def __init__(self, filename, flush_every=1, flush_interval=5.0, sync=False):
+        self.filename = filename
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.sync = sync
+        self.file_ = open(filename, 'a')
+        self.pending_ = 0
+        self.last_flush_ = time.monotonic()
+        self.lock_ = threading.Lock()
+        self.timer_ = None
+
+    def append(self, record):
+        line = json.dumps(record, default=to_json) + '\n'
+        with self.lock_:
+            self.file_.write(line)
+            self.pending_ += 1
+            waited = time.monotonic() - self.last_flush_
+            if self.pending_ >= self.flush_every or waited >= self.flush_interval:
+                self.flush_locked()
+            elif self.timer_ is None:
+                self.timer_ = threading.Timer(self.flush_interval - waited, self.flush)
+                self.timer_.daemon = True
+                self.timer_.start()
+
+    def flush(self):
+        with self.lock_:
+            if not self.file_.closed:
+                self.flush_locked()
+
+    def flush_locked(self):
+        if self.timer_ is not None:
+            self.timer_.cancel()
+            self.timer_ = None
+        self.file_.flush()
+        if self.sync:
+            os.fsync(self.file_.fileno())
+        self.pending_ = 0
+        self.last_flush_ = time.monotonic()
+
+    def close(self):
+        with self.lock_:
+            if not self.file_.closed:
+                self.flush_locked()
+                self.file_.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+# Load the records of a StepLog as a list of Dicts. A last line without its newline
+# (a record being written, or cut by a crash) is skipped.
+def read_step_log(filename):
+    with open(filename, 'r') as f:
+        lines = f.read().split('\n')
+    return [json.loads(line) for line in lines[:-1] if line]
@@ -0,0 +1,205 @@
+import argparse
+import json
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# One run of a benchmark at fixed replicas: `scales` has the replicas of each of its functions.
+SweepTask = namedtuple('SweepTask', ['row', 'benchmark', 'scales', 'rps', 'duration'])
+
+# Replica ranges around the HPA recommendation of every row of @param hpa_df, as in expanded_dc.py:
+# @param n_values values from (1 - percent_range) to (1 + percent_range) times the recommendation.
+# Chained benchmarks are skipped, as in expanded_dc.py.
+# Returns: List[SweepTask], all rows x scale values.
+def make_sweep_tasks(hpa_df, benchmarks, percent_range, n_values, skipped=('video-analytics',)):
+    configs = {bm['name']: bm for bm in benchmarks}
+    tasks = []
+    for ind in hpa_df.index:
+        benchmark_name = hpa_df['benchmark'][ind]
+        if benchmark_name in skipped or benchmark_name not in configs:
+            continue
+        recommendations = hpa_df['replicas'][ind]
+        min_recommendations = [np.ceil(rec * (1 - percent_range)) for rec in recommendations]
+        max_recommendations = [np.ceil(rec * (1 + percent_range)) for rec in recommendations]
+        interval_sizes = [max(np.ceil((hi - lo) / n_values), 1) for lo, hi in zip(min_recommendations, max_recommendations)]
+        scale_ranges = [np.arange(lo, hi, step) for lo, hi, step in zip(min_recommendations, max_recommendations, interval_sizes)]
+        # The functions of a benchmark are swept together, so use as many values as the shortest range.
+        for scale_val_ind in range(min(len(r) for r in scale_ranges)):
+            scales = [max((int)(r[scale_val_ind]), 1) for r in scale_ranges]
+            tasks.append(SweepTask(ind, configs[benchmark_name], scales, hpa_df['rps_target'][ind],
+                                   (int)(hpa_df['duration'][ind])))
+    return tasks
+
+class ClusterBudget:
+    """Limits on what sweep tasks may have deployed at the same time.
+
+    A task holds its deployments and replicas from before it deploys until its teardown is
+    done. `acquire` blocks until the task fits; a task larger than the whole budget runs
+    alone rather than never.
+
+    - Attributes:
+        - `max_deployments`, `max_replicas` (Int) : the limits, None for no limit.
+        - `deployments`, `replicas` (Int) : currently held.
+        - `peak_deployments`, `peak_replicas` (Int) : largest amounts held at once.
+    """
+    def __init__(self, max_deployments=None, max_replicas=None):
+        self.max_deployments = max_deployments
+        self.max_replicas = max_replicas
+        self.deployments = 0
+        self.replicas = 0
+        self.peak_deployments = 0
+        self.peak_replicas = 0
+        self.cond_ = threading.Condition()
+
+    def fits(self, deployments, replicas):
+        if self.deployments == 0:
+            return True
+        if self.max_deployments is not None and self.deployments + deployments > self.max_deployments:
+            return False
+        if self.max_replicas is not None and self.replicas + replicas > self.max_replicas:
+            return False
+        return True
+
+    def acquire(self, deployments, replicas):
+        with self.cond_:
+            self.cond_.wait_for(lambda: self.fits(deployments, replicas))
+            self.deployments += deployments
+            self.replicas += replicas
+            self.peak_deployments = max(self.peak_deployments, self.deployments)
+            self.peak_replicas = max(self.peak_replicas, self.replicas)
+
+    def release(self, deployments, replicas):
+        with self.cond_:
+            self.deployments -= deployments
+            self.replicas -= replicas
+            self.cond_.notify_all()
+
+class SweepScheduler:
+    """Work queue running sweep tasks on the cluster within a ClusterBudget.
+
+    Tasks start in order as soon as the budget has room for them, so there is no barrier
+    between rows: the teardown of a finished task overlaps with the deployment and
+    invocation of the next ones. `run_task(task)` does the deploy, invoke and teardown of
+    one task; its return value (or exception) is passed to `on_done`.
+
+    - Attributes:
+        - `budget` (ClusterBudget) : limits on in-flight deployments and replicas.
+        - `max_workers` (Int) : maximum number of tasks running at once.
+    - Methods:
+        - `run` (List[SweepTask], Callable) : run all tasks, returns [(task, result or exception)].
+    """
+    def __init__(self, budget, max_workers=32, on_done=None, verbose=False):
+        self.budget = budget
+        self.max_workers = max_workers
+        self.on_done = on_done
+        self.verbose = verbose
+
+    def run_one(self, task, run_task):
+        cost = (len(task.scales), sum(task.scales))
+        try:
+            result = run_task(task)
+        except Exception as e:
+            print(f'[ERROR] Sweep task {task.benchmark["name"]} {task.scales} (row {task.row}) failed: {e}')
+            result = e
+        finally:
+            self.budget.release(*cost)
+        if self.on_done is not None:
+            self.on_done(task, result)
+        return result
+
+    def run(self, tasks, run_task):
+        futures = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for task in tasks:
+                # Blocks until the budget has room, released when a running task is torn down.
+                self.budget.acquire(len(task.scales), sum(task.scales))
+                if self.verbose:
+                    print(f'[INFO] Starting {task.benchmark["name"]} at {task.scales} replicas (row {task.row}), '
+                          f'{self.budget.deployments} deployments and {self.budget.replicas} replicas in flight.')
+                futures.append(executor.submit(self.run_one, task, run_task))
+        return [(task, future.result()) for task, future in zip(tasks, futures)]
+
+# Run a sweep task against any Env with setup/scale/invoke/delete (e.g. sim_env.SimEnv),
+# without the HPA metrics of DataCollect.run_service. @param time_scale sleeps that fraction
+# of the invocation duration, and @param deploy_time / teardown_time seconds around it.
+# Returns: (issued, completed), (real_rps, target_rps), (50th, 90th, 99th, 99.9th)
+def run_simulated_task(env, task, time_scale=0.0, deploy_time=0.0, teardown_time=0.0):
+    from data_collection import make_functions
+    from latency_stats import compute_latency_stats
+    name, deployments, services, entry_service = make_functions(task.benchmark, None, task.scales)
+    env.setup_functions(deployments, services)
+    try:
+        time.sleep(deploy_time)
+        for deployment, scale in zip(deployments, task.scales):
+            env.scale_deployments(deployment, scale)
+        stat_counts, stat_rps, lat_filename = env.invoke_service(entry_service, task.duration, task.rps)
+        time.sleep(task.duration * time_scale)
+        return stat_counts, stat_rps, compute_latency_stats(env.get_latencies(lat_filename)).percentiles()
+    finally:
+        time.sleep(teardown_time)
+        env.delete_functions(services)
+
+# Synthetic HPA data: @param num_rows rows of the benchmarks of @param benchmarks.
+def synthetic_hpa_df(benchmarks, num_rows, rng):
+    rows = []
+    for _ in range(num_rows):
+        bm = benchmarks[rng.integers(len(benchmarks))]
+        rows.append({'benchmark': bm['name'], 'replicas': [int(rng.integers(2, 12)) for _ in bm['functions']],
+                     'rps_target': float(rng.integers(100, 1000)), 'duration': int(rng.integers(10, 60))})
+    return pd.DataFrame(rows)
+
+# Dry run of a sweep against SimEnv, compared with expanded_dc.py's row-by-row barrier.
+def main(args):
+    from sim_env import SimEnv
+    from dataset import read_data_frame
+    with open(args.config, 'r') as f:
+        benchmarks = json.load(f)['benchmarks']
+    rng = np.random.default_rng(args.seed)
+    hpa_df = read_data_frame(args.f) if args.f else synthetic_hpa_df(benchmarks, args.rows, rng)
+    tasks = make_sweep_tasks(hpa_df, benchmarks, args.percent_range / 100, args.n_values)
+    run_task = lambda task: run_simulated_task(env, task, args.time_scale, args.deploy_time, args.teardown_time)
+    print(f'{len(tasks)} tasks from {len(hpa_df)} rows.')
+
+    # Barrier per row, as expanded_dc.py did: all scale values of a row at once, then a teardown.
+    env = SimEnv()
+    start = time.perf_counter()
+    for row in dict.fromkeys(task.row for task in tasks):
+        row_tasks = [task for task in tasks if task.row == row]
+        SweepScheduler(ClusterBudget(), max_workers=len(row_tasks)).run(row_tasks, run_task)
+    barrier_s = time.perf_counter() - start
+
+    env = SimEnv()
+    budget = ClusterBudget(args.max_deployments, args.max_replicas)
+    start = time.perf_counter()
+    results = SweepScheduler(budget, max_workers=args.max_workers).run(tasks, run_task)
+    scheduled_s = time.perf_counter() - start
+    failures = sum(isinstance(result, Exception) for _, result in results)
+    print(f'Row barrier: {barrier_s:.2f} s')
+    print(f'Scheduler:   {scheduled_s:.2f} s, {failures} failures, peak {budget.peak_deployments} deployments '
+          f'and {budget.peak_replicas} replicas (limits {args.max_deployments}, {args.max_replicas})')
+
+#
+# Example cmd:
+#   python3 sweep_scheduler.py --config configs.json --rows 20 --max-deployments 8 --max-replicas 60 --time-scale 0.01
+#   python3 sweep_scheduler.py --config configs.json --f data/data_<id> --max-replicas 100
+#
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--config', default='configs.json', help='Benchmarks config, as for expanded_dc.py')
+    parser.add_argument('--f', default=None, help='HPA dataset from data_collection.py (default: synthetic rows)')
+    parser.add_argument('--rows', type=int, default=20, help='Number of synthetic rows')
+    parser.add_argument('--percent-range', type=float, default=50, help='percent_range of the dc config')
+    parser.add_argument('--n-values', type=int, default=5, help='n_values of the dc config')
+    parser.add_argument('--max-deployments', type=int, default=8, help='Maximum deployments in flight')
+    parser.add_argument('--max-replicas', type=int, default=60, help='Maximum replicas in flight')
+    parser.add_argument('--max-workers', type=int, default=32, help='Maximum tasks running at once')
+    parser.add_argument('--time-scale', type=float, default=0.01, help='Simulated seconds per invocation second')
+    parser.add_argument('--deploy-time', type=float, default=0.05, help='Simulated deployment time (seconds)')
+    parser.add_argument('--teardown-time', type=float, default=0.05, help='Simulated teardown time (seconds)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    main(args)
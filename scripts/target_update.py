@@ -0,0 +1,64 @@
+import torch
+
+# Parameters and buffers of a network, in a fixed order.
+def parameter_lists(net):
+    return [p.data for p in net.parameters()], [b for b in net.buffers()]
+
+# Polyak update of @param target_net towards @param source_net in place: θ′ ← τ θ + (1 − τ) θ′,
+# one fused kernel per parameter list. Buffers are copied as they are.
+@torch.no_grad()
+def polyak_update(target_net, source_net, tau):
+    target_params, target_buffers = parameter_lists(target_net)
+    source_params, source_buffers = parameter_lists(source_net)
+    torch._foreach_lerp_(target_params, source_params, tau)
+    if target_buffers:
+        torch._foreach_copy_(target_buffers, source_buffers)
+
+# Copy the weights of @param source_net into @param target_net in place.
+@torch.no_grad()
+def hard_update(target_net, source_net):
+    target_params, target_buffers = parameter_lists(target_net)
+    source_params, source_buffers = parameter_lists(source_net)
+    torch._foreach_copy_(target_params + target_buffers, source_params + source_buffers)
+
+class TargetUpdater:
+    """Keeps a target network following an online network, for DQN and other value-based agents.
+
+    Each `step` does a Polyak update with rate `tau`, and/or a hard copy every `hard_every`
+    steps; with both set, the hard copy replaces the Polyak update on those steps. The
+    parameter lists are collected once, so a step is only the fused in-place kernels, with
+    no state_dict copies.
+
+    - Attributes:
+        - `target_net`, `source_net` (nn.Module) : networks with the same architecture.
+        - `tau` (Float) : Polyak rate, None for hard updates only.
+        - `hard_every` (Int) : steps between hard updates, None for Polyak updates only.
+        - `steps` (Int) : number of calls to `step`.
+    - Methods:
+        - `step` : update the target network once.
+    """
+    def __init__(self, target_net, source_net, tau=None, hard_every=None):
+        if tau is None and hard_every is None:
+            assert False, "[ERROR] TargetUpdater needs `tau`, `hard_every` or both."
+        self.target_net = target_net
+        self.source_net = source_net
+        self.tau = tau
+        self.hard_every = hard_every
+        self.steps = 0
+        target_params, target_buffers = parameter_lists(target_net)
+        source_params, source_buffers = parameter_lists(source_net)
+        if len(target_params) != len(source_params) or len(target_buffers) != len(source_buffers):
+            assert False, "[ERROR] Target and source networks have different parameters."
+        self.target_params_, self.target_buffers_ = target_params, target_buffers
+        self.source_params_, self.source_buffers_ = source_params, source_buffers
+
+    @torch.no_grad()
+    def step(self):
+        self.steps += 1
+        if self.hard_every is not None and self.steps % self.hard_every == 0:
+            torch._foreach_copy_(self.target_params_ + self.target_buffers_,
+                                 self.source_params_ + self.source_buffers_)
+        elif self.tau is not None:
+            torch._foreach_lerp_(self.target_params_, self.source_params_, self.tau)
+            if self.target_buffers_:
+                torch._foreach_copy_(self.target_buffers_, self.source_buffers_)
@@ -0,0 +1,76 @@
+import argparse
+import time
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from target_update import TargetUpdater
+
+# Same shape as dqn_main.DQN, with a configurable hidden width.
+class DQN(nn.Module):
+    def __init__(self, n_observations, n_actions, width=128):
+        super(DQN, self).__init__()
+        self.layer1 = nn.Linear(n_observations, width)
+        self.layer2 = nn.Linear(width, width)
+        self.layer3 = nn.Linear(width, n_actions)
+
+    def forward(self, x):
+        x = F.relu(self.layer1(x))
+        x = F.relu(self.layer2(x))
+        return self.layer3(x)
+
+# Soft update as dqn_main.py did it: two state_dict copies and a load_state_dict.
+def legacy_soft_update(target_net, policy_net, tau):
+    target_net_state_dict = target_net.state_dict()
+    policy_net_state_dict = policy_net.state_dict()
+    for key in policy_net_state_dict:
+        target_net_state_dict[key] = policy_net_state_dict[key] * tau + target_net_state_dict[key] * (1-tau)
+    target_net.load_state_dict(target_net_state_dict)
+
+def time_it(fn, reps, device):
+    fn()
+    if device.type == 'cuda':
+        torch.cuda.synchronize()
+    start = time.perf_counter()
+    for _ in range(reps):
+        fn()
+    if device.type == 'cuda':
+        torch.cuda.synchronize()
+    return (time.perf_counter() - start) / reps * 1e6
+
+def main(args):
+    torch.set_num_threads(args.threads)
+    device = torch.device(args.device)
+    print(f'{"width":>6} {"params":>10} {"legacy (us)":>12} {"foreach (us)":>13} {"speedup":>8} {"max diff":>9}')
+    for width in [int(w) for w in args.widths.split(',')]:
+        policy_net = DQN(args.n_observations, args.n_actions, width).to(device)
+        target_net = DQN(args.n_observations, args.n_actions, width).to(device)
+        num_params = sum(p.numel() for p in policy_net.parameters())
+        # Both paths must give the same target weights.
+        legacy_target = DQN(args.n_observations, args.n_actions, width).to(device)
+        legacy_target.load_state_dict(target_net.state_dict())
+        updater = TargetUpdater(target_net, policy_net, tau=args.tau)
+        for _ in range(10):
+            legacy_soft_update(legacy_target, policy_net, args.tau)
+            updater.step()
+        max_diff = max((a - b).abs().max().item() for a, b in zip(legacy_target.parameters(), target_net.parameters()))
+        reps = max(10, args.reps * 128 // width)
+        legacy_us = time_it(lambda: legacy_soft_update(legacy_target, policy_net, args.tau), reps, device)
+        foreach_us = time_it(updater.step, reps, device)
+        print(f'{width:>6} {num_params:>10} {legacy_us:>12.1f} {foreach_us:>13.1f} {legacy_us / foreach_us:>7.1f}x {max_diff:>9.1e}')
+
+#
+# Example cmd:
+#   python3 target_update_bench.py --widths 128,512,2048 --device cpu
+#
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--widths', default='128,512,2048', help='Comma-separated hidden layer widths')
+    parser.add_argument('--n-observations', type=int, default=6, help='State size, 6 as in RLEnv')
+    parser.add_argument('--n-actions', type=int, default=27, help='Number of actions, 27 for 3 benchmarks')
+    parser.add_argument('--tau', type=float, default=0.005, help='Polyak rate, TAU in dqn_main.py')
+    parser.add_argument('--reps', type=int, default=2000, help='Updates per measurement for width 128 (scaled down for wider nets)')
+    parser.add_argument('--threads', type=int, default=1, help='torch intra-op threads')
+    parser.add_argument('--device', default='cpu', help='cpu or cuda')
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,101 @@
+import time
+import pytest
+
+from kubernetes.client.rest import ApiException
+from control_plane import ControlPlaneClient
+from fake_api_server import FakeApiServer
+from manifests import render_function
+from setup_deployment import Deployment
+from setup_service import Service
+
+@pytest.fixture
+def make_client():
+    started = []
+    def make(server, **kwargs):
+        client = ControlPlaneClient.from_url(server.start(), poll_interval=0.02, **kwargs)
+        started.append((server, client))
+        return client
+    yield make
+    for server, client in started:
+        client.close()
+        server.stop()
+
+# Deployment and Service of function fibonacci-python named @param name, as control_plane_bench.py makes them.
+def make_function(name):
+    dep, svc, hpa = render_function('fibonacci-python', name)
+    return [Deployment(dep, None)], [Service(name, None, svc['spec']['ports'][0]['port'], manifests=[dep, svc, hpa])]
+
+def test_create_scale_delete_round_trip(make_client):
+    server = FakeApiServer(ready_delay=0.05, delete_delay=0.05)
+    client = make_client(server)
+    deployments, services = make_function('fn-a')
+    assert client.run(client.setup_functions(deployments, services, timeout=5)) == 1
+    assert services[0].ip_ == server.objects['services']['fn-a']['spec']['clusterIP']
+    assert server.objects['deployments']['fn-a']['status']['readyReplicas'] == 1
+    client.run(client.scale_deployments(deployments, [3], timeout=5))
+    assert client.run(client.get_replicas('fn-a')) == 3
+    assert server.objects['deployments']['fn-a']['status']['readyReplicas'] == 3
+    client.run(client.delete_functions(services, timeout=5))
+    # Gone when the delete returns, not just marked for deletion.
+    assert not any(server.objects.values())
+    assert services[0].ip_ is None
+
+def test_missing_objects(make_client):
+    client = make_client(FakeApiServer())
+    with pytest.raises(ApiException) as e:
+        client.run(client.get_replicas('missing'))
+    assert e.value.status == 404
+    dep, _, _ = render_function('fibonacci-python', 'missing')
+    assert client.run(client.delete(dep, missing_ok=True)) is None
+
+def test_wait_ready_times_out(make_client):
+    client = make_client(FakeApiServer(ready_delay=10))
+    deployments, services = make_function('fn-a')
+    start = time.time()
+    assert client.run(client.setup_functions(deployments, services, timeout=0.3)) == 0
+    assert time.time() - start < 2
+    with pytest.raises(TimeoutError):
+        client.run(client.wait_ready(['fn-a'], timeout=0.2))
+
+def test_wait_ready_watches_instead_of_polling(make_client):
+    server = FakeApiServer(ready_delay=0.2)
+    client = make_client(server)
+    deployments, services = make_function('fn-a')
+    assert client.run(client.setup_functions(deployments, services, timeout=5)) == 1
+    assert server.num_lists == 1
+    assert server.num_watches == 1
+
+def test_resource_version_too_old_relists(make_client):
+    server = FakeApiServer(ready_delay=0.1)
+    client = make_client(server)
+    server.expired_watches = 1
+    deployments, services = make_function('fn-a')
+    assert client.run(client.setup_functions(deployments, services, timeout=5)) == 1
+    assert server.num_lists == 2
+
+def test_stale_connection_is_retried(make_client):
+    server = FakeApiServer()
+    client = make_client(server)
+    deployments, services = make_function('fn-a')
+    assert client.run(client.setup_functions(deployments, services, timeout=5)) == 1
+    # The server closes the idle keep-alive connections; the client still holds them.
+    server.close_connections()
+    time.sleep(0.05)
+    assert client.run(client.get_replicas('fn-a')) == 1
+
+def test_idle_connections_expire(make_client):
+    server = FakeApiServer()
+    client = make_client(server, idle_timeout=0.05)
+    client.run(client.call('GET', '/api/v1/namespaces/default/services'))
+    client.run(client.call('GET', '/api/v1/namespaces/default/services'))
+    assert server.num_connections == 1
+    time.sleep(0.1)
+    client.run(client.call('GET', '/api/v1/namespaces/default/services'))
+    assert server.num_connections == 2
+
+def test_unreachable_server_fails_setup(make_client):
+    server = FakeApiServer()
+    client = make_client(server)
+    server.stop()
+    deployments, services = make_function('fn-a')
+    assert client.run(client.setup_functions(deployments, services, timeout=1)) == 0
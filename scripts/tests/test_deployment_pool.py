@@ -0,0 +1,58 @@
+import json
+import os
+import pytest
+
+from data_collection import make_functions
+from deployment_pool import DeploymentPool
+from sim_env import SimEnv
+
+CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'configs.json')
+
+@pytest.fixture
+def benchmark():
+    with open(CONFIG) as f:
+        return next(bm for bm in json.load(f)['benchmarks'] if bm['name'] == 'fibonacci-python')
+
+# SimEnv where Deployments can be marked as being deleted (a deletion timestamp on a live cluster).
+class TerminatingSimEnv(SimEnv):
+    def __init__(self):
+        super().__init__()
+        self.terminating = set()
+
+    def is_deployed(self, name):
+        return super().is_deployed(name) and name not in self.terminating
+
+def lease_deployed(pool, env, benchmark):
+    instance = pool.lease(benchmark)
+    env.setup_functions(instance.deployments, instance.services)
+    return instance
+
+def test_release_keeps_deployed_instance_warm(benchmark):
+    env = TerminatingSimEnv()
+    pool = DeploymentPool(env, lambda bm: make_functions(bm, None))
+    instance = lease_deployed(pool, env, benchmark)
+    pool.release(instance)
+    assert pool.lease(benchmark) is instance and instance.warm
+    assert (pool.hits, pool.misses) == (1, 1)
+
+def test_release_drops_deleted_and_terminating_instances(benchmark):
+    env = TerminatingSimEnv()
+    pool = DeploymentPool(env, lambda bm: make_functions(bm, None))
+    deleted = lease_deployed(pool, env, benchmark)
+    terminating = lease_deployed(pool, env, benchmark)
+    env.delete_functions(deleted.services)
+    env.terminating.add(terminating.deployments[0].deployment_name)
+    pool.release(deleted)
+    pool.release(terminating)
+    assert pool.all_instances() == []
+    assert pool.lease(benchmark) not in (deleted, terminating)
+
+def test_close_deletes_idle_instances(benchmark):
+    env = TerminatingSimEnv()
+    pool = DeploymentPool(env, lambda bm: make_functions(bm, None))
+    idle = lease_deployed(pool, env, benchmark)
+    leased = lease_deployed(pool, env, benchmark)
+    pool.release(idle)
+    pool.close()
+    assert not env.is_deployed(idle.deployments[0].deployment_name)
+    assert env.is_deployed(leased.deployments[0].deployment_name)
@@ -0,0 +1,22 @@
+from invoker import wait_all
+
+# InvokerRun with a fixed outcome.
+class StubRun:
+    def __init__(self, name, outcome):
+        self.name = name
+        self.outcome = outcome
+        self.cancelled = False
+
+    def result(self, timeout=None):
+        if isinstance(self.outcome, Exception):
+            raise self.outcome
+        return self.outcome
+
+    def cancel(self, grace_period=5):
+        self.cancelled = True
+
+def test_wait_all_keeps_runs_of_the_same_service():
+    error = TimeoutError('too slow')
+    runs = [StubRun('fibonacci-python', 1), StubRun('fibonacci-python', error), StubRun('hotel-app-geo', 3)]
+    assert wait_all(runs) == [1, error, 3]
+    assert [run.cancelled for run in runs] == [False, True, False]
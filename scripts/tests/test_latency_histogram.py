@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from latency_histogram import LatencyHistogram, merge_histograms
+
+QS = [0.01, 0.1, 0.5, 0.9, 0.99, 0.999]
+
+@pytest.mark.parametrize('latencies', [
+    np.random.default_rng(0).lognormal(7, 1, 20000),
+    np.random.default_rng(1).exponential(1000, 20000) + 1,
+    np.random.default_rng(2).uniform(1, 1e7, 20000),
+])
+def test_percentiles_within_relative_error(latencies):
+    hist = LatencyHistogram().record(latencies)
+    error = 2.0**-hist.sub_bucket_bits
+    lat = np.sort(latencies)
+    for q, value in zip(QS, hist.percentiles(QS)):
+        # Same rank convention as compute_latency_stats.
+        expected = lat[(int)(len(lat) * q)]
+        assert abs(value - expected) <= error * expected
+        assert abs(value - np.percentile(latencies, q * 100)) <= error * expected + (lat[-1] - lat[0]) / len(lat)
+
+def test_merge_equals_recording_everything():
+    rng = np.random.default_rng(3)
+    parts = [rng.lognormal(7, 1, 1000), rng.lognormal(8, 0.5, 3000), rng.lognormal(6, 2, 10)]
+    merged = merge_histograms([LatencyHistogram().record(part) for part in parts])
+    whole = LatencyHistogram().record(np.concatenate(parts))
+    assert np.array_equal(merged.counts, whole.counts)
+    assert (merged.count, merged.min, merged.max) == (whole.count, whole.min, whole.max)
+    assert merged.percentiles(QS) == whole.percentiles(QS)
+    # Round trip through the compact form.
+    assert LatencyHistogram.from_dict(merged.to_dict()).percentiles(QS) == whole.percentiles(QS)
+    with pytest.raises(AssertionError):
+        merged.merge(LatencyHistogram(sub_bucket_bits=5))
+
+def test_empty_histogram():
+    hist = LatencyHistogram().record([])
+    assert len(hist) == 0
+    assert hist.percentile(0.5) is None
+    assert hist.stats() is None
+    # Merging an empty histogram changes nothing.
+    full = LatencyHistogram().record([10.0, 20.0, 30.0])
+    before = full.percentiles(QS)
+    full.merge(hist)
+    assert full.percentiles(QS) == before
+    assert (full.count, full.min, full.max) == (3, 10.0, 30.0)
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from latency_stats import compute_latency_stats, compute_latency_stats_streaming, get_latency_stats
+
+def write_latencies(tmp_path, latencies):
+    filename = tmp_path / 'lat.txt'
+    filename.write_text(''.join(f'{float(value)!r}\n' for value in latencies))
+    return str(filename)
+
+@pytest.mark.parametrize('latencies', [
+    np.random.default_rng(0).lognormal(7, 1, 5000),
+    np.round(np.random.default_rng(1).exponential(1000, 5000)),
+    np.arange(1000, dtype=np.float64),
+])
+def test_streaming_matches_in_memory(tmp_path, latencies):
+    filename = write_latencies(tmp_path, latencies)
+    expected = compute_latency_stats(latencies)
+    assert compute_latency_stats_streaming(filename, chunk_bytes=1 << 12, max_values=64, num_bins=16) == expected
+    assert get_latency_stats(filename) == expected
+
+def test_streaming_tied_values(tmp_path):
+    # More ties than max_values used to narrow the window forever.
+    latencies = [1000.0] * 100 + [2000.0]
+    filename = write_latencies(tmp_path, latencies)
+    stats = compute_latency_stats_streaming(filename, max_values=10, num_bins=16)
+    assert stats == compute_latency_stats(latencies)
+    assert stats.lat_99 == 1000.0
+
+def test_streaming_adjacent_floats(tmp_path):
+    # A window only a few floats wide cannot be split into bins.
+    base = 1000.0
+    latencies = [base] * 50 + [np.nextafter(base, np.inf)] * 50 + [np.nextafter(np.nextafter(base, np.inf), np.inf)] * 50
+    filename = write_latencies(tmp_path, latencies)
+    assert compute_latency_stats_streaming(filename, max_values=10, num_bins=16) == compute_latency_stats(latencies)
+
+def test_empty(tmp_path):
+    filename = write_latencies(tmp_path, [])
+    assert compute_latency_stats_streaming(filename) is None
+    assert get_latency_stats(filename) is None
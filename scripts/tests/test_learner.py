@@ -0,0 +1,49 @@
+import time
+import torch
+
+from learner import AsyncLearner, WeightStore
+from replay_buffer import ReplayBuffer
+
+def make_memory(count):
+    memory = ReplayBuffer(100, 4)
+    memory.push_batch(torch.rand(count, 4), torch.zeros(count), torch.rand(count, 4), torch.rand(count),
+                      torch.zeros(count, dtype=torch.bool))
+    return memory
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.001)
+    return condition()
+
+def test_gradient_step_runs_without_the_lock():
+    held = []
+    def optimize(memory):
+        memory.sample_weighted(2)
+        held.append(learner.lock.locked())
+        memory.update_priorities(torch.arange(2), torch.ones(2))
+    learner = AsyncLearner(make_memory(8), torch.nn.Linear(4, 2), optimize, batch_size=2)
+    learner.env_steps = 8
+    learner.start()
+    assert wait_for(lambda: learner.updates >= 8)
+    learner.stop()
+    assert held and not any(held)
+
+def test_updates_capped_per_env_step():
+    learner = AsyncLearner(make_memory(0), torch.nn.Linear(4, 2), lambda memory: None, batch_size=2)
+    learner.start()
+    for _ in range(4):
+        learner.push(torch.rand(4), 0, torch.rand(4), 1.0)
+    assert wait_for(lambda: learner.updates == 4)
+    time.sleep(0.05)
+    learner.stop()
+    # One update per env step by default.
+    assert learner.updates == 4
+
+def test_weight_store_refresh():
+    store = WeightStore()
+    net, actor = torch.nn.Linear(4, 2), torch.nn.Linear(4, 2)
+    version = store.refresh(actor, store.publish(net.state_dict()) - 1)
+    assert version == store.version == 1
+    assert torch.equal(actor.weight, net.weight)
+    assert store.refresh(actor, version) == version
@@ -0,0 +1,79 @@
+import asyncio
+import pytest
+
+from loadgen import HttpClient, LoadGenerator
+
+BODY = b'Hello, Invoke Relay'
+RESPONSE = b'HTTP/1.1 200 OK\r\nContent-Length: ' + str(len(BODY)).encode() + b'\r\n\r\n' + BODY
+
+# Keep-alive server as in loadgen_bench.py, that closes every connection after
+# @param requests_per_connection responses without saying so (an idle timeout), or cuts
+# the response short after @param partial bytes.
+async def start_server(requests_per_connection=None, partial=None):
+    stats = {'connections': 0, 'requests': 0}
+
+    async def handle(reader, writer):
+        stats['connections'] += 1
+        served = 0
+        try:
+            while requests_per_connection is None or served < requests_per_connection:
+                await reader.readuntil(b'\r\n\r\n')
+                stats['requests'] += 1
+                served += 1
+                if partial is not None:
+                    writer.write(RESPONSE[:partial])
+                    break
+                writer.write(RESPONSE)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        writer.close()
+
+    server = await asyncio.start_server(handle, '127.0.0.1', 0)
+    return server, server.sockets[0].getsockname()[1], stats
+
+def test_keep_alive_reuses_connections():
+    async def run():
+        server, port, stats = await start_server()
+        client = HttpClient('127.0.0.1', port)
+        for _ in range(5):
+            await client.request()
+        await client.close()
+        server.close()
+        return stats
+    assert asyncio.run(run()) == {'connections': 1, 'requests': 5}
+
+def test_closed_idle_connection_is_retried():
+    async def run():
+        server, port, stats = await start_server(requests_per_connection=1)
+        client = HttpClient('127.0.0.1', port)
+        await client.request()
+        # Let the server's close reach the idle connection.
+        await asyncio.sleep(0.05)
+        await client.request()
+        await client.close()
+        server.close()
+        return stats
+    assert asyncio.run(run()) == {'connections': 2, 'requests': 2}
+
+def test_partial_response_is_not_retried():
+    async def run():
+        server, port, stats = await start_server(partial=10)
+        client = HttpClient('127.0.0.1', port)
+        with pytest.raises(asyncio.IncompleteReadError):
+            await client.request()
+        await client.close()
+        server.close()
+        return stats
+    assert asyncio.run(run())['requests'] == 1
+
+def test_load_generator_completes_every_request():
+    async def run():
+        server, port, stats = await start_server(requests_per_connection=3)
+        result = await LoadGenerator(HttpClient('127.0.0.1', port), 200, 0.5, 'constant').run()
+        server.close()
+        # The client closed its connections, let the handlers see it.
+        await asyncio.sleep(0.05)
+        return result
+    (issued, completed), _, lats = asyncio.run(run())
+    assert issued == completed == len(lats) == 100
@@ -0,0 +1,43 @@
+import pytest
+
+import manifests
+from kubernetes.client.rest import ApiException
+from manifests import base_manifests, render_function, wait_deleted
+
+def test_render_function():
+    dep, svc, hpa = render_function('fibonacci-python', 'fibonacci-python-abcdefghij', scale=3)
+    assert dep['metadata']['name'] == svc['metadata']['name'] == 'fibonacci-python-abcdefghij'
+    assert hpa['spec']['scaleTargetRef']['name'] == 'fibonacci-python-abcdefghij'
+    assert hpa['spec']['minReplicas'] == hpa['spec']['maxReplicas'] == 3
+    # Renders are copies: the cache is untouched.
+    assert base_manifests('fibonacci-python')[0]['metadata']['name'] == 'fibonacci-python'
+
+# read_manifest of objects that disappear after @param reads reads each.
+def stub_reads(monkeypatch, reads, status=404):
+    counts = {}
+    def read_manifest(manifest):
+        name = manifest['metadata']['name']
+        counts[name] = counts.get(name, 0) + 1
+        if counts[name] > reads[name]:
+            raise ApiException(status=status)
+        return manifest
+    monkeypatch.setattr(manifests, 'read_manifest', read_manifest)
+    return counts
+
+def make_manifests(*names):
+    return [{'kind': 'Deployment', 'metadata': {'name': name}} for name in names]
+
+def test_wait_deleted(monkeypatch):
+    counts = stub_reads(monkeypatch, {'a': 0, 'b': 2})
+    wait_deleted(make_manifests('a', 'b'), timeout=5, poll_interval=0.01)
+    assert counts == {'a': 1, 'b': 3}
+
+def test_wait_deleted_timeout(monkeypatch):
+    stub_reads(monkeypatch, {'a': 0, 'b': 1000})
+    with pytest.raises(TimeoutError, match="'b'"):
+        wait_deleted(make_manifests('a', 'b'), timeout=0.05, poll_interval=0.01)
+
+def test_wait_deleted_api_error(monkeypatch):
+    stub_reads(monkeypatch, {'a': 0}, status=500)
+    with pytest.raises(ApiException):
+        wait_deleted(make_manifests('a'), timeout=5, poll_interval=0.01)
@@ -0,0 +1,40 @@
+import pytest
+
+from types import SimpleNamespace
+from prometheus_sampler import assign_worker_ids, node_addresses
+
+# CoreV1Api().list_node() result with only the fields node_addresses reads.
+def make_nodes(nodes):
+    return SimpleNamespace(items=[
+        SimpleNamespace(metadata=SimpleNamespace(name=name),
+                        status=SimpleNamespace(addresses=[SimpleNamespace(type=t, address=a) for t, a in addresses]))
+        for name, addresses in nodes.items()])
+
+def test_numeric_order_without_hostnames():
+    instances = ['10.0.0.10:9100', '10.0.0.2:9100', '10.0.0.1:9100']
+    assert assign_worker_ids(instances) == {'10.0.0.1:9100': 1, '10.0.0.2:9100': 2, '10.0.0.10:9100': 3}
+
+def test_match_by_hostname():
+    hostnames = {1: 'node-1', 2: 'node-2'}
+    instances = ['node-2.cluster.local:9100', 'node-1:9100', 'master:9100']
+    assert assign_worker_ids(instances, hostnames) == {'node-1:9100': 1, 'node-2.cluster.local:9100': 2}
+
+def test_match_ip_instances_by_node_address():
+    # Targets are `$(hostname -i):9100` (setup_testbed.py), workers are `kubectl get nodes` names.
+    nodes = make_nodes({
+        'master': [('InternalIP', '10.0.0.1'), ('Hostname', 'master')],
+        'node-1': [('InternalIP', '10.0.0.10'), ('Hostname', 'node-1'), ('ExternalIP', '1.2.3.4')],
+        'node-2': [('InternalIP', '10.0.0.2'), ('Hostname', 'node-2')],
+    })
+    addresses = node_addresses(nodes)
+    assert addresses['node-1'] == ['10.0.0.10', 'node-1']
+    hostnames = {1: 'node-1', 2: 'node-2'}
+    instances = ['10.0.0.1:9100', '10.0.0.2:9100', '10.0.0.10:9100']
+    assert assign_worker_ids(instances, hostnames, addresses) == {'10.0.0.10:9100': 1, '10.0.0.2:9100': 2}
+    # Without the addresses nothing matches.
+    with pytest.raises(AssertionError):
+        assign_worker_ids(instances, hostnames)
+
+def test_missing_worker():
+    with pytest.raises(AssertionError):
+        assign_worker_ids(['node-1:9100'], {1: 'node-1', 2: 'node-2'})
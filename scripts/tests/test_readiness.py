@@ -0,0 +1,116 @@
+import time
+import pytest
+
+from types import SimpleNamespace
+from kubernetes.client.rest import ApiException
+from readiness import ReadinessWaiter, deployment_is_ready
+
+# Deployment as returned by AppsV1Api, with only the fields the waiter reads.
+def make_dep(name, replicas, ready, generation=1, observed_generation=1, resource_version='1'):
+    return SimpleNamespace(
+        metadata=SimpleNamespace(name=name, generation=generation, resource_version=resource_version),
+        spec=SimpleNamespace(replicas=replicas),
+        status=SimpleNamespace(ready_replicas=ready, observed_generation=observed_generation))
+
+class StubApi:
+    def __init__(self, lists):
+        self.lists = list(lists)
+        self.num_lists = 0
+
+    def list_namespaced_deployment(self, namespace, **kwargs):
+        items = self.lists[min(self.num_lists, len(self.lists) - 1)]
+        self.num_lists += 1
+        return SimpleNamespace(items=items, metadata=SimpleNamespace(resource_version=str(self.num_lists)))
+
+# Watch factory whose streams replay @param streams, one per watch. A stream is a list of
+# events, or an exception to raise.
+class StubWatch:
+    def __init__(self, streams):
+        self.streams = list(streams)
+        self.resource_versions = []
+        self.num_stopped = 0
+
+    def __call__(self):
+        return self
+
+    def stream(self, func, namespace, resource_version=None, timeout_seconds=None):
+        self.resource_versions.append(resource_version)
+        events = self.streams.pop(0) if self.streams else []
+        if isinstance(events, Exception):
+            raise events
+        if not events:
+            # Nothing happens until the watch times out.
+            time.sleep(0.01)
+        yield from events
+
+    def stop(self):
+        self.num_stopped += 1
+
+def test_deployment_is_ready():
+    assert deployment_is_ready(make_dep('a', 2, 2))
+    assert not deployment_is_ready(make_dep('a', 2, 1))
+    assert deployment_is_ready(make_dep('a', 0, None))
+    # Stale status of a previous generation.
+    assert not deployment_is_ready(make_dep('a', 2, 2, generation=2, observed_generation=1))
+
+# The same predicate on the JSON dicts of the REST API (control_plane.ControlPlaneClient).
+def test_deployment_dict_is_ready():
+    dep = {'metadata': {'name': 'a', 'generation': 1}, 'spec': {'replicas': 2},
+           'status': {'readyReplicas': 2, 'observedGeneration': 1}}
+    assert deployment_is_ready(dep)
+    dep['status']['readyReplicas'] = 1
+    assert not deployment_is_ready(dep)
+    assert deployment_is_ready({'metadata': {'name': 'a', 'generation': 1}, 'spec': {'replicas': 0}, 'status': {}})
+    assert not deployment_is_ready({'metadata': {'name': 'a', 'generation': 2}, 'spec': {'replicas': 2},
+                                    'status': {'readyReplicas': 2, 'observedGeneration': 1}})
+
+def test_ready_at_list_needs_no_watch():
+    watch = StubWatch([])
+    ReadinessWaiter(StubApi([[make_dep('a', 1, 1)]]), watch_factory=watch).wait(['a'], 1)
+    assert watch.resource_versions == []
+
+def test_added_then_modified_to_ready():
+    api = StubApi([[make_dep('b', 1, 1)]])
+    watch = StubWatch([[
+        {'type': 'ADDED', 'object': make_dep('a', 2, 0, resource_version='5')},
+        {'type': 'MODIFIED', 'object': make_dep('a', 2, 1, resource_version='6')},
+        {'type': 'MODIFIED', 'object': make_dep('a', 2, 2, resource_version='7')},
+    ]])
+    ReadinessWaiter(api, watch_factory=watch).wait(['a', 'b'], 5)
+    # Watched from the version of the list, once.
+    assert watch.resource_versions == ['1']
+    assert watch.num_stopped == 1
+
+def test_deleted_is_not_ready():
+    watch = StubWatch([[{'type': 'DELETED', 'object': make_dep('a', 1, 1)}]])
+    with pytest.raises(TimeoutError):
+        ReadinessWaiter(StubApi([[]]), watch_factory=watch).wait(['a'], 0.1)
+
+def test_resource_version_too_old_relists():
+    # Ready by the time of the second list: the watch events in between were missed.
+    api = StubApi([[make_dep('a', 1, 0)], [make_dep('a', 1, 1)]])
+    watch = StubWatch([ApiException(status=410)])
+    ReadinessWaiter(api, watch_factory=watch).wait(['a'], 5)
+    assert api.num_lists == 2
+    assert watch.num_stopped == 1
+
+def test_resource_version_too_old_watches_from_relist():
+    api = StubApi([[make_dep('a', 1, 0)], [make_dep('a', 1, 0)]])
+    watch = StubWatch([ApiException(status=410),
+                       [{'type': 'MODIFIED', 'object': make_dep('a', 1, 1, resource_version='9')}]])
+    ReadinessWaiter(api, watch_factory=watch).wait(['a'], 5)
+    assert watch.resource_versions == ['1', '2']
+
+def test_other_api_errors_are_raised():
+    watch = StubWatch([ApiException(status=500)])
+    with pytest.raises(ApiException):
+        ReadinessWaiter(StubApi([[]]), watch_factory=watch).wait(['a'], 5)
+    assert watch.num_stopped == 1
+
+def test_shared_deadline():
+    # `a` gets ready, `b` never does: the wait fails after the deadline of both.
+    watch = StubWatch([[{'type': 'MODIFIED', 'object': make_dep('a', 1, 1)}]])
+    start = time.time()
+    with pytest.raises(TimeoutError, match=r"\['b'\]"):
+        ReadinessWaiter(StubApi([[]]), watch_factory=watch).wait(['a', 'b'], 0.2)
+    assert 0.2 <= time.time() - start < 1
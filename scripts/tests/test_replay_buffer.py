@@ -0,0 +1,52 @@
+import numpy as np
+import torch
+
+from replay_buffer import PrioritizedReplayBuffer, ReplayBuffer, load_npz_arrays
+
+def fill(buffer, count):
+    buffer.push_batch(torch.rand(count, buffer.n_observations), torch.randint(0, 5, (count,)),
+                      torch.rand(count, buffer.n_observations), torch.rand(count), torch.rand(count) > 0.8)
+
+def test_push_batch_larger_than_capacity():
+    states = torch.arange(25.0).view(25, 1).repeat(1, 6)
+    for cls in (ReplayBuffer, PrioritizedReplayBuffer):
+        batched = cls(10, 6)
+        fill(batched, 3)
+        batched.push_batch(states, torch.arange(25) % 5, states + 1, torch.arange(25.0), torch.zeros(25, dtype=torch.bool))
+        # Same buffer as pushing the rows one batch at a time: the last 10 rows, ending at the same position.
+        sequential = cls(10, 6)
+        fill(sequential, 3)
+        for i in range(25):
+            sequential.push_batch(states[i:i + 1], torch.tensor([i % 5]), states[i:i + 1] + 1, torch.tensor([float(i)]),
+                                  torch.zeros(1, dtype=torch.bool))
+        for name in ('states', 'actions', 'rewards', 'next_states', 'dones'):
+            assert torch.equal(getattr(batched, name), getattr(sequential, name)), name
+        assert (batched.position, batched.size) == (sequential.position, sequential.size) == (8, 10)
+        assert sorted(batched.rewards.tolist()) == [float(i) for i in range(15, 25)]
+
+def test_save_load(tmp_path):
+    buffer = ReplayBuffer(100, 6)
+    fill(buffer, 130)
+    buffer.save(tmp_path / 'buffer.npz')
+    loaded = ReplayBuffer.load(tmp_path / 'buffer.npz')
+    for name in ('states', 'actions', 'rewards', 'next_states', 'dones'):
+        assert torch.equal(getattr(loaded, name), getattr(buffer, name))
+    assert (loaded.position, loaded.size, loaded.capacity) == (30, 100, 100)
+
+def test_save_load_prioritized(tmp_path):
+    buffer = PrioritizedReplayBuffer(100, 6)
+    fill(buffer, 70)
+    buffer.update_priorities(torch.arange(10), torch.rand(10) * 5)
+    buffer.save(tmp_path / 'buffer.npz')
+    loaded = PrioritizedReplayBuffer.load(tmp_path / 'buffer.npz')
+    assert np.allclose(loaded.tree_.values(np.arange(70)), buffer.tree_.values(np.arange(70)))
+    assert loaded.max_priority == buffer.max_priority
+
+def test_load_npz_arrays(tmp_path):
+    np.savez(tmp_path / 'stored.npz', a=np.arange(6.0).reshape(2, 3), b=np.asfortranarray(np.ones((3, 2))), c=7)
+    np.savez_compressed(tmp_path / 'compressed.npz', a=np.arange(6.0).reshape(2, 3))
+    stored = load_npz_arrays(tmp_path / 'stored.npz')
+    assert isinstance(stored['a'], np.memmap)
+    assert np.array_equal(stored['a'], np.arange(6.0).reshape(2, 3))
+    assert np.array_equal(stored['b'], np.ones((3, 2))) and (int)(stored['c']) == 7
+    assert np.array_equal(load_npz_arrays(tmp_path / 'compressed.npz')['a'], np.arange(6.0).reshape(2, 3))
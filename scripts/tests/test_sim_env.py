@@ -0,0 +1,24 @@
+from sim_env import QueueModel, SimEnv
+from vector_env import SimVectorEnv
+
+# Chained benchmark of configs.json, with the SLA and load range of dqn_configs.json entries.
+def video_analytics():
+    return [{'name': 'video-analytics', 'entry-point': 'streaming', 'functions': ['streaming', 'decoder', 'recog'],
+             'rps-min': 5, 'rps-max': 50, 'sla': {'lat': [0, 1000000.0, 0, 0]}}]
+
+def test_chained_benchmark_uses_its_fitted_model():
+    # fit_models keys the model by the dataset `benchmark` column.
+    benchmarks = video_analytics()
+    models = {'video-analytics': QueueModel(mu=50.0)}
+    env = SimEnv(models=models, benchmarks=benchmarks)
+    for function in benchmarks[0]['functions']:
+        assert env.model_for(f'{function}-0123456789') is models['video-analytics']
+    # Same model as the vectorized simulator.
+    assert SimVectorEnv(1, benchmarks, models=models).mu[0] == env.model_for('streaming-0123456789').mu
+
+def test_function_models_and_default():
+    models = {'fibonacci-python': QueueModel(mu=300.0)}
+    env = SimEnv(models=models)
+    assert env.model_for('fibonacci-python-0123456789') is models['fibonacci-python']
+    assert env.model_for('fibonacci-python') is models['fibonacci-python']
+    assert env.model_for('streaming-0123456789') is env.default_model
@@ -0,0 +1,37 @@
+import time
+import numpy as np
+
+from step_log import StepLog, read_step_log
+
+def test_flush_every(tmp_path):
+    filename = tmp_path / 'run.jsonl'
+    with StepLog(filename, flush_every=2, flush_interval=60) as log:
+        log.append({'step': 1, 'state': np.arange(2.0)})
+        assert read_step_log(filename) == []
+        log.append({'step': 2, 'reward': np.float32(0.5)})
+        assert read_step_log(filename) == [{'step': 1, 'state': [0.0, 1.0]}, {'step': 2, 'reward': 0.5}]
+
+def test_last_record_flushed_after_interval(tmp_path):
+    filename = tmp_path / 'run.jsonl'
+    log = StepLog(filename, flush_every=100, flush_interval=0.05)
+    log.append({'step': 1})
+    assert read_step_log(filename) == []
+    # No further append: the timer flushes the record.
+    deadline = time.time() + 5
+    while not read_step_log(filename) and time.time() < deadline:
+        time.sleep(0.01)
+    assert read_step_log(filename) == [{'step': 1}]
+    log.close()
+
+def test_close_flushes_and_appends(tmp_path):
+    filename = tmp_path / 'run.jsonl'
+    with StepLog(filename, flush_every=100, flush_interval=60) as log:
+        log.append({'step': 1})
+    with StepLog(filename, flush_every=100, flush_interval=60) as log:
+        log.append({'step': 2})
+    assert read_step_log(filename) == [{'step': 1}, {'step': 2}]
+
+def test_torn_last_line_skipped(tmp_path):
+    filename = tmp_path / 'run.jsonl'
+    filename.write_text('{"step": 1}\n{"step": ')
+    assert read_step_log(filename) == [{'step': 1}]
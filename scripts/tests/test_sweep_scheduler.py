@@ -0,0 +1,94 @@
+import json
+import os
+import threading
+import numpy as np
+import pytest
+
+from sim_env import SimEnv
+from sweep_scheduler import ClusterBudget, SweepScheduler, SweepTask, make_sweep_tasks, run_simulated_task, synthetic_hpa_df
+
+CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'configs.json')
+
+@pytest.fixture
+def benchmarks():
+    with open(CONFIG) as f:
+        return {bm['name']: bm for bm in json.load(f)['benchmarks']}
+
+# run_task on a SimEnv that also records what is deployed at once, independently of the budget.
+class Tracker:
+    def __init__(self, env, deploy_time=0.01):
+        self.env = env
+        self.deploy_time = deploy_time
+        self.lock = threading.Lock()
+        self.running = []
+        self.peak_deployments = 0
+        self.peak_replicas = 0
+        self.alone = {}
+
+    def __call__(self, task):
+        with self.lock:
+            self.running.append(task)
+            self.peak_deployments = max(self.peak_deployments, sum(len(t.scales) for t in self.running))
+            self.peak_replicas = max(self.peak_replicas, sum(sum(t.scales) for t in self.running))
+        try:
+            result = run_simulated_task(self.env, task, deploy_time=self.deploy_time, teardown_time=self.deploy_time)
+        finally:
+            with self.lock:
+                self.alone[id(task)] = self.alone.get(id(task), True) and len(self.running) == 1
+                self.running.remove(task)
+        return result
+
+def run_with_timeout(scheduler, tasks, run_task, timeout=60):
+    results = []
+    thread = threading.Thread(target=lambda: results.extend(scheduler.run(tasks, run_task)), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "The scheduler is stuck: a budget was not released."
+    return results
+
+def test_budget_limits(benchmarks):
+    hpa_df = synthetic_hpa_df(list(benchmarks.values()), 8, np.random.default_rng(0))
+    tasks = make_sweep_tasks(hpa_df, list(benchmarks.values()), 0.5, 5)
+    budget = ClusterBudget(max_deployments=4, max_replicas=20)
+    tasks = [task for task in tasks if sum(task.scales) <= 20]
+    tracker = Tracker(SimEnv())
+    results = run_with_timeout(SweepScheduler(budget, max_workers=16), tasks, tracker)
+
+    assert [task for task, _ in results] == tasks
+    assert not any(isinstance(result, Exception) for _, result in results)
+    assert budget.peak_deployments <= 4 and budget.peak_replicas <= 20
+    assert tracker.peak_deployments <= 4 and tracker.peak_replicas <= 20
+    # Several tasks did run at once, and everything was released.
+    assert tracker.peak_deployments > 1
+    assert (budget.deployments, budget.replicas) == (0, 0)
+
+def test_oversized_task_runs_alone(benchmarks):
+    small = [SweepTask(i, benchmarks['fibonacci-python'], [2], 100.0, 10) for i in range(6)]
+    oversized = SweepTask(6, benchmarks['hotel-app-geo'], [30], 100.0, 10)
+    tasks = small[:3] + [oversized] + small[3:]
+    budget = ClusterBudget(max_deployments=3, max_replicas=10)
+    tracker = Tracker(SimEnv())
+    results = run_with_timeout(SweepScheduler(budget, max_workers=8), tasks, tracker)
+
+    assert not any(isinstance(result, Exception) for _, result in results)
+    assert tracker.alone[id(oversized)]
+    assert budget.peak_replicas == 30 and budget.peak_deployments <= 3
+    assert (budget.deployments, budget.replicas) == (0, 0)
+
+def test_failing_task_releases_budget(benchmarks):
+    tasks = [SweepTask(i, benchmarks['fibonacci-python'], [4], 100.0, 10) for i in range(4)]
+    env = SimEnv()
+    def run_task(task):
+        if task.row % 2 == 0:
+            raise RuntimeError('deploy failed')
+        return run_simulated_task(env, task)
+    done = []
+    # Each task takes the whole budget, so the next one only starts after a release.
+    budget = ClusterBudget(max_deployments=1, max_replicas=4)
+    scheduler = SweepScheduler(budget, max_workers=4, on_done=lambda task, result: done.append(task.row))
+    results = run_with_timeout(scheduler, tasks, run_task)
+
+    assert [isinstance(result, RuntimeError) for _, result in results] == [True, False, True, False]
+    assert sorted(done) == [0, 1, 2, 3]
+    assert (budget.deployments, budget.replicas) == (0, 0)
+    assert budget.peak_deployments == 1
@@ -0,0 +1,177 @@
+import numpy as np
+import torch
+
+from itertools import product
+from RLEnv import ActionSpace, compute_rewards
+from latency_stats import PERCENTILES
+from prometheus_sampler import METRIC_COLUMNS
+from sim_env import QueueModel, benchmark_model, fit_models, load_data_frame, node_metrics
+
+# Node metrics that make up the RL state, as in RLEnv.compute_state (followed by containers and RPS).
+STATE_METRICS = [METRIC_COLUMNS.index(m) for m in ('cpu_user', 'mem_free', 'net_tx', 'net_rx')]
+
+class SyncVectorEnv:
+    """Steps K RLEnv instances in lock-step, in the style of gym's SyncVectorEnv.
+
+    Works with any backend (k8s_env_shim.Env or sim_env.SimEnv), one instance after the
+    other. Observations and rewards come back as batched tensors, and environments that
+    are done are reset right away; their last observation is in `infos['final_observation']`
+    (rows of other environments are NaN).
+
+    - Attributes:
+        - `envs` (List[RLEnv]) : the environments, sharing the same action space.
+        - `num_envs` (Int) : K.
+        - `action_space` (ActionSpace) : action space of a single environment.
+    - Methods:
+        - `reset` : reset all environments, returns observations (K, n_observations).
+        - `step` (Tensor) : take one action (K,) per environment, returns
+          `observations, rewards, terminated, truncated, infos`.
+    """
+    def __init__(self, envs, device='cpu'):
+        self.envs = envs
+        self.num_envs = len(envs)
+        self.action_space = envs[0].action_space
+        self.device = device
+
+    def tensor(self, values, dtype=torch.float32):
+        return torch.as_tensor(np.asarray(values), dtype=dtype, device=self.device)
+
+    def reset(self):
+        return self.tensor([env.reset() for env in self.envs])
+
+    def step(self, actions):
+        actions = torch.as_tensor(actions).view(-1).tolist()
+        observations, rewards, terminated, truncated, lats = [], [], [], [], []
+        final_observations = None
+        for i, (env, action) in enumerate(zip(self.envs, actions)):
+            observation, reward, term, trunc, lat = env.step(action)
+            if term or trunc:
+                if final_observations is None:
+                    final_observations = np.full((self.num_envs, len(observation)), np.nan)
+                final_observations[i] = observation
+                observation = env.reset()
+            observations.append(observation)
+            rewards.append(reward)
+            terminated.append(term)
+            truncated.append(trunc)
+            lats.append(lat)
+        if final_observations is None:
+            final_observations = np.full((self.num_envs, len(observations[0])), np.nan)
+        infos = {'final_observation': self.tensor(final_observations), 'lats': lats}
+        return (self.tensor(observations), self.tensor(rewards), self.tensor(terminated, torch.bool),
+                self.tensor(truncated, torch.bool), infos)
+
+class SimVectorEnv:
+    """K simulated clusters running the same benchmarks, vectorized with NumPy.
+
+    Same dynamics as RLEnv over KubernetesEnv over SimEnv, but every step updates all
+    K clusters at once: replicas and RPS are (K, B) arrays for B benchmarks, latency
+    percentiles come from the QueueModel in closed form instead of sampled invocations,
+    and the reward and QoS termination are computed in one pass.
+
+    - Attributes:
+        - `num_envs` (Int) : K.
+        - `benchmarks` (List[Dict]) : benchmarks as in the dqn_main.py config (name, entry-point, sla, rps-min, rps-max).
+        - `models` (Dict[String, QueueModel]) : models by benchmark/function name, as for SimEnv.
+        - `t` (Int) : simulated invocation time of a step (seconds).
+        - `noise` (Float) : standard deviation of the log-normal noise on the latencies.
+        - `max_episode_steps` (Int) : truncate episodes after this many steps, None for no limit.
+    - Methods:
+        - `reset` : reset all environments, returns observations (K, n_observations).
+        - `step` (Tensor) : take one action (K,) per environment, returns
+          `observations, rewards, terminated, truncated, infos`. Done environments are reset,
+          their last observation is in `infos['final_observation']` (rows of other environments are NaN).
+    """
+    def __init__(self, num_envs, benchmarks, models=None, default_model=None, t=30, num_nodes=3,
+                 cores_per_node=16, mem_per_replica=0.01, bytes_per_request=1024, noise=0.05,
+                 max_episode_steps=None, device='cpu', seed=None):
+        self.num_envs = num_envs
+        self.benchmarks = benchmarks
+        self.t = t
+        self.num_nodes = num_nodes
+        self.cores_per_node = cores_per_node
+        self.mem_per_replica = mem_per_replica
+        self.bytes_per_request = bytes_per_request
+        self.noise = noise
+        self.max_episode_steps = max_episode_steps
+        self.device = device
+        self.rng_ = np.random.default_rng(seed)
+
+        models = models if models is not None else {}
+        default_model = default_model if default_model is not None else QueueModel()
+        bm_models = [benchmark_model(models, b, default_model) for b in benchmarks]
+        self.mu = np.array([m.mu for m in bm_models])
+        self.base_latency = np.array([m.base_latency for m in bm_models])
+        self.sla_90 = np.array([b['sla']['lat'][1] for b in benchmarks], dtype=np.float64)
+        self.rps_range = (min(b['rps-min'] for b in benchmarks), max(b['rps-max'] for b in benchmarks))
+        # Same action space as dqn_main.py: -1, 0 or +1 replica per benchmark.
+        self.action_space = ActionSpace(list(product([-1, 0, 1], repeat=len(benchmarks))))
+        self.actions_ = np.array(self.action_space.actions, dtype=np.int64)
+        self.unit_model_ = QueueModel(base_latency=0)
+
+        self.replicas = np.ones((num_envs, len(benchmarks)), dtype=np.int64)
+        self.rps = np.zeros((num_envs, len(benchmarks)))
+        self.load = np.zeros((num_envs, len(benchmarks)))
+        self.steps = np.zeros(num_envs, dtype=np.int64)
+
+    @classmethod
+    def from_data(cls, num_envs, benchmarks, data_files, **kwargs):
+        return cls(num_envs, benchmarks, models=fit_models(load_data_frame(data_files)), **kwargs)
+
+    def tensor(self, values, dtype=torch.float32):
+        return torch.as_tensor(values, dtype=dtype, device=self.device)
+
+    # RL state of every environment: [cpu_user, mem_free, net_transmit, net_receive, num_containers, rps],
+    # read on the first node like RLEnv.compute_state.
+    def observations(self):
+        metrics = node_metrics((self.load / self.mu).sum(axis=1), self.load.sum(axis=1), self.replicas.sum(axis=1),
+                               self.num_nodes, self.cores_per_node, self.mem_per_replica, self.bytes_per_request,
+                               self.rng_)
+        return np.concatenate([metrics[:, 0, STATE_METRICS],
+                               self.replicas.sum(axis=1, keepdims=True),
+                               self.rps[:, :1]], axis=1)
+
+    # Reset the environments selected by the boolean @param mask (all if None): one replica per
+    # benchmark and a new RPS, the same for all benchmarks as in dqn_main.py.
+    def reset_envs(self, mask=None):
+        mask = np.ones(self.num_envs, dtype=bool) if mask is None else mask
+        self.replicas[mask] = 1
+        self.rps[mask] = self.rng_.integers(self.rps_range[0], self.rps_range[1] + 1, mask.sum())[:, None]
+        self.load[mask] = 0
+        self.steps[mask] = 0
+
+    def reset(self):
+        self.reset_envs()
+        return self.tensor(self.observations())
+
+    # Latency percentiles (K, B, len(PERCENTILES)) of every benchmark at the current replicas and RPS.
+    def latencies(self):
+        lats = self.unit_model_.percentiles(self.replicas, self.rps, self.t, PERCENTILES, mu=self.mu[None, :])
+        lats += self.base_latency[None, :, None] * 1e6
+        if self.noise > 0:
+            lats *= np.exp(self.rng_.normal(0, self.noise, lats.shape[:-1] + (1,)))
+        return lats
+
+    def step(self, actions):
+        actions = torch.as_tensor(actions).view(-1).cpu().numpy()
+        self.replicas = np.maximum(self.replicas + self.actions_[actions], 1)
+        self.load = self.rps.copy()
+        lats = self.latencies()
+        observations = self.observations()
+        rewards = compute_rewards(lats[:, :, 1], self.sla_90)
+        # QoS is met for every benchmark, as in KubernetesEnv.qos_is_met.
+        terminated = np.all(lats[:, :, 1] <= self.sla_90, axis=1)
+        self.steps += 1
+        if self.max_episode_steps is not None:
+            truncated = self.steps >= self.max_episode_steps
+        else:
+            truncated = np.zeros(self.num_envs, dtype=bool)
+        done = terminated | truncated
+        final_observations = np.full_like(observations, np.nan)
+        if done.any():
+            final_observations[done] = observations[done]
+            self.reset_envs(done)
+            observations[done] = self.observations()[done]
+        infos = {'final_observation': self.tensor(final_observations), 'lats': lats}
+        return (self.tensor(observations), self.tensor(rewards), self.tensor(terminated, torch.bool),
+                self.tensor(truncated, torch.bool), infos)
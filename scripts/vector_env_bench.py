@@ -0,0 +1,69 @@
+import argparse
+import contextlib
+import io
+import json
+import time
+import torch
+
+from KubernetesEnv import KubernetesEnv, make_benchmarks
+from RLEnv import RLEnv, ActionSpace
+from dqn_main import DQN, select_actions
+from policy_inference import PolicyService
+from sim_env import SimEnv
+from vector_env import SimVectorEnv, SyncVectorEnv
+
+# Environment-steps/sec of @param vec_env over @param steps lock-steps, with actions from
+# @param policy (a PolicyService, one forward pass per lock-step) or uniformly random if None.
+def env_steps_per_sec(vec_env, steps, policy=None):
+    states = vec_env.reset()
+    start = time.perf_counter()
+    for _ in range(steps):
+        if policy is None:
+            actions = torch.randint(vec_env.action_space.n, (vec_env.num_envs,))
+        else:
+            actions = select_actions(states, policy)
+        states, rewards, terminated, truncated, infos = vec_env.step(actions)
+    return steps * vec_env.num_envs / (time.perf_counter() - start)
+
+# SyncVectorEnv over K RLEnv/KubernetesEnv/SimEnv stacks.
+def make_sync_env(num_envs, benchmarks, t):
+    envs = []
+    for _ in range(num_envs):
+        env = SimEnv(benchmarks=benchmarks)
+        bm_objects = make_benchmarks(benchmarks)
+        for bm in bm_objects:
+            env.setup_functions(bm.deployments, bm.services)
+        action_space = ActionSpace(SimVectorEnv(1, benchmarks).action_space.actions)
+        envs.append(RLEnv(action_space, KubernetesEnv(env, bm_objects), t))
+    return SyncVectorEnv(envs)
+
+def main(args):
+    with open(args.config, 'r') as f:
+        benchmarks = json.load(f)['benchmarks']
+    torch.set_num_threads(1)
+
+    print(f'{"K":>4} {"sync (steps/s)":>15} {"vectorized (steps/s)":>21} {"vectorized + policy (steps/s)":>30}')
+    for num_envs in [int(k) for k in args.k.split(',')]:
+        sync = float('nan')
+        if num_envs <= args.max_sync_k:
+            with contextlib.redirect_stdout(io.StringIO()):
+                sync = env_steps_per_sec(make_sync_env(num_envs, benchmarks, args.t), max(args.steps // num_envs, 10))
+        vec_env = SimVectorEnv(num_envs, benchmarks, t=args.t, max_episode_steps=200)
+        vectorized = env_steps_per_sec(vec_env, args.steps)
+        policy_net = DQN(vec_env.reset().shape[1], vec_env.action_space.n)
+        with_policy = env_steps_per_sec(vec_env, args.steps, PolicyService(policy_net, vec_env.action_space.n, mode=None))
+        print(f'{num_envs:>4} {sync:>15.0f} {vectorized:>21.0f} {with_policy:>30.0f}')
+
+#
+# Example cmd:
+#   python3 vector_env_bench.py --config dqn_configs.json --k 1,8,64
+#
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--config', default='dqn_configs.json', help='Benchmarks config, as for dqn_main.py')
+    parser.add_argument('--k', default='1,8,64', help='Comma-separated numbers of environments')
+    parser.add_argument('-t', type=int, default=30, help='Simulated invocation time per step (seconds)')
+    parser.add_argument('--steps', type=int, default=1000, help='Lock-steps per measurement')
+    parser.add_argument('--max-sync-k', type=int, default=8, help='Largest K to run the SyncVectorEnv baseline for')
+    args = parser.parse_args()
+    main(args)